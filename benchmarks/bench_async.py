@@ -0,0 +1,119 @@
+# Load benchmark comparing the synchronous Flask path with the asyncio/ASGI path
+#
+# Usage: python benchmarks/bench_async.py [--requests 200] [--concurrency 100]
+#                                          [--sync-workers 4] [--latency 0.5]
+#
+# Both paths run against local mock upstreams, so no API keys or network are needed.
+# --sync-workers models the number of gunicorn sync workers serving the Flask app.
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path to allow running from the benchmarks directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import percentile
+from benchmarks.mock_upstreams import MockUpstreamServer
+
+
+def report(mode, latencies, wall, concurrency, errors):
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def request_body(i):
+    # Unique video IDs so every request misses the cache and hits the upstreams
+    return {"url": f"https://youtu.be/bench{i:06d}", "refresh": True}
+
+
+def run_sync(core, requests, concurrency, workers):
+    client = core.app.test_client()
+    worker_pool = ThreadPoolExecutor(max_workers=workers)
+
+    def call(i):
+        started = time.perf_counter()
+        response = worker_pool.submit(client.post, "/summarize", json=request_body(i)).result()
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        results = list(clients.map(call, range(requests)))
+    wall = time.perf_counter() - started
+    worker_pool.shutdown()
+
+    errors = sum(1 for _, status in results if status != 200)
+    return report(f"sync ({workers} workers)", [latency for latency, _ in results], wall, concurrency, errors)
+
+
+async def run_async(asgi_app, requests, concurrency):
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=asgi_app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def call(i):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/summarize", json=request_body(i))
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(call(i) for i in range(requests)))
+        wall = time.perf_counter() - started
+
+    errors = sum(1 for _, status in results if status != 200)
+    return report("async (1 process)", [latency for latency, _ in results], wall, concurrency, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--sync-workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5, help="mock upstream latency per call (s)")
+    args = parser.parse_args()
+
+    upstream = MockUpstreamServer(latency=args.latency).start()
+    os.environ.update({
+        "SEARCHAPI_BASE_URL": upstream.base_url,
+        "DEEPSEEK_BASE_URL": upstream.base_url,
+        "SEARCHAPI_KEY": "bench",
+        "DEEPSEEK_KEY": "bench",
+    })
+    # Keep summary files, history and cache out of the working tree
+    os.chdir(tempfile.mkdtemp(prefix="yt-bench-"))
+
+    from src import yt_summarizer as core
+    from src import asgi
+    from limits import parse
+
+    core.logger.remove()
+    core.limiter.enabled = False
+    asgi.SUMMARIZE_LIMIT = parse(f"{args.requests * 10} per minute")
+
+    results = [
+        run_sync(core, args.requests, args.concurrency, args.sync_workers),
+        asyncio.run(run_async(asgi.app, args.requests, args.concurrency)),
+    ]
+    upstream.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
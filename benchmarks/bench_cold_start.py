@@ -0,0 +1,132 @@
+# Cold-start benchmark for the serverless entry points
+#
+# Usage: python benchmarks/bench_cold_start.py [--runs 5] [--entry api.index] [--output results.json]
+#
+# Every measurement runs in a fresh interpreter, like a new serverless instance. For each
+# first request ("/health", "/" and "/history", which needs the full app) it reports:
+#   import_ms          time to import the entry module
+#   handler_ms         time for the first handler call
+#   first_response_ms  from spawning the process to the first response, interpreter start included
+# plus the same figures for importing src.yt_summarizer and calling the Flask app directly,
+# which is what the entry points did before. `python -X importtime` supplies the heaviest imports.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Child process: import the entry, make one request, print the timings and which modules loaded
+ENTRY_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import {entry} as entry
+imported = time.perf_counter()
+response = entry.handler({{"path": {path!r}, "method": "GET", "headers": {{}}}}, None)
+responded = time.perf_counter()
+print(json.dumps({{"import": imported - started, "handler": responded - imported, "done": time.time(),
+                   "status": response["statusCode"], "flask_loaded": "flask" in sys.modules}}))
+"""
+
+FULL_APP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from src.yt_summarizer import app
+imported = time.perf_counter()
+response = app.test_client().get({path!r})
+responded = time.perf_counter()
+print(json.dumps({{"import": imported - started, "handler": responded - imported, "done": time.time(),
+                   "status": response.status_code, "flask_loaded": True}}))
+"""
+
+
+def child_env(scratch):
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE="1")
+    # Keep history, caches and logs of the loaded app out of the working tree
+    env.update({
+        "OUTPUT_DIR": os.path.join(scratch, "output"),
+        "HISTORY_DB": os.path.join(scratch, "history.db"),
+        "SINGLEFLIGHT_DB": "",
+    })
+    return env
+
+
+def run_child(script, scratch):
+    spawned = time.time()
+    output = subprocess.run([sys.executable, "-c", script], cwd=scratch, env=child_env(scratch),
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["first_response"] = result.pop("done") - spawned
+    return result
+
+
+def measure(name, script, runs, scratch):
+    samples = [run_child(script, scratch) for _ in range(runs)]
+    return {
+        "name": name,
+        "runs": runs,
+        "status": samples[-1]["status"],
+        "flask_loaded": samples[-1]["flask_loaded"],
+        "import_ms": round(statistics.median(s["import"] for s in samples) * 1000, 1),
+        "handler_ms": round(statistics.median(s["handler"] for s in samples) * 1000, 1),
+        "first_response_ms": round(statistics.median(s["first_response"] for s in samples) * 1000, 1),
+    }
+
+
+def heaviest_imports(module, scratch, top=10):
+    """Modules with the largest cumulative import time under `python -X importtime`"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=scratch, env=child_env(scratch), capture_output=True, text=True,
+                            check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if not parts[0].isdigit():
+            continue  # header line
+        if parts[2] == "site":
+            rows = []  # everything so far belongs to interpreter startup
+            continue
+        rows.append({"module": parts[2], "self_ms": int(parts[0]) / 1000, "cumulative_ms": int(parts[1]) / 1000})
+    total = next((row["cumulative_ms"] for row in rows if row["module"] == module), None)
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return {"module": module, "total_ms": total, "heaviest": rows[:top]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure serverless cold-start time")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--entry", default="api.index", help="entry module exposing handler(request, context)")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="yt-cold-start-")
+    results = []
+    for path in ("/health", "/", "/history"):
+        script = ENTRY_SCRIPT.format(entry=args.entry, path=path)
+        results.append(measure(f"{args.entry} {path}", script, args.runs, scratch))
+        results.append(measure(f"full app {path}", FULL_APP_SCRIPT.format(path=path), args.runs, scratch))
+        for result in results[-2:]:
+            print(f"{result['name']}: first response {result['first_response_ms']} ms "
+                  f"(import {result['import_ms']} ms)", file=sys.stderr)
+
+    output = json.dumps({
+        "config": vars(args),
+        "results": results,
+        "importtime": [heaviest_imports(args.entry, scratch), heaviest_imports("src.yt_summarizer", scratch)],
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Build and query benchmark for the near-duplicate transcript index
+#
+# Usage: python benchmarks/bench_near_duplicates.py [--entries 300000] [--queries 2000] [--output results.json]
+#
+# Fingerprinting real text takes milliseconds per transcript, so the index is filled with
+# synthetic signatures; fingerprint time is measured separately on generated transcripts. Queries
+# are split between near-duplicates of stored entries (a few signature bins changed, i.e. about
+# 90% similar) and unrelated signatures. It reports:
+#   fingerprint_ms     time to fingerprint one transcript of --words words
+#   build_seconds      time to add every entry, band array merges included
+#   query_us           p50/p95/p99 lookup time for near-duplicates and for misses
+#   recall             fraction of near-duplicate queries that found their entry
+#   array_mb           size of the signature and band arrays
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.near_duplicates import NearDuplicateIndex  # noqa: E402
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {f"p{q}": round(samples[min(len(samples) - 1, int(q / 100 * len(samples)))] * 1e6, 1)
+            for q in (50, 95, 99)}
+
+
+def random_signature(rng, num_perm):
+    return array("I", (rng.getrandbits(32) for _ in range(num_perm)))
+
+
+def near_duplicate(rng, signature, changed):
+    copy = array("I", signature)
+    for position in rng.sample(range(len(copy)), changed):
+        copy[position] = rng.getrandbits(32)
+    return copy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure near-duplicate index build and query time")
+    parser.add_argument("--entries", type=int, default=300000, help="signatures stored in the index")
+    parser.add_argument("--queries", type=int, default=2000, help="lookups of each kind")
+    parser.add_argument("--words", type=int, default=8000, help="words per transcript when fingerprinting")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = NearDuplicateIndex()
+    vocabulary = [f"word{i}" for i in range(20000)]
+
+    timings = []
+    for _ in range(20):
+        text = " ".join(rng.choice(vocabulary) for _ in range(args.words))
+        started = time.perf_counter()
+        index.fingerprint(text)
+        timings.append(time.perf_counter() - started)
+    fingerprint_ms = round(statistics.median(timings) * 1000, 2)
+    print(f"fingerprint: {fingerprint_ms} ms per {args.words}-word transcript", file=sys.stderr)
+
+    signatures = [random_signature(rng, index.num_perm) for _ in range(args.entries)]
+    started = time.perf_counter()
+    for number, signature in enumerate(signatures):
+        index.add(f"video{number}", "default", signature)
+    build_seconds = time.perf_counter() - started
+    array_mb = index.stats()["array_bytes"] / 2 ** 20
+    print(f"build: {args.entries} entries in {build_seconds:.1f} s, {array_mb:.0f} MB of arrays", file=sys.stderr)
+
+    # 6 of 64 bins changed is about 0.9 estimated similarity
+    targets = rng.sample(range(args.entries), min(args.queries, args.entries))
+    hits, found = [], 0
+    for target in targets:
+        query = near_duplicate(rng, signatures[target], 6)
+        started = time.perf_counter()
+        match = index.query(query, "default", args.threshold)
+        hits.append(time.perf_counter() - started)
+        found += bool(match and match[0] == f"video{target}")
+    misses, false_matches = [], 0
+    for _ in range(args.queries):
+        query = random_signature(rng, index.num_perm)
+        started = time.perf_counter()
+        false_matches += index.query(query, "default", args.threshold) is not None
+        misses.append(time.perf_counter() - started)
+    print(f"query: near-duplicate p50 {percentiles(hits)['p50']} us, miss p50 {percentiles(misses)['p50']} us",
+          file=sys.stderr)
+
+    output = json.dumps({
+        "config": vars(args),
+        "fingerprint_ms": fingerprint_ms,
+        "build_seconds": round(build_seconds, 2),
+        "add_us": round(build_seconds / args.entries * 1e6, 1),
+        "array_mb": round(array_mb, 1),
+        "query_us": {"near_duplicate": percentiles(hits), "miss": percentiles(misses)},
+        "recall": round(found / len(targets), 4),
+        "false_matches": false_matches,
+        "index": index.stats(),
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
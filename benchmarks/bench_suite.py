@@ -0,0 +1,281 @@
+# Load-test suite: drive the app against mock upstreams and report latency, throughput and cost
+#
+# Usage: python benchmarks/bench_suite.py [--scenarios sync,stream,async] [--concurrency 1,10,50]
+#                                          [--requests 100] [--latency 0.2] [--error-rate 0.05]
+#                                          [--segments 200] [--segment-chars 40] [--output results.json]
+#
+# Scenarios:
+#   sync    POST /summarize on the Flask app (--sync-workers models gunicorn sync workers)
+#   stream  POST /summarize/stream on the Flask app; also reports time to first token
+#   async   POST /summarize on the ASGI app
+#
+# Every request uses a fresh video ID with refresh=true, so each one pays for the full
+# upstream round trip. Pass --target http://host:port to drive a running server over HTTP
+# instead (start it against `python benchmarks/mock_upstreams.py`); CPU and memory are then
+# not reported, since they belong to the other process.
+#
+# --record tape.jsonl.gz writes the upstream traffic of a run to a cassette (src/cassettes.py).
+# --cassette tape.jsonl.gz replays one instead of starting the mock upstreams: requests cycle
+# through the recorded videos, and upstream responses arrive with the recorded timing scaled
+# by --replay-speed. Cassettes cover the Flask app's upstream calls, so async is skipped.
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+# Add parent directory to path to allow running from the benchmarks directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import ResourceMeter, latency_report
+from benchmarks.mock_upstreams import start_in_subprocess
+from src.cassettes import Cassette
+
+SCENARIOS = ("sync", "stream", "async")
+
+
+class RequestIds:
+    """Unique video IDs across every scenario and concurrency level of one run
+
+    With the video IDs of a cassette, requests go through those in recording order instead,
+    so replaying with the options the cassette was recorded with sends the same requests.
+    """
+
+    def __init__(self, video_ids=None):
+        self.next = 0
+        self.video_ids = video_ids
+
+    def body(self):
+        if self.video_ids:
+            video_id = self.video_ids[self.next % len(self.video_ids)]
+            self.next += 1
+            return {"url": f"https://youtu.be/{video_id}", "refresh": True}
+        self.next += 1
+        return {"url": f"https://youtu.be/bench{self.next:06d}", "refresh": True}
+
+
+def cassette_video_ids(path):
+    """Video IDs whose transcripts were recorded in a cassette, in recording order"""
+    video_ids = {}
+    for url in Cassette(path).urls("searchapi"):
+        video_ids.update(dict.fromkeys(parse_qs(urlparse(url).query).get("video_id", [])))
+    return list(video_ids)
+
+
+def read_sse(chunks, started):
+    """Consume an SSE body, returning (time to first token, saw done event)"""
+    first_token, done, buffer = None, False, ""
+    for chunk in chunks:
+        buffer += chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        if first_token is None and "event: token" in buffer:
+            first_token = time.perf_counter() - started
+        if "event: done" in buffer:
+            done = True
+        # Keep only the unfinished event so the buffer does not grow with the summary
+        buffer = buffer[buffer.rfind("\n\n") + 2:] if "\n\n" in buffer else buffer
+    return first_token, done
+
+
+def flask_caller(core, scenario, workers):
+    """Return (call, close) driving the Flask app in-process through a fixed worker pool"""
+    client = core.app.test_client()
+    worker_pool = ThreadPoolExecutor(max_workers=workers)
+
+    def summarize(body):
+        response = client.post("/summarize", json=body)
+        return response.status_code == 200, None
+
+    def stream(body):
+        started = time.perf_counter()
+        response = client.post("/summarize/stream", json=body, buffered=False)
+        try:
+            first_token, done = read_sse(response.response, started)
+        finally:
+            response.close()
+        return response.status_code == 200 and done, first_token
+
+    handler = stream if scenario == "stream" else summarize
+    return (lambda body: worker_pool.submit(handler, body).result()), worker_pool.shutdown
+
+
+def http_caller(target, scenario):
+    """Return (call, close) driving a running server over HTTP"""
+    import requests
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=512))
+    path = "/summarize/stream" if scenario == "stream" else "/summarize"
+
+    def call(body):
+        started = time.perf_counter()
+        response = session.post(target + path, json=body, stream=scenario == "stream")
+        if scenario != "stream":
+            return response.status_code == 200, None
+        with response:
+            first_token, done = read_sse(response.iter_content(chunk_size=None), started)
+        return response.status_code == 200 and done, first_token
+
+    return call, session.close
+
+
+def run_threaded(call, ids, requests, concurrency):
+    def timed(body):
+        started = time.perf_counter()
+        ok, first_token = call(body)
+        return time.perf_counter() - started, ok, first_token
+
+    bodies = [ids.body() for _ in range(requests)]
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        return list(clients.map(timed, bodies))
+
+
+async def run_asgi(asgi_app, ids, requests, concurrency):
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=asgi_app)
+    bodies = [ids.body() for _ in range(requests)]
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def call(body):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/summarize", json=body)
+                return time.perf_counter() - started, response.status_code == 200, None
+
+        return await asyncio.gather(*(call(body) for body in bodies))
+
+
+def summarize_results(scenario, concurrency, results, meter, in_process):
+    latencies = [latency for latency, _, _ in results]
+    result = {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": sum(1 for _, ok, _ in results if not ok),
+        "wall_seconds": round(meter.wall, 3),
+        "throughput_rps": round(len(results) / meter.wall, 2) if meter.wall else 0.0,
+    }
+    result.update(latency_report(latencies))
+    first_tokens = [first for _, _, first in results if first is not None]
+    if first_tokens:
+        result.update(latency_report(first_tokens, prefix="first_token_"))
+    if in_process:
+        result.update(meter.report(len(results)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the summarizer against mock upstreams")
+    parser.add_argument("--scenarios", default="sync,stream,async",
+                        help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,10,50", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario and level")
+    parser.add_argument("--sync-workers", type=int, default=8, help="Flask worker threads (in-process runs)")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock upstream latency per call (s)")
+    parser.add_argument("--segments", type=int, default=200, help="transcript segments per video")
+    parser.add_argument("--segment-chars", type=int, default=40, help="characters per transcript segment")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls that fail")
+    parser.add_argument("--stream-tokens", type=int, default=50, help="deltas per streamed completion")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="seconds between streamed deltas")
+    parser.add_argument("--target", help="base URL of a running server to drive instead of the in-process apps")
+    parser.add_argument("--record", help="record the upstream traffic of this run to a cassette file")
+    parser.add_argument("--cassette", help="replay upstream traffic from a cassette instead of mock upstreams")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="cassette replay speed (1 = recorded timing, 0 = no delays)")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if (args.target or args.cassette or args.record) and "async" in scenarios:
+        # Over HTTP the server decides how requests are served; async is just another target URL.
+        # Cassettes are mounted on the Flask app's upstream clients only
+        scenarios.remove("async")
+    if args.target and (args.cassette or args.record):
+        parser.error("--record and --cassette apply to the in-process app, not --target")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    # Resolve before the in-process run moves into a scratch directory
+    for option in ("output", "record", "cassette"):
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+
+    mock_options = {
+        "latency": args.latency,
+        "segments": args.segments,
+        "segment_chars": args.segment_chars,
+        "error_rate": args.error_rate,
+        "stream_tokens": args.stream_tokens,
+        "token_interval": args.token_interval,
+    }
+    upstream, upstream_url = (None, None) if args.target or args.cassette else start_in_subprocess(**mock_options)
+
+    core = asgi = None
+    if not args.target:
+        os.environ.update({
+            "SEARCHAPI_KEY": "bench",
+            "DEEPSEEK_KEY": "bench",
+        })
+        if upstream_url:
+            os.environ.update({"SEARCHAPI_BASE_URL": upstream_url, "DEEPSEEK_BASE_URL": upstream_url})
+        if args.record or args.cassette:
+            os.environ.update({
+                "UPSTREAM_CASSETTE": args.record or args.cassette,
+                "UPSTREAM_CASSETTE_MODE": "record" if args.record else "replay",
+                "UPSTREAM_REPLAY_SPEED": str(args.replay_speed),
+            })
+        # Keep summary files, history and cache out of the working tree
+        os.chdir(tempfile.mkdtemp(prefix="yt-bench-"))
+
+        from src import yt_summarizer as core
+        from src import asgi
+        from limits import parse
+
+        core.logger.remove()
+        core.limiter.enabled = False
+        asgi.SUMMARIZE_LIMIT = parse(f"{args.requests * len(levels) * 10} per minute")
+
+    ids = RequestIds(cassette_video_ids(args.cassette) if args.cassette else None)
+    results = []
+    try:
+        for scenario in scenarios:
+            for concurrency in levels:
+                if scenario == "async":
+                    with ResourceMeter() as meter:
+                        raw = asyncio.run(run_asgi(asgi.app, ids, args.requests, concurrency))
+                else:
+                    if args.target:
+                        call, close = http_caller(args.target.rstrip("/"), scenario)
+                    else:
+                        call, close = flask_caller(core, scenario, args.sync_workers)
+                    with ResourceMeter() as meter:
+                        raw = run_threaded(call, ids, args.requests, concurrency)
+                    close()
+                results.append(summarize_results(scenario, concurrency, raw, meter, not args.target))
+                print(f"{scenario} c={concurrency}: {results[-1]['throughput_rps']} req/s, "
+                      f"p95 {results[-1]['p95_ms']} ms", file=sys.stderr)
+    finally:
+        if upstream is not None:
+            upstream.terminate()
+
+    report = {"config": dict(vars(args), upstream=mock_options), "results": results}
+    if core is not None and core.cassette is not None:
+        report["cassette"] = core.cassette.stats()
+        print(f"cassette: {report['cassette']}", file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# Micro-benchmark for video ID extraction
+#
+# Usage: python benchmarks/bench_video_ids.py [--urls 200000] [--output results.json]
+#
+# Builds a corpus of YouTube URLs in every supported form (plus malformed ones) with known
+# video IDs, then times the extractor it replaced (kept below as legacy_extract_video_id),
+# src.video_ids.extract_video_id per URL and the bulk extract_video_ids, overall and per form.
+# tests/test_video_ids.py checks the extraction of the same corpus.
+
+import argparse
+import json
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.video_ids import extract_video_id, extract_video_ids  # noqa: E402
+
+ID_CHARS = string.ascii_letters + string.digits + "-_"
+
+# (form, template, has ID); {id} is replaced by a random video ID
+TEMPLATES = [
+    ("watch", "https://www.youtube.com/watch?v={id}", True),
+    ("watch_params", "https://www.youtube.com/watch?v={id}&t=42s&list=PL{rand}", True),
+    ("watch_v_later", "https://www.youtube.com/watch?feature=share&v={id}", True),
+    ("no_scheme", "youtube.com/watch?v={id}", True),
+    ("mobile", "https://m.youtube.com/watch?v={id}&feature=youtu.be", True),
+    ("music", "https://music.youtube.com/watch?v={id}&si={rand}", True),
+    ("short_link", "https://youtu.be/{id}", True),
+    ("short_link_params", "https://youtu.be/{id}?si={rand}&t=10", True),
+    ("embed", "https://www.youtube.com/embed/{id}?autoplay=1", True),
+    ("nocookie", "https://www.youtube-nocookie.com/embed/{id}", True),
+    ("old_embed", "http://www.youtube.com/v/{id}?version=3", True),
+    ("shorts", "https://www.youtube.com/shorts/{id}", True),
+    ("shorts_params", "https://youtube.com/shorts/{id}?feature=share", True),
+    ("live", "https://www.youtube.com/live/{id}?si={rand}", True),
+    ("user", "https://www.youtube.com/user/{name}/u/{id}", True),
+    ("fragment", "https://www.youtube.com/watch?v={id}#t=1m", True),
+    ("encoded", "https://www.youtube.com/attribution_link?u=%2Fwatch%3Fv%3D{id}%26feature%3Dshare", True),
+    ("upper_host", "https://WWW.YOUTUBE.COM/watch?v={id}", True),
+    ("bare_id", "{id}", True),
+    ("bare_id_spaces", "  {id}\n", True),
+    ("in_text", "check this out: https://youtu.be/{id} !", True),
+    ("playlist", "https://www.youtube.com/playlist?list=PL{rand}", False),
+    ("channel", "https://www.youtube.com/@{name}", False),
+    ("other_site", "https://example.com/watch?v={id}", False),
+    ("too_long", "https://youtu.be/{id}XYZ", False),
+    ("empty", "", False),
+]
+
+
+def legacy_extract_video_id(url: str) -> str:
+    """The extractor from before src/video_ids.py, for comparison"""
+    patterns = [
+        r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/|youtube\.com\/v\/|youtube\.com\/.*?[?&]v=)([\w-]{11})',
+        r'youtube\.com\/embed\/([\w-]{11})',
+        r'youtube\.com\/v\/([\w-]{11})',
+        r'youtube\.com\/user\/\w+\/\w+\/([\w-]{11})',
+        r'youtube\.com\/\w+\/\w+\/([\w-]{11})'
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, url)
+        if match:
+            return match.group(1)
+    if re.match(r'^[\w-]{11}$', url):
+        return url
+    raise ValueError("Could not extract YouTube video ID from URL. Please provide a valid YouTube URL.")
+
+
+def build_corpus(size, rng):
+    """[(form, url, expected ID or None)]"""
+    corpus = []
+    for number in range(size):
+        form, template, has_id = TEMPLATES[number % len(TEMPLATES)]
+        video_id = "".join(rng.choice(ID_CHARS) for _ in range(11))
+        url = template.format(id=video_id, rand="".join(rng.choice(string.ascii_letters) for _ in range(8)),
+                              name="".join(rng.choice(string.ascii_lowercase) for _ in range(6)))
+        corpus.append((form, url, video_id if has_id else None))
+    return corpus
+
+
+def attempt(extract, url):
+    try:
+        return extract(url)
+    except ValueError:
+        return None
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time video ID extraction")
+    parser.add_argument("--urls", type=int, default=200000, help="URLs in the generated corpus")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.urls, random.Random(args.seed))
+    urls = [url for _, url, _ in corpus]
+    by_form = {}
+    for form, url, _ in corpus:
+        by_form.setdefault(form, []).append(url)
+
+    seconds = {
+        "legacy": timed(lambda: [attempt(legacy_extract_video_id, url) for url in urls]),
+        "extract_video_id": timed(lambda: [attempt(extract_video_id, url) for url in urls]),
+        "extract_video_ids": timed(lambda: list(extract_video_ids(urls))),
+    }
+    per_url_us = {name: round(value / len(urls) * 1e6, 2) for name, value in seconds.items()}
+    print(f"per URL: {per_url_us}", file=sys.stderr)
+    forms = {form: round(timed(lambda: [attempt(extract_video_id, url) for url in form_urls])
+                         / len(form_urls) * 1e6, 2)
+             for form, form_urls in by_form.items()}
+
+    output = json.dumps({
+        "config": vars(args),
+        "per_url_us": per_url_us,
+        "speedup_bulk": round(seconds["legacy"] / seconds["extract_video_ids"], 2),
+        "extract_video_id_per_form_us": forms,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Request latency with log, history and summary writes inline vs. through the write-behind queue
+#
+# Usage: python benchmarks/bench_write_behind.py [--requests 200] [--concurrency 1,8]
+#                                                [--saves 2000] [--output results.json]
+#
+# Runs the Flask app in-process against the mock upstreams (no upstream latency by default, so
+# the disk writes are a visible share of each request) and reports, for each mode:
+#   requests    p50/p95/p99 latency of POST /summarize at each concurrency level
+#   save_path   p50/p95/p99 time in microseconds for what a request spends saving:
+#               save_summary() plus three INFO log lines, without the upstream round trip
+#   drain_ms    time for the writer to finish what was still queued when the requests returned
+# "inline" writes on the request thread (WRITE_BEHIND=0); "write_behind" queues the writes.
+# saved is the inline p50 minus the write-behind p50.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_suite import RequestIds, flask_caller, run_threaded  # noqa: E402
+from benchmarks.harness import latency_report  # noqa: E402
+from benchmarks.mock_upstreams import start_in_subprocess  # noqa: E402
+
+MODES = ("inline", "write_behind")
+
+
+def percentiles_us(samples):
+    samples = sorted(samples)
+    return {f"p{q}_us": round(samples[min(len(samples) - 1, int(q / 100 * len(samples)))] * 1e6, 1)
+            for q in (50, 95, 99)}
+
+
+def time_saves(core, saves):
+    """Per-call time of save_summary() and the log lines of a request"""
+    summary = "- point\n" * 40
+    timings = []
+    for number in range(saves):
+        started = time.perf_counter()
+        core.logger.info(f"Processing video ID: save{number:06d}")
+        core.save_summary(f"save{number:06d}", f"https://youtu.be/save{number:06d}", summary)
+        core.logger.info(f"Successfully generated summary for video ID: save{number:06d}")
+        core.logger.info("span=save_summary parent=- duration_ms=0.0 status=ok")
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def timed_drain(core):
+    started = time.perf_counter()
+    core.write_behind.drain()
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the latency saved by write-behind writes")
+    parser.add_argument("--requests", type=int, default=200, help="requests per mode and concurrency level")
+    parser.add_argument("--concurrency", default="1,8", help="comma-separated concurrency levels")
+    parser.add_argument("--saves", type=int, default=2000, help="save_summary() calls per mode")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock upstream latency per call (s)")
+    parser.add_argument("--sync-workers", type=int, default=8, help="Flask worker threads")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(",")]
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    upstream, upstream_url = start_in_subprocess(latency=args.latency, segments=200)
+    os.environ.update({
+        "SEARCHAPI_BASE_URL": upstream_url,
+        "DEEPSEEK_BASE_URL": upstream_url,
+        "SEARCHAPI_KEY": "bench",
+        "DEEPSEEK_KEY": "bench",
+    })
+    # The log file, history and summary databases are written in a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="yt-bench-"))
+
+    from src import yt_summarizer as core
+
+    core.limiter.enabled = False
+    ids = RequestIds()
+    results = {}
+    try:
+        for mode in MODES:
+            core.write_behind.enabled = mode == "write_behind"
+            report = {"requests": {}}
+            for concurrency in levels:
+                call, close = flask_caller(core, "sync", args.sync_workers)
+                raw = run_threaded(call, ids, args.requests, concurrency)
+                close()
+                report["requests"][concurrency] = dict(
+                    latency_report([latency for latency, _, _ in raw]),
+                    errors=sum(1 for _, ok, _ in raw if not ok),
+                    drain_ms=timed_drain(core),
+                )
+            report["save_path"] = percentiles_us(time_saves(core, args.saves))
+            report["save_path"]["drain_ms"] = timed_drain(core)
+            results[mode] = report
+            print(f"{mode}: " + ", ".join(f"c={c} p50 {r['p50_ms']} ms" for c, r in report["requests"].items())
+                  + f"; save path p50 {report['save_path']['p50_us']} us", file=sys.stderr)
+    finally:
+        upstream.terminate()
+        core.write_behind.close()
+
+    inline, write_behind = results["inline"], results["write_behind"]
+    saved = {
+        "requests_ms": {c: round(inline["requests"][c]["p50_ms"] - write_behind["requests"][c]["p50_ms"], 1)
+                        for c in levels},
+        "save_path_us": round(inline["save_path"]["p50_us"] - write_behind["save_path"]["p50_us"], 1),
+    }
+    print(f"saved (p50): {saved}", file=sys.stderr)
+
+    output = json.dumps({
+        "config": vars(args),
+        "results": results,
+        "saved": saved,
+        "write_behind": core.write_behind.stats(),
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Measurement helpers shared by the benchmarks
+
+import os
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_report(latencies, prefix=""):
+    """p50/p95/p99/mean/max in milliseconds for a list of durations in seconds"""
+    mean = sum(latencies) / len(latencies) if latencies else 0.0
+    return {
+        f"{prefix}p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        f"{prefix}p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        f"{prefix}p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        f"{prefix}mean_ms": round(mean * 1000, 1),
+        f"{prefix}max_ms": round(max(latencies, default=0.0) * 1000, 1),
+    }
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class ResourceMeter:
+    """CPU time and memory used by this process over a block of requests
+
+        with ResourceMeter() as meter:
+            ...
+        meter.report(requests)
+    """
+
+    def __enter__(self):
+        self.rss_start = current_rss_bytes()
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cpu = time.process_time() - self.cpu_start
+        self.wall = time.perf_counter() - self.wall_start
+        self.rss_end = current_rss_bytes()
+        return False
+
+    def report(self, requests):
+        stats = {
+            "cpu_seconds": round(self.cpu, 3),
+            "cpu_ms_per_request": round(self.cpu * 1000 / requests, 3) if requests else 0.0,
+            "cpu_utilization": round(self.cpu / self.wall, 3) if self.wall else 0.0,
+            "rss_mb": None,
+            "rss_growth_kb_per_request": None,
+            "peak_rss_mb": None,
+        }
+        if self.rss_end is not None:
+            stats["rss_mb"] = round(self.rss_end / 2 ** 20, 1)
+            if requests:
+                stats["rss_growth_kb_per_request"] = round((self.rss_end - self.rss_start) / 1024 / requests, 2)
+        peak = peak_rss_bytes()
+        if peak is not None:
+            stats["peak_rss_mb"] = round(peak / 2 ** 20, 1)
+        return stats
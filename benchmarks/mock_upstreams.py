@@ -0,0 +1,171 @@
+# Local stand-ins for SearchAPI.io and Deepseek used by the benchmarks
+#
+# Run standalone to benchmark a separately started server (e.g. gunicorn):
+#   python benchmarks/mock_upstreams.py --port 8099 --latency 0.2 --error-rate 0.05
+# then start the app with SEARCHAPI_BASE_URL and DEEPSEEK_BASE_URL set to http://127.0.0.1:8099
+
+import argparse
+import json
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class MockUpstreamServer(ThreadingHTTPServer):
+    """Serves both upstream APIs with configurable latency, payload size and failures
+
+    latency:         seconds slept before every response
+    segments:        transcript segments per video
+    segment_chars:   approximate characters per transcript segment
+    error_rate:      fraction of calls answered with error_status (retried by the app)
+    stream_tokens:   content deltas per streamed (SSE) completion
+    token_interval:  seconds between streamed deltas
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency=0.5, segments=200, port=0, segment_chars=40, error_rate=0.0,
+                 error_status=503, stream_tokens=50, token_interval=0.01):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.segments = segments
+        self.segment_chars = segment_chars
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stream_tokens = stream_tokens
+        self.token_interval = token_interval
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counters = {"transcripts": 0, "completions": 0, "streams": 0, "errors": 0}
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self):
+        """Answer with the configured error for error_rate of calls; return True if we did"""
+        if random.random() >= self.server.error_rate:
+            return False
+        self.server.count("errors")
+        self._send_json({"error": {"message": "mock upstream error"}}, self.server.error_status)
+        return True
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        if not self.path.startswith("/api/v1/search"):
+            return self._send_json({"error": {"message": "not found"}}, 404)
+        if self._fail():
+            return
+        self.server.count("transcripts")
+        video_id = parse_qs(urlparse(self.path).query).get("video_id", ["video"])[0]
+        # Captions differ per video so summaries of different videos never share a cache key
+        line = f"caption line {{}} of benchmark video {video_id} "
+        padding = "x" * max(0, self.server.segment_chars - len(line))
+        self._send_json({"transcripts": [
+            {"text": line.format(i) + padding, "start": i * 2.0, "duration": 2.0}
+            for i in range(self.server.segments)
+        ]})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.server.latency)
+        if self.path != "/v1/chat/completions":
+            return self._send_json({"error": {"message": "not found"}}, 404)
+        if self._fail():
+            return
+        if body.get("stream"):
+            return self._stream_completion()
+        self.server.count("completions")
+        self._send_json({"choices": [{"message": {"content": "1. Benchmark summary point"}}]})
+
+    def _stream_completion(self):
+        self.server.count("streams")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        # No Content-Length: the body ends when the connection closes
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for i in range(self.server.stream_tokens):
+            delta = {"choices": [{"delta": {"content": f"{i + 1}. point " if i % 5 == 0 else "word "}}]}
+            self.wfile.write(f"data: {json.dumps(delta)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.server.token_interval)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def _serve(options, ready):
+    server = MockUpstreamServer(**options)
+    ready.put(server.base_url)
+    server.serve_forever()
+
+
+def start_in_subprocess(**options):
+    """Run a MockUpstreamServer in its own process so it does not use the benchmark's CPU
+
+    Returns (process, base_url); call process.terminate() when done.
+    """
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    process = context.Process(target=_serve, args=(options, ready), daemon=True)
+    process.start()
+    return process, ready.get(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock SearchAPI.io and Deepseek endpoints")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--segments", type=int, default=200)
+    parser.add_argument("--segment-chars", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stream-tokens", type=int, default=50)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    server = MockUpstreamServer(latency=args.latency, segments=args.segments, port=args.port,
+                                segment_chars=args.segment_chars, error_rate=args.error_rate,
+                                stream_tokens=args.stream_tokens, token_interval=args.token_interval)
+    print(f"Mock upstreams listening on {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
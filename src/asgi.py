@@ -0,0 +1,184 @@
+# ASGI entry point serving the summarization pipeline on asyncio
+#
+# Run with:  uvicorn src.asgi:app --host 0.0.0.0 --port 5001
+#       or:  gunicorn src.asgi:app -k uvicorn.workers.UvicornWorker
+#
+# Only the API routes that spend their time waiting on upstream I/O are served here;
+# the Flask app in yt_summarizer.py remains the full-featured WSGI entry point.
+
+import asyncio
+import json
+import re
+import time
+
+import httpx
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import STRATEGIES
+from loguru import logger
+
+try:
+    from src import yt_summarizer as core
+    from src import async_pipeline as pipeline
+    from src import metrics
+except ImportError:
+    import yt_summarizer as core
+    import async_pipeline as pipeline
+    import metrics
+
+# Same storage and strategy as the Flask app, so the limit holds across workers and instances
+SUMMARIZE_LIMIT = parse("5 per minute")
+rate_limiter = STRATEGIES[core.RATELIMIT_STRATEGY](storage_from_string(core.RATELIMIT_STORAGE_URI))
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_body(send, status, body, content_type):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-request-id", metrics.get_request_id().encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status, data):
+    await _send_body(send, status, json.dumps(data).encode("utf-8"), b"application/json")
+
+
+async def metrics_endpoint(scope, receive, send):
+    await _send_body(send, 200, metrics.registry.render().encode("utf-8"),
+                     b"text/plain; version=0.0.4; charset=utf-8")
+
+
+async def health_check(scope, receive, send):
+    await _send_json(send, 200, {
+        'status': 'healthy',
+        'version': core.VERSION,
+        'cache': {
+            'transcripts': core.transcript_cache.stats(),
+            'summaries': core.summary_cache.stats()
+        },
+        'upstreams': {
+            'searchapi': pipeline.searchapi_client.stats(),
+            'deepseek': pipeline.deepseek_client.stats()
+        },
+        'llm_providers': pipeline.llm_pool.stats(),
+        'singleflight': {
+            'transcripts': core.transcript_flight.stats(),
+            'summaries': core.summary_flight.stats()
+        }
+    })
+
+
+async def summarize_video(scope, receive, send):
+    remote_addr = (scope.get("client") or ("unknown",))[0]
+    # The limiter storage may be SQLite or Redis; keep its I/O off the event loop
+    if not await asyncio.to_thread(rate_limiter.hit, SUMMARIZE_LIMIT, "summarize", remote_addr):
+        return await _send_json(send, 429, {'error': f'Rate limit exceeded: {SUMMARIZE_LIMIT}'})
+
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        logger.warning(f"Invalid request format from {remote_addr}")
+        return await _send_json(send, 400, {'error': 'Invalid request format. JSON required'})
+
+    url = data.get('url')
+    if not url:
+        logger.warning(f"Missing YouTube URL in request from {remote_addr}")
+        return await _send_json(send, 400, {'error': 'Missing YouTube URL'})
+
+    deepseek_key = data.get('deepseek_key')
+    searchapi_key = data.get('searchapi_key')
+    refresh = bool(data.get('refresh', False))
+    timestamps = bool(data.get('timestamps', False))
+
+    try:
+        video_id = core.extract_video_id(url)
+        logger.info(f"Processing video ID: {video_id} from IP: {remote_addr}")
+
+        try:
+            transcript = await pipeline.get_transcript_cached_async(video_id, searchapi_key, refresh=refresh)
+        except Exception as e:
+            logger.error(f"Error getting transcript: {str(e)}")
+            return await _send_json(send, core.error_status(e),
+                                    {'error': f"Failed to get transcript: {str(e)}"})
+
+        try:
+            summary = await pipeline.summarize_transcript_async(transcript, deepseek_key, refresh=refresh,
+                                                                timestamps=timestamps)
+        except Exception as e:
+            logger.error(f"Error generating summary: {str(e)}")
+            return await _send_json(send, core.error_status(e),
+                                    {'error': f"Failed to generate summary: {str(e)}"})
+
+        await asyncio.to_thread(core.save_summary, video_id, url, summary, timestamps)
+        logger.info(f"Successfully generated summary for video ID: {video_id}")
+        await _send_json(send, 200, {'summary': summary, 'video_id': video_id})
+    except ValueError as e:
+        logger.warning(f"Value error during summarization: {str(e)} for request from {remote_addr}")
+        await _send_json(send, 400, {'error': str(e)})
+    except httpx.HTTPError as e:
+        logger.error(f"HTTP Error during API request: {str(e)} for request from {remote_addr}")
+        await _send_json(send, 500, {'error': f"API Error: {str(e)}"})
+    except Exception as e:
+        logger.exception(f"Unexpected error during summarization: {str(e)} for request from {remote_addr}")
+        await _send_json(send, 500, {'error': f"Unexpected error: {str(e)}"})
+
+
+ROUTES = {
+    ("GET", "/health"): health_check,
+    ("GET", "/metrics"): metrics_endpoint,
+    ("POST", "/summarize"): summarize_video,
+}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await pipeline.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    # Each request runs in its own task, so the request ID set here stays with this request
+    request_id = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1")
+    metrics.set_request_id(request_id if re.match(r'^[\w.-]{1,64}$', request_id) else None)
+
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    endpoint = scope["path"] if handler else "unmatched"
+    status = {}
+
+    async def send_with_metrics(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+            metrics.HTTP_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+        await send(message)
+
+    started = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc()
+    try:
+        if handler is None:
+            await _send_json(send_with_metrics, 404, {'error': 'Resource not found'})
+        else:
+            await handler(scope, receive, send_with_metrics)
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec()
+        metrics.HTTP_REQUESTS.labels(scope["method"], endpoint, str(status.get("code", 500))).inc()
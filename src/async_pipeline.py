@@ -0,0 +1,305 @@
+# asyncio implementation of the fetch -> summarize pipeline
+#
+# Mirrors the synchronous functions in yt_summarizer.py but waits on upstream I/O
+# without holding a thread, so one process can keep hundreds of summarizations in flight.
+
+import asyncio
+import os
+import random
+import time
+
+import httpx
+from loguru import logger
+
+try:
+    from src import yt_summarizer as core
+    from src.upstream import IDEMPOTENT_METHODS, RETRY_STATUSES, CircuitOpenError, parse_retry_after
+    from src.metrics import UPSTREAM_RESPONSES, UPSTREAM_SECONDS, span
+    from src.providers import Provider, ProviderPool
+except ImportError:
+    import yt_summarizer as core
+    from upstream import IDEMPOTENT_METHODS, RETRY_STATUSES, CircuitOpenError, parse_retry_after
+    from metrics import UPSTREAM_RESPONSES, UPSTREAM_SECONDS, span
+    from providers import Provider, ProviderPool
+
+ASYNC_POOL_SIZE = int(os.getenv("ASYNC_POOL_SIZE", 200))
+
+# Raised before a request is sent, so safe to retry for any method
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class AsyncUpstreamClient:
+    """httpx-based counterpart of UpstreamClient sharing its settings and circuit breaker"""
+
+    def __init__(self, sync_client, pool_size=ASYNC_POOL_SIZE):
+        self.name = sync_client.name
+        self.base_url = sync_client.base_url
+        self.max_retries = sync_client.max_retries
+        self.backoff_base = sync_client.backoff_base
+        self.backoff_max = sync_client.backoff_max
+        self.breaker = sync_client.breaker
+        self.quota = sync_client.quota
+        self.pool_size = pool_size
+        connect_timeout, read_timeout = sync_client.timeout
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._client = None
+        self._loop = None
+        self._counters = {"requests": 0, "retries": 0, "errors": 0}
+
+    def _get_client(self):
+        # httpx clients are bound to the event loop they were created on
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size)
+            )
+            self._loop = loop
+        return self._client
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def request(self, method, path, stream=False, quota_key=None, **kwargs):
+        if self.quota is not None and quota_key:
+            await self.quota.acquire_async(quota_key)
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open); try again later")
+
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        recorded = False
+        try:
+            client = self._get_client()
+            for attempt in range(self.max_retries + 1):
+                self._counters["requests"] += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.send(client.build_request(method, path, **kwargs), stream=stream)
+                except httpx.TransportError as e:
+                    UPSTREAM_RESPONSES.labels(self.name, "error").inc()
+                    self._counters["errors"] += 1
+                    if attempt == self.max_retries or not (idempotent or isinstance(e, CONNECT_ERRORS)):
+                        self.breaker.record_failure()
+                        recorded = True
+                        raise
+                    self._counters["retries"] += 1
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+
+                UPSTREAM_SECONDS.labels(self.name).observe(time.perf_counter() - started)
+                UPSTREAM_RESPONSES.labels(self.name, str(response.status_code)).inc()
+                if response.status_code in RETRY_STATUSES:
+                    self._counters["errors"] += 1
+                    if attempt < self.max_retries:
+                        delay = self._backoff(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                        await response.aclose()
+                        self._counters["retries"] += 1
+                        await asyncio.sleep(delay)
+                        continue
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                recorded = True
+                return response
+        finally:
+            # Cancellation or any other exception would otherwise wedge a half-open breaker
+            if not recorded:
+                self.breaker.release()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self):
+        stats = dict(self._counters)
+        stats["circuit"] = self.breaker.stats()
+        if self.quota is not None:
+            stats["quota"] = self.quota.stats()
+        return stats
+
+
+searchapi_client = AsyncUpstreamClient(core.searchapi_client)
+# The same providers as the synchronous pool, each over an httpx client; the latency
+# windows are shared so both pools hedge on the same figures
+llm_pool = ProviderPool(
+    [Provider(provider.name, AsyncUpstreamClient(provider.client), provider.model, provider.api_key, provider.path)
+     for provider in core.llm_pool.providers],
+    hedge_quantile=core.llm_pool.hedge_quantile,
+    hedge_default_delay=core.llm_pool.hedge_default_delay,
+    hedge_budget=core.llm_pool.hedge_budget
+)
+for async_provider, provider in zip(llm_pool.providers, core.llm_pool.providers):
+    async_provider.latency = provider.latency
+deepseek_client = llm_pool.primary.client
+# Another provider is tried after connection errors and timeouts (open circuits included)
+RETRIABLE_ERRORS = (httpx.TransportError, CircuitOpenError)
+
+
+async def get_transcript_segments_async(video_id: str, api_key: str = None) -> core.Transcript:
+    """Fetch YouTube transcript segments, with their timings, using SearchAPI.io"""
+    searchapi_key = api_key or os.getenv("SEARCHAPI_KEY")
+    if not searchapi_key:
+        raise ValueError("SearchAPI.io API key is required. Please provide it in the form or set it in the .env file.")
+
+    with span("fetch_transcript"):
+        response = await searchapi_client.request("GET", "/api/v1/search", params={
+            "engine": "youtube_transcripts",
+            "video_id": video_id,
+            "api_key": searchapi_key
+        }, quota_key=searchapi_key)
+        response.raise_for_status()
+        response_data = response.json()
+
+    if "transcripts" not in response_data or not response_data["transcripts"]:
+        raise ValueError(f"No transcripts available for video ID: {video_id}. The video might not have captions or subtitles.")
+
+    return core.Transcript.from_segments(response_data["transcripts"], video_id)
+
+
+async def summarize_text_async(text: str, api_key: str = None, prompt: str = core.SUMMARY_PROMPT) -> str:
+    """Generate summary using Deepseek API"""
+    deepseek_key = api_key or os.getenv("DEEPSEEK_KEY")
+    if not deepseek_key:
+        raise ValueError("Deepseek API key is required. Please provide it in the form or set it in the .env file.")
+
+    payload = core.build_summary_payload(text, prompt)
+    prompt_tokens = core.count_prompt_tokens(payload)
+    if core.deepseek_token_quota is not None:
+        await core.deepseek_token_quota.acquire_async(deepseek_key, cost=prompt_tokens)
+
+    async def attempt(provider):
+        headers, provider_payload = provider.request_args(payload, deepseek_key)
+        response = await provider.client.request("POST", provider.path, headers=headers,
+                                                 json=provider_payload, quota_key=deepseek_key)
+        response.raise_for_status()
+        return response
+
+    with span("summarize_text"):
+        try:
+            response = await llm_pool.call_async(attempt, retriable=RETRIABLE_ERRORS)
+        except httpx.HTTPStatusError as e:
+            core.raise_deepseek_error(e.response.text)
+            raise
+        data = response.json()
+    core.record_token_usage(data.get("usage"), prompt_tokens)
+    return data["choices"][0]["message"]["content"]
+
+
+async def get_transcript_cached_async(video_id: str, api_key: str = None,
+                                      refresh: bool = False) -> core.Transcript:
+    """Fetch transcript segments, serving repeat requests for the same video from cache
+
+    Cache reads and writes may hit the disk tier, so they run in a thread.
+    """
+    if not refresh:
+        transcript = await asyncio.to_thread(core.transcript_cache.get, video_id)
+        if transcript is not None:
+            logger.info(f"Transcript cache hit for video ID: {video_id}")
+            return transcript
+
+    async def fetch():
+        transcript = await get_transcript_segments_async(video_id, api_key)
+        try:
+            await asyncio.to_thread(core.transcript_cache.set, video_id, transcript)
+        except Exception as e:
+            logger.error(f"Error caching transcript: {str(e)}")
+        return transcript
+
+    return await core.transcript_flight.do_async(
+        core.flight_key(video_id, refresh, api_key),
+        fetch,
+        lookup=None if refresh else lambda: core.transcript_cache.peek(video_id)
+    )
+
+
+async def summarize_text_cached_async(text: str, api_key: str = None, refresh: bool = False,
+                                      prompt: str = core.SUMMARY_PROMPT) -> str:
+    """Generate a summary, keyed by transcript hash, model and prompt"""
+    key = core.content_hash(text, core.SUMMARY_MODEL, prompt, core.SUMMARY_TEMPERATURE)
+    if not refresh:
+        summary = await asyncio.to_thread(core.summary_cache.get, key)
+        if summary is not None:
+            logger.info("Summary cache hit")
+            return summary
+
+    async def generate():
+        summary = await summarize_text_async(text, api_key, prompt=prompt)
+        try:
+            await asyncio.to_thread(core.summary_cache.set, key, summary)
+        except Exception as e:
+            logger.error(f"Error caching summary: {str(e)}")
+        return summary
+
+    return await core.summary_flight.do_async(
+        core.flight_key(key, refresh, api_key),
+        generate,
+        lookup=None if refresh else lambda: core.summary_cache.peek(key)
+    )
+
+
+async def summarize_transcript_async(segments, api_key: str = None, refresh: bool = False,
+                                     chunk_tokens: int = None, parallelism: int = None,
+                                     timestamps: bool = False) -> str:
+    """Summarize transcript segments, using concurrent map-reduce when they exceed one chunk
+
+    Near-duplicates of transcripts summarized before reuse their summary, as in summarize_transcript.
+    """
+    signature, summary = await asyncio.to_thread(core.find_near_duplicate_summary, segments, timestamps, refresh)
+    if summary is not None:
+        return summary
+    summary = await _summarize_segments_async(segments, api_key, refresh, chunk_tokens, parallelism, timestamps)
+    await asyncio.to_thread(core.index_near_duplicate, segments, signature, summary, timestamps)
+    return summary
+
+
+async def _summarize_segments_async(segments, api_key, refresh, chunk_tokens, parallelism, timestamps):
+    chunk_tokens = chunk_tokens or core.SUMMARY_CHUNK_TOKENS
+    parallelism = parallelism or core.SUMMARY_PARALLELISM
+    # Preprocessing, token counting and planning are CPU-bound; keep them off the event loop
+    chunks, (summary_prompt, chunk_prompt, reduce_prompt), _ = await asyncio.to_thread(
+        core.prepare_summary, segments, timestamps, chunk_tokens, parallelism)
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def summarize_chunk(chunk, prompt):
+        async with semaphore:
+            return await summarize_text_cached_async(chunk, api_key, refresh, prompt=prompt)
+
+    if len(chunks) <= 1:
+        return await summarize_text_cached_async(chunks[0], api_key, refresh, prompt=summary_prompt)
+
+    logger.info(f"Summarizing transcript in {len(chunks)} chunks")
+    prompt = chunk_prompt
+    while True:
+        partials = await asyncio.gather(*(summarize_chunk(chunk, prompt) for chunk in chunks))
+
+        # Merge in groups while the partial lists are still too large for one reduce call
+        merged = "\n\n".join(partials)
+        groups = core.chunk_segments(partials, chunk_tokens)
+        if core.estimate_tokens(merged) <= chunk_tokens or len(groups) >= len(partials):
+            return await summarize_text_cached_async(merged, api_key, refresh, prompt=reduce_prompt)
+        chunks = groups
+        prompt = reduce_prompt
+
+
+async def run_pipeline_async(video_id: str, url: str, searchapi_key: str = None,
+                             deepseek_key: str = None, refresh: bool = False,
+                             timestamps: bool = False) -> str:
+    """Fetch, summarize and save one video without blocking the event loop"""
+    transcript = await get_transcript_cached_async(video_id, searchapi_key, refresh=refresh)
+    summary = await summarize_transcript_async(transcript, deepseek_key, refresh=refresh, timestamps=timestamps)
+    # File and history writes are blocking; keep them off the event loop (to_thread copies
+    # the context, so the request ID still reaches the logs)
+    await asyncio.to_thread(core.save_summary, video_id, url, summary, timestamps)
+    return summary
+
+
+async def aclose():
+    """Close pooled connections, e.g. on server shutdown"""
+    await searchapi_client.aclose()
+    for provider in llm_pool.providers:
+        await provider.client.aclose()
@@ -0,0 +1,102 @@
+# Concurrent, resumable summarization of many videos
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from loguru import logger
+
+
+def read_urls(lines):
+    """Yield non-empty, non-comment URLs from an iterable of lines"""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+class BatchRunner:
+    """Run process(video_id, url) over many URLs with bounded parallelism
+
+    Video IDs are deduplicated, and every finished result is appended to an optional
+    JSONL state file. Running again with the same state file skips videos that already
+    succeeded (their stored results are re-emitted with "resumed": true) and retries
+    the ones that failed. extract_video_ids(urls) yields (url, video_id, error) per URL,
+    like video_ids.extract_video_ids.
+    """
+
+    def __init__(self, process, extract_video_ids, concurrency=4, state_path=None):
+        self.process = process
+        self.extract_video_ids = extract_video_ids
+        self.concurrency = max(1, concurrency)
+        self.state_path = state_path
+        self._state_lock = threading.Lock()
+
+    def _load_state(self):
+        completed = {}
+        if not self.state_path or not os.path.exists(self.state_path):
+            return completed
+        with open(self.state_path, "r") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # A crash can leave a truncated last line; ignore it
+                    continue
+                if result.get("status") == "ok":
+                    completed[result["video_id"]] = result
+        return completed
+
+    def _record(self, result):
+        if not self.state_path:
+            return
+        with self._state_lock:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.state_path, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+    def _run_one(self, video_id, url):
+        try:
+            summary = self.process(video_id, url)
+            result = {"video_id": video_id, "url": url, "status": "ok", "summary": summary}
+        except Exception as e:
+            logger.error(f"Batch item {video_id} failed: {str(e)}")
+            result = {"video_id": video_id, "url": url, "status": "error", "error": str(e)}
+        self._record(result)
+        return result
+
+    def run(self, urls):
+        """Yield one result dict per unique video, in completion order"""
+        completed = self._load_state()
+        seen = set()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = set()
+            for url, video_id, error in self.extract_video_ids(urls):
+                if error:
+                    yield {"url": url, "status": "error", "error": error}
+                    continue
+
+                if video_id in seen:
+                    continue
+                seen.add(video_id)
+
+                if video_id in completed:
+                    yield dict(completed[video_id], resumed=True)
+                    continue
+
+                # Keep the number of queued futures bounded so huge inputs stream through
+                if len(pending) >= self.concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+
+                pending.add(executor.submit(self._run_one, video_id, url))
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
@@ -0,0 +1,218 @@
+# Two-level (memory + disk) cache for transcripts and summaries
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_hash(*parts) -> str:
+    """Build a stable cache key from one or more string parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with optional TTL"""
+
+    def __init__(self, max_entries=256, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, stored_at = item
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """Persistent cache storing one file per key, with TTL and size-based eviction"""
+
+    def __init__(self, directory, ttl=None, max_bytes=None, dumps=None, loads=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.dumps = dumps or (lambda value: json.dumps(value).encode("utf-8"))
+        self.loads = loads or (lambda data: json.loads(data.decode("utf-8")))
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, content_hash(key) + ".cache")
+
+    def _scan(self):
+        """Return (path, size, mtime) for every cache file"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(".cache"):
+                        stat = entry.stat()
+                        entries.append((entry.path, stat.st_size, stat.st_mtime))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def get(self, key, stale_ok=False):
+        """Return the value for key, or None; stale_ok also returns entries past their TTL"""
+        path = self._path(key)
+        try:
+            if not stale_ok and self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                self.delete(key)
+                return None
+            with open(path, "rb") as f:
+                return self.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Treat unreadable or corrupt entries as misses
+            self.delete(key)
+            return None
+
+    def set(self, key, value):
+        data = self.dumps(value)
+        path = self._path(key)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Write to a temporary file first so readers never see partial entries
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            try:
+                previous_size = os.path.getsize(path)
+            except OSError:
+                previous_size = 0
+            os.replace(tmp_path, path)
+        finally:
+            # Only left behind if the write or the rename failed
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+        if self.max_bytes is not None:
+            with self._lock:
+                if self._total_bytes is None:
+                    self._total_bytes = sum(size for _, size, _ in self._scan())
+                else:
+                    self._total_bytes += len(data) - previous_size
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+
+    def _evict(self):
+        """Delete expired entries, then the oldest ones, until under the size budget"""
+        entries = sorted(self._scan(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for path, size, mtime in entries:
+            expired = self.ttl is not None and now - mtime > self.ttl
+            if not expired and total <= self.max_bytes:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def delete(self, key):
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        if self.max_bytes is not None:
+            with self._lock:
+                if self._total_bytes is not None:
+                    self._total_bytes = max(0, self._total_bytes - size)
+
+
+class TieredCache:
+    """In-process LRU in front of a persistent disk cache, with hit/miss counters"""
+
+    def __init__(self, name, memory, disk=None):
+        self.name = name
+        self.memory = memory
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def get(self, key, stale_ok=False):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        if self.disk is not None:
+            value = self.disk.get(key, stale_ok=stale_ok)
+            if value is not None:
+                self._count("disk_hits")
+                self.memory.set(key, value)
+                return value
+
+        self._count("misses")
+        return None
+
+    def peek(self, key):
+        """Look a value up without counting a hit or miss, for callers that poll"""
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+        return value
+
+    def set(self, key, value):
+        self._count("writes")
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        return stats
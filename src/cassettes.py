@@ -0,0 +1,327 @@
+# Record and replay of upstream HTTP traffic, for deterministic performance testing offline
+#
+# A cassette is a JSON-lines file (gzip-compressed when its name ends in .gz) holding one
+# interaction per line: the request it answers, the status and headers, the time to the
+# response headers, and the body as (seconds after the headers, text) chunks, so a replayed
+# stream arrives with the cadence it was recorded with. In record mode the adapters pass
+# requests through to the real upstream and write what came back; in replay mode they answer
+# from the cassette without any network, optionally faster or slower than recorded.
+#
+# Requests are matched on upstream name, method, path, query string and body. API keys
+# (the api_key query parameter and the Authorization header) are neither matched nor stored.
+# A request missing from the cassette raises CassetteMiss, which is not a requests exception,
+# so the upstream client neither retries it nor counts it against the circuit breaker.
+
+import base64
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+try:
+    from src.cache import content_hash
+except ImportError:
+    from cache import content_hash
+
+MODES = ("record", "replay")
+SECRET_PARAMS = frozenset(("api_key", "key", "token", "access_token"))
+# The recorded body is stored decoded, so headers describing its wire encoding do not apply
+_SKIP_HEADERS = frozenset(("content-encoding", "content-length", "transfer-encoding", "set-cookie", "connection"))
+# Chunks arriving within this many seconds of each other are stored as one
+_CHUNK_RESOLUTION = 0.001
+
+
+class CassetteMiss(RuntimeError):
+    """A replayed request that was never recorded"""
+
+
+def _redact(url):
+    split = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(split.query, keep_blank_values=True)
+             if name not in SECRET_PARAMS]
+    return urlunsplit(split._replace(query=urlencode(sorted(query))))
+
+
+def request_key(upstream, method, url, body=None, match_body=True):
+    """Key a request is recorded and looked up under"""
+    split = urlsplit(_redact(url))
+    parts = [upstream, method.upper(), split.path, split.query]
+    if match_body and body:
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", "replace")
+        try:
+            # Key order in the JSON body does not matter
+            body = json.dumps(json.loads(body), sort_keys=True)
+        except ValueError:
+            pass
+        parts.append(body)
+    return content_hash(*parts)[:32]
+
+
+def _encode_chunks(chunks):
+    """[(offset, bytes)] as JSON-friendly (chunks, encoding), merging chunks that arrived together"""
+    merged = []
+    for offset, data in chunks:
+        if merged and offset - merged[-1][0] < _CHUNK_RESOLUTION:
+            merged[-1][1] += data
+        else:
+            merged.append([offset, data])
+    try:
+        return [[round(offset, 4), data.decode("utf-8")] for offset, data in merged], None
+    except UnicodeDecodeError:
+        return [[round(offset, 4), base64.b64encode(data).decode("ascii")] for offset, data in merged], "base64"
+
+
+def _decode_chunks(chunks, encoding):
+    if encoding == "base64":
+        return [(offset, base64.b64decode(data)) for offset, data in chunks]
+    return [(offset, data.encode("utf-8")) for offset, data in chunks]
+
+
+class Cassette:
+    """Recorded interactions of one or more upstreams, stored in one file
+
+    mode:        "record" appends every interaction to the file; "replay" answers from it
+    speed:       replay speed; 1 keeps the recorded timing, 2 halves it, 0 removes all delays
+    match_body:  also match requests on their body; off, any request to the same path matches
+    """
+
+    def __init__(self, path, mode="replay", speed=1.0, match_body=True):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.match_body = match_body
+        self._lock = threading.Lock()
+        self._interactions = defaultdict(list)
+        self._played = defaultdict(int)
+        self._counters = {"recorded": 0, "replayed": 0, "missing": 0}
+        if mode == "replay":
+            self._load()
+
+    def _open(self, mode):
+        return gzip.open(self.path, mode + "t", encoding="utf-8") if self.path.endswith(".gz") \
+            else open(self.path, mode, encoding="utf-8")
+
+    def _load(self):
+        with self._open("r") as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    self._interactions[interaction["key"]].append(interaction)
+
+    def __len__(self):
+        return sum(len(interactions) for interactions in self._interactions.values())
+
+    def urls(self, upstream=None):
+        """Redacted URLs of the recorded requests, optionally of one upstream only"""
+        return [interaction["url"] for interactions in self._interactions.values() for interaction in interactions
+                if upstream is None or interaction["upstream"] == upstream]
+
+    def key(self, upstream, request):
+        return request_key(upstream, request.method, request.url, request.body, self.match_body)
+
+    def record(self, interaction):
+        line = json.dumps(interaction, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            with self._open("a") as f:
+                f.write(line)
+            self._counters["recorded"] += 1
+
+    def play(self, key):
+        """The next recorded interaction for key, in recording order (the last one repeats), or None"""
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                self._counters["missing"] += 1
+                return None
+            played = self._played[key]
+            self._played[key] = played + 1
+            self._counters["replayed"] += 1
+            return interactions[min(played, len(interactions) - 1)]
+
+    def delay(self, seconds):
+        """Sleep for a recorded duration, scaled by the replay speed"""
+        if self.speed > 0 and seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def adapter(self, client):
+        """Transport adapter recording or replaying the traffic of an UpstreamClient"""
+        if self.mode == "record":
+            return RecordingAdapter(self, client.name, pool_maxsize=client.pool_size)
+        return ReplayAdapter(self, client.name)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, mode=self.mode, interactions=len(self))
+
+
+class _RecordingBody:
+    """Wraps a urllib3 response body, noting when each chunk arrives"""
+
+    def __init__(self, raw, started, on_done):
+        self._raw = raw
+        self._started = started
+        self._on_done = on_done
+        self._chunks = []
+        self._done = False
+
+    def _note(self, data):
+        if data:
+            self._chunks.append((time.perf_counter() - self._started, data))
+        return data
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            self._on_done(self._chunks)
+
+    def stream(self, amt=2 ** 16, decode_content=True):
+        for data in self._raw.stream(amt, decode_content=True):
+            yield self._note(data)
+        self._finish()
+
+    def read(self, amt=None, **kwargs):
+        data = self._note(self._raw.read(amt, decode_content=True))
+        if not data or amt is None:
+            self._finish()
+        return data
+
+    def close(self):
+        # A body closed before the end is recorded as far as it was read
+        self._finish()
+        self._raw.close()
+
+    def release_conn(self):
+        self._raw.release_conn()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """HTTPAdapter that also writes every interaction to a cassette"""
+
+    def __init__(self, cassette, upstream, **kwargs):
+        super().__init__(pool_connections=1, **kwargs)
+        self.cassette = cassette
+        self.upstream = upstream
+
+    def send(self, request, **kwargs):
+        interaction = {
+            "key": self.cassette.key(self.upstream, request),
+            "upstream": self.upstream,
+            "method": request.method,
+            "url": _redact(request.url),
+        }
+        started = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            interaction.update(elapsed=round(time.perf_counter() - started, 4), error=type(e).__name__)
+            self.cassette.record(interaction)
+            raise
+        headers_at = time.perf_counter()
+        interaction.update(
+            elapsed=round(headers_at - started, 4),
+            status=response.status_code,
+            reason=response.reason,
+            headers={name: value for name, value in response.headers.items() if name.lower() not in _SKIP_HEADERS},
+        )
+
+        def done(chunks):
+            interaction["chunks"], encoding = _encode_chunks(chunks)
+            if encoding:
+                interaction["encoding"] = encoding
+            self.cassette.record(interaction)
+
+        response.raw = _RecordingBody(response.raw, headers_at, done)
+        return response
+
+
+class _ReplayBody:
+    """File-like response body that hands out recorded chunks on their recorded schedule"""
+
+    def __init__(self, chunks, cassette):
+        self._chunks = chunks
+        self._cassette = cassette
+        self._position = 0
+        self._started = time.perf_counter()
+        self.closed = False
+
+    def _next(self):
+        offset, data = self._chunks[self._position]
+        self._position += 1
+        if self._cassette.speed > 0:
+            self._cassette.delay(offset - (time.perf_counter() - self._started) * self._cassette.speed)
+        return data
+
+    def stream(self, amt=2 ** 16, decode_content=True):
+        while not self.closed and self._position < len(self._chunks):
+            yield self._next()
+
+    def read(self, amt=None, **kwargs):
+        if self.closed or self._position >= len(self._chunks):
+            return b""
+        if amt is not None:
+            return self._next()
+        return b"".join(self.stream())
+
+    def close(self):
+        self.closed = True
+
+    def release_conn(self):
+        pass
+
+
+def _recorded_error(name):
+    """The requests exception class a recorded error name stands for, e.g. ReadTimeout"""
+    error = getattr(requests.exceptions, name, None)
+    if isinstance(error, type) and issubclass(error, (requests.ConnectionError, requests.Timeout)):
+        return error
+    return requests.Timeout if name.endswith("Timeout") else requests.ConnectionError
+
+
+class ReplayAdapter(BaseAdapter):
+    """Answers requests from a cassette; a request that was never recorded raises CassetteMiss"""
+
+    def __init__(self, cassette, upstream):
+        super().__init__()
+        self.cassette = cassette
+        self.upstream = upstream
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        interaction = self.cassette.play(self.cassette.key(self.upstream, request))
+        if interaction is None:
+            raise CassetteMiss(
+                f"No recorded {self.upstream} response for {request.method} {_redact(request.url)} "
+                f"in cassette {self.cassette.path}"
+            )
+        self.cassette.delay(interaction["elapsed"])
+        if "error" in interaction:
+            error = _recorded_error(interaction["error"])
+            raise error(f"Recorded {interaction['error']} from {self.upstream}", request=request)
+
+        response = Response()
+        response.status_code = interaction["status"]
+        response.reason = interaction.get("reason")
+        response.headers = CaseInsensitiveDict(interaction.get("headers", {}))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _ReplayBody(_decode_chunks(interaction.get("chunks", []), interaction.get("encoding")),
+                                   self.cassette)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,91 @@
+# Splitting transcripts into token-budgeted chunks for map-reduce summarization
+
+try:
+    from src.transcript import Transcript
+except ImportError:
+    from transcript import Transcript
+
+# Rough average for English text with the Deepseek/OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for sizing chunks"""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _split_oversized(segment: str, max_tokens: int):
+    """Split a single segment that exceeds the budget on word boundaries"""
+    # Count characters rather than rounding each word down to whole tokens, which
+    # would let a chunk of short words exceed the budget
+    max_chars = max_tokens * CHARS_PER_TOKEN + CHARS_PER_TOKEN - 1
+    current, current_chars = [], 0
+    for word in segment.split():
+        word_chars = len(word) + bool(current)
+        if current and current_chars + word_chars > max_chars:
+            yield " ".join(current)
+            current, current_chars, word_chars = [], 0, len(word)
+        current.append(word)
+        current_chars += word_chars
+    if current:
+        yield " ".join(current)
+
+
+def chunk_segments(segments, max_tokens: int) -> list:
+    """Greedily pack consecutive segments into chunks of at most max_tokens
+
+    Segments are never split unless a single segment is larger than the budget
+    on its own, so chunk boundaries line up with caption boundaries.
+    """
+    if isinstance(segments, Transcript):
+        return _chunk_transcript(segments, max_tokens)
+
+    chunks = []
+    current, current_tokens = [], 0
+
+    for segment in segments:
+        segment_tokens = estimate_tokens(segment) + 1
+        if segment_tokens > max_tokens:
+            if current:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(segment, max_tokens))
+            continue
+
+        if current and current_tokens + segment_tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(segment)
+        current_tokens += segment_tokens
+
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def _chunk_transcript(transcript, max_tokens: int) -> list:
+    """chunk_segments for a Transcript, slicing chunks out of its text buffer
+
+    Segment sizes come from the offsets, so no per-segment strings are built except
+    for segments that have to be split.
+    """
+    chunks = []
+    first, current_tokens = 0, 0
+
+    for index in range(len(transcript)):
+        segment_tokens = max(1, transcript.segment_length(index) // CHARS_PER_TOKEN) + 1
+        if segment_tokens > max_tokens:
+            if index > first:
+                chunks.append(transcript.text_between(first, index))
+            chunks.extend(_split_oversized(transcript[index], max_tokens))
+            first, current_tokens = index + 1, 0
+            continue
+
+        if index > first and current_tokens + segment_tokens > max_tokens:
+            chunks.append(transcript.text_between(first, index))
+            first, current_tokens = index, 0
+        current_tokens += segment_tokens
+
+    if len(transcript) > first:
+        chunks.append(transcript.text_between(first, len(transcript)))
+    return chunks
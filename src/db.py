@@ -0,0 +1,42 @@
+# SQLite helpers shared by the persistent stores
+
+import os
+import sqlite3
+import threading
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a SQLite connection tuned for concurrent readers and a single writer"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def sqlite_path(uri: str) -> str:
+    """Extract the file path from a sqlite:///path URI"""
+    if not uri.startswith("sqlite:///"):
+        raise ValueError(f"Unsupported SQLite URI: {uri}")
+    return uri[len("sqlite:///"):]
+
+
+class ThreadLocalConnection:
+    """One SQLite connection per thread for a given database file"""
+
+    def __init__(self, path: str, init_sql: str = None):
+        self.path = path
+        self._local = threading.local()
+        if init_sql:
+            self.get().executescript(init_sql)
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            self._local.conn = conn
+        return conn
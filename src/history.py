@@ -0,0 +1,183 @@
+# Summary history stored in SQLite, replacing the rewrite-everything JSON file
+
+import json
+import os
+import sqlite3
+
+from loguru import logger
+
+try:
+    from src.db import ThreadLocalConnection
+except ImportError:
+    from db import ThreadLocalConnection
+
+COLUMNS = ("id", "video_id", "url", "timestamp", "summary_file", "summary_config")
+
+
+class HistoryStore:
+    """Summary history with indexes on video_id and timestamp
+
+    Appends are a single INSERT, so their cost does not grow with the size of the
+    history. Listing uses keyset pagination on the row id (newest first). Each entry
+    records the settings (model, temperature, prompt version) its summary was made
+    with, so summaries made with older settings can be found and regenerated.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT NOT NULL,
+            url TEXT,
+            timestamp TEXT NOT NULL,
+            summary_file TEXT,
+            summary_config TEXT
+        );
+        CREATE INDEX IF NOT EXISTS history_video_id ON history (video_id, id);
+        CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp);
+    """
+
+    def __init__(self, path: str, legacy_json_path: str = None):
+        self.path = path
+        self._conn = ThreadLocalConnection(path, self.SCHEMA)
+        self._add_summary_config_column()
+        if legacy_json_path:
+            self.migrate_json(legacy_json_path)
+
+    def _add_summary_config_column(self):
+        """Databases created before summary_config was recorded get the column added"""
+        conn = self._conn.get()
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(history)")}
+        if "summary_config" in columns:
+            return
+        try:
+            conn.execute("ALTER TABLE history ADD COLUMN summary_config TEXT")
+        except sqlite3.OperationalError:
+            # Another process added it first
+            pass
+
+    def migrate_json(self, json_path: str) -> int:
+        """Import entries from the old JSON history file once, then rename it"""
+        if not os.path.exists(json_path):
+            return 0
+        conn = self._conn.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have finished the migration while we waited for the lock
+            if not os.path.exists(json_path):
+                conn.execute("COMMIT")
+                return 0
+            with open(json_path, "r") as f:
+                entries = json.load(f)
+            conn.executemany(
+                "INSERT INTO history (video_id, url, timestamp, summary_file) VALUES (?, ?, ?, ?)",
+                [(e.get("video_id"), e.get("url"), e.get("timestamp"), e.get("summary_file"))
+                 for e in sorted(entries, key=lambda e: e.get("timestamp") or "")
+                 if e.get("video_id") and e.get("timestamp")]
+            )
+            os.replace(json_path, json_path + ".migrated")
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            logger.error(f"Error migrating history file {json_path}: {str(e)}")
+            return 0
+        logger.info(f"Migrated {len(entries)} history entries from {json_path}")
+        return len(entries)
+
+    def append(self, video_id, url, timestamp, summary_file, summary_config=None) -> int:
+        cursor = self._conn.get().execute(
+            "INSERT INTO history (video_id, url, timestamp, summary_file, summary_config) VALUES (?, ?, ?, ?, ?)",
+            (video_id, url, timestamp, summary_file, _encode_config(summary_config))
+        )
+        return cursor.lastrowid
+
+    def append_many(self, entries) -> int:
+        """append() every (video_id, url, timestamp, summary_file, summary_config) in one transaction"""
+        conn = self._conn.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO history (video_id, url, timestamp, summary_file, summary_config) VALUES (?, ?, ?, ?, ?)",
+                [(video_id, url, timestamp, summary_file, _encode_config(summary_config))
+                 for video_id, url, timestamp, summary_file, summary_config in entries]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(entries)
+
+    def set_summary_config(self, video_id, summary_config):
+        """Record that the stored summary of video_id was regenerated with summary_config"""
+        self._conn.get().execute(
+            "UPDATE history SET summary_config = ? WHERE video_id = ?",
+            (_encode_config(summary_config), video_id)
+        )
+
+    def list(self, limit=50, cursor=None, video_id=None, since=None, until=None):
+        """Return (entries, next_cursor), newest first; pass next_cursor back to get the next page"""
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        if video_id:
+            clauses.append("video_id = ?")
+            params.append(video_id)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        rows = self._conn.get().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM history {where} ORDER BY id DESC LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+        entries = [_decode_row(row) for row in rows[:limit]]
+        next_cursor = entries[-1]["id"] if len(rows) > limit else None
+        return entries, next_cursor
+
+    def iter_videos(self, batch_size=1000):
+        """Iterate over the latest entry of every video, in video_id order
+
+        Pages on video_id through the (video_id, id) index, so each page reads only its
+        own videos' index entries rather than grouping the whole table again.
+        """
+        cursor = ""
+        while True:
+            rows = self._conn.get().execute(
+                f"SELECT {', '.join(COLUMNS)} FROM history WHERE id IN "
+                f"(SELECT MAX(id) FROM history WHERE video_id > ? GROUP BY video_id ORDER BY video_id LIMIT ?) "
+                f"ORDER BY video_id",
+                (cursor, batch_size)
+            ).fetchall()
+            yield from (_decode_row(row) for row in rows)
+            if len(rows) < batch_size:
+                return
+            cursor = rows[-1]["video_id"]
+
+    def iter_all(self, batch_size=1000, **filters):
+        """Iterate over every matching entry, newest first, one page at a time"""
+        cursor = None
+        while True:
+            entries, cursor = self.list(limit=batch_size, cursor=cursor, **filters)
+            yield from entries
+            if cursor is None:
+                return
+
+    def count(self) -> int:
+        return self._conn.get().execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+
+def _encode_config(summary_config):
+    return json.dumps(summary_config, sort_keys=True) if summary_config is not None else None
+
+
+def _decode_row(row):
+    entry = dict(row)
+    try:
+        entry["summary_config"] = json.loads(entry["summary_config"]) if entry["summary_config"] else None
+    except ValueError:
+        entry["summary_config"] = None
+    return entry
@@ -0,0 +1,88 @@
+# HTTP caching helpers: strong ETags, If-None-Match matching and precompressed bodies
+#
+# Standard library only (brotli is optional), so the serverless entry point can use them
+# without importing Flask.
+
+import gzip
+import hashlib
+
+try:
+    import brotli  # optional dependency
+except ImportError:
+    brotli = None
+
+
+def strong_etag(data: bytes) -> str:
+    """Strong ETag (without quotes) from the content hash of a response body"""
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header value matches etag (weak comparison, as for GET)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Content codings an Accept-Encoding header value allows (q > 0)"""
+    accepted = set()
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding)
+    return accepted
+
+
+class Precompressed:
+    """A response body compressed once, up front, in every supported content coding
+
+    Each variant has its own strong ETag, since the bytes differ. Brotli variants are
+    only built when the brotli package is installed.
+    """
+
+    def __init__(self, data: bytes, content_type: str):
+        self.content_type = content_type
+        etag = strong_etag(data)
+        self.variants = {"identity": (data, etag)}
+        # mtime=0 keeps the gzip bytes, and so the ETag, identical across restarts
+        self.variants["gzip"] = (gzip.compress(data, compresslevel=9, mtime=0), etag + "-gz")
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(data), etag + "-br")
+
+    def select(self, accept_encoding: str):
+        """(content coding, body, etag) of the smallest variant the client accepts"""
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                body, etag = self.variants[encoding]
+                return encoding, body, etag
+        body, etag = self.variants["identity"]
+        return "identity", body, etag
+
+    def headers(self, encoding: str, etag: str, cache_control: str) -> dict:
+        headers = {
+            "Content-Type": self.content_type,
+            "ETag": f'"{etag}"',
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return headers
@@ -0,0 +1,416 @@
+# Background job queue for running the summarization pipeline off the request path
+#
+# Each JobQueue is a worker identified by host, pid and a random suffix. It records a heartbeat
+# in the store every few seconds and notes itself on the jobs it claims. Jobs whose worker (or
+# owner) has stopped heartbeating are recovered by any live queue: unowned running jobs go
+# back to the queue, and owned ones, whose API keys died with their worker, fail.
+
+import abc
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from loguru import logger
+
+try:
+    from src.db import ThreadLocalConnection, sqlite_path
+except ImportError:
+    from db import ThreadLocalConnection, sqlite_path
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+# Error for a job whose API keys were held by a worker process that is gone
+LOST_SECRETS_ERROR = ("The API keys for this job were held by a worker process that has stopped; "
+                      "submit the job again")
+
+
+class JobStore(abc.ABC):
+    """Persistence interface for jobs
+
+    Implementations must make create() collapse jobs with the same dedupe_key while
+    one is still active, and make claim() hand each queued job to exactly one worker.
+    A job created with an owner (the process holding its API keys) is only claimed by
+    that owner. Workers record heartbeats; requeue_stale() recovers the jobs of workers
+    that have stopped.
+    """
+
+    @abc.abstractmethod
+    def create(self, dedupe_key: str, payload: dict, owner: str = None):
+        """Create a queued job, returning (job_id, created); reuses an active duplicate"""
+
+    @abc.abstractmethod
+    def claim(self, owner: str = None):
+        """Atomically mark the oldest queued job without an owner, or owned by owner, as running
+
+        The job's worker is recorded as owner, so it can be recovered if that worker stops.
+        """
+
+    @abc.abstractmethod
+    def update(self, job_id: str, **fields):
+        """Set fields of a job"""
+
+    @abc.abstractmethod
+    def get(self, job_id: str):
+        """The job as a dict, or None"""
+
+    @abc.abstractmethod
+    def heartbeat(self, worker: str):
+        """Record that worker is alive"""
+
+    @abc.abstractmethod
+    def requeue_stale(self, dead_before: float) -> int:
+        """Return running jobs of workers not heard from since dead_before to the queue
+
+        Owned jobs cannot run anywhere else, so queued or running jobs whose owner has
+        not been heard from since dead_before are marked failed with LOST_SECRETS_ERROR
+        instead. Running jobs without a recorded worker count as abandoned once started
+        before dead_before. Returns the number of jobs requeued.
+        """
+
+    @abc.abstractmethod
+    def counts(self) -> dict:
+        """Number of jobs per status"""
+
+
+class MemoryJobStore(JobStore):
+    """Process-local job store; useful for tests and single-process deployments"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def create(self, dedupe_key, payload, owner=None):
+        with self._lock:
+            for job in self._jobs.values():
+                if job["dedupe_key"] == dedupe_key and job["status"] in ACTIVE_STATUSES:
+                    return job["id"], False
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id, "dedupe_key": dedupe_key, "status": QUEUED, "phase": None,
+                "payload": payload, "result": None, "error": None, "owner": owner, "worker": None,
+                "created_at": time.time(), "started_at": None, "finished_at": None
+            }
+            return job_id, True
+
+    def claim(self, owner=None):
+        with self._lock:
+            queued = [job for job in self._jobs.values()
+                      if job["status"] == QUEUED and job["owner"] in (None, owner)]
+            if not queued:
+                return None
+            job = min(queued, key=lambda j: j["created_at"])
+            job.update(status=RUNNING, started_at=time.time(), worker=owner)
+            return dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def heartbeat(self, worker):
+        with self._lock:
+            self._workers[worker] = time.time()
+
+    def requeue_stale(self, dead_before):
+        with self._lock:
+            for worker, seen_at in list(self._workers.items()):
+                if seen_at < dead_before:
+                    del self._workers[worker]
+            requeued = 0
+            for job in self._jobs.values():
+                if job["status"] not in ACTIVE_STATUSES:
+                    continue
+                if job["owner"] is not None:
+                    if job["owner"] not in self._workers:
+                        job.update(status=FAILED, error=LOST_SECRETS_ERROR, finished_at=time.time())
+                elif job["status"] == RUNNING and (
+                        job["worker"] not in self._workers if job["worker"] is not None
+                        else job["started_at"] < dead_before):
+                    job.update(status=QUEUED, started_at=None, worker=None)
+                    requeued += 1
+            return requeued
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return counts
+
+
+class SQLiteJobStore(JobStore):
+    """Job store in a SQLite database, shared by every worker process on the host"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            dedupe_key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            phase TEXT,
+            payload TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            owner TEXT,
+            worker TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+        CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_dedupe ON jobs (dedupe_key)
+            WHERE status IN ('queued', 'running');
+        CREATE TABLE IF NOT EXISTS workers (
+            worker TEXT PRIMARY KEY,
+            seen_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = ThreadLocalConnection(path, self.SCHEMA)
+        self._add_columns()
+
+    def _add_columns(self):
+        """Databases created before jobs had owners and workers get the columns added"""
+        conn = self._conn.get()
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("owner", "worker"):
+            if column in columns:
+                continue
+            try:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+            except sqlite3.OperationalError:
+                # Another process added it first
+                pass
+
+    @staticmethod
+    def _row_to_job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def create(self, dedupe_key, payload, owner=None):
+        conn = self._conn.get()
+        job_id = uuid.uuid4().hex
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = conn.execute(
+                "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN (?, ?)",
+                (dedupe_key, QUEUED, RUNNING)
+            ).fetchone()
+            if existing:
+                conn.execute("COMMIT")
+                return existing["id"], False
+            conn.execute(
+                "INSERT INTO jobs (id, dedupe_key, status, payload, created_at, owner) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, dedupe_key, QUEUED, json.dumps(payload), time.time(), owner)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id, True
+
+    def claim(self, owner=None):
+        conn = self._conn.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? AND (owner IS NULL OR owner = ?) ORDER BY created_at LIMIT 1",
+                (QUEUED, owner)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            started_at = time.time()
+            conn.execute("UPDATE jobs SET status = ?, started_at = ?, worker = ? WHERE id = ?",
+                         (RUNNING, started_at, owner, row["id"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        job = self._row_to_job(row)
+        job.update(status=RUNNING, started_at=started_at, worker=owner)
+        return job
+
+    def update(self, job_id, **fields):
+        if not fields:
+            return
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._conn.get().execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        row = self._conn.get().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def heartbeat(self, worker):
+        self._conn.get().execute("INSERT OR REPLACE INTO workers (worker, seen_at) VALUES (?, ?)",
+                                 (worker, time.time()))
+
+    def requeue_stale(self, dead_before):
+        conn = self._conn.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM workers WHERE seen_at < ?", (dead_before,))
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?) "
+                "AND owner IS NOT NULL AND owner NOT IN (SELECT worker FROM workers)",
+                (FAILED, LOST_SECRETS_ERROR, time.time(), QUEUED, RUNNING)
+            )
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, worker = NULL WHERE status = ? AND "
+                "(worker NOT IN (SELECT worker FROM workers) OR (worker IS NULL AND started_at < ?))",
+                (QUEUED, RUNNING, dead_before)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def counts(self):
+        rows = self._conn.get().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+def make_job_store(uri: str) -> JobStore:
+    """Build a job store from a URI: sqlite:///path/to/jobs.db or memory://"""
+    if uri.startswith("memory://"):
+        return MemoryJobStore()
+    return SQLiteJobStore(sqlite_path(uri))
+
+
+class JobQueue:
+    """Pool of worker threads draining a JobStore
+
+    The runner is called as runner(job_id, payload, secrets, set_phase) and returns the result
+    string. Secrets (API keys) are held in memory only and never written to the store, so a
+    job submitted with secrets is owned by this queue: only its workers claim it, and it
+    fails rather than run with other credentials if the secrets are gone.
+
+    heartbeat_interval:  seconds between heartbeats, and between sweeps for the jobs of
+                         stopped workers
+    stale_after:         seconds without a heartbeat after which a worker counts as stopped
+    """
+
+    def __init__(self, store: JobStore, runner, workers: int = 2, poll_interval: float = 1.0,
+                 heartbeat_interval: float = 10.0, stale_after: float = 60.0):
+        self.store = store
+        self.runner = runner
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._secrets = {}
+        # Unique per process, and per queue within it
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the workers and heartbeat once; safe to call on every submit"""
+        with self._lock:
+            if self._threads:
+                return
+            # Alive before any job is created with this owner, so no sweep takes it for dead
+            self.store.heartbeat(self.owner)
+            self.reap()
+            thread = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def reap(self) -> int:
+        """Recover the jobs of workers that stopped heartbeating; returns the number requeued"""
+        requeued = self.store.requeue_stale(time.time() - self.stale_after)
+        if requeued:
+            logger.warning(f"Requeued {requeued} jobs of stopped workers")
+            self._wakeup.set()
+        return requeued
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.store.heartbeat(self.owner)
+                self.reap()
+            except Exception as e:
+                logger.error(f"Error recording job worker heartbeat: {str(e)}")
+
+    def submit(self, dedupe_key: str, payload: dict, secrets: dict = None):
+        """Queue a job, returning (job_id, created); duplicates of an active job share its ID"""
+        secrets = {name: value for name, value in (secrets or {}).items() if value}
+        self.start()
+        owner = self.owner if secrets else None
+        job_id, created = self.store.create(dedupe_key, payload, owner=owner)
+        if not created:
+            # The active duplicate may belong to a worker that has stopped since the last sweep
+            self.reap()
+            job_id, created = self.store.create(dedupe_key, payload, owner=owner)
+        if created and secrets:
+            self._secrets[job_id] = secrets
+        self._wakeup.set()
+        return job_id, created
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    def _work(self):
+        while True:
+            try:
+                job = self.store.claim(self.owner)
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            self._run(job)
+
+    def _run(self, job):
+        job_id = job["id"]
+        secrets = self._secrets.pop(job_id, None)
+        if job.get("owner") and secrets is None:
+            logger.error(f"Job {job_id} failed: its API keys are no longer available")
+            self.store.update(job_id, status=FAILED, error=LOST_SECRETS_ERROR, finished_at=time.time())
+            return
+
+        def set_phase(phase):
+            try:
+                self.store.update(job_id, phase=phase)
+            except Exception as e:
+                logger.error(f"Error updating job {job_id} phase: {str(e)}")
+
+        try:
+            result = self.runner(job_id, job["payload"], secrets or {}, set_phase)
+            self.store.update(job_id, status=DONE, phase=None, result=result, finished_at=time.time())
+            logger.info(f"Job {job_id} finished")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            self.store.update(job_id, status=FAILED, phase=None, error=str(e), finished_at=time.time())
+
+    def stats(self):
+        return {"workers": len(self._threads), "jobs": self.store.counts()}
@@ -0,0 +1,311 @@
+# In-process metrics in Prometheus text format, plus per-stage timing spans
+#
+# Recording is a perf_counter() call, a bisect and a locked increment, so it is cheap
+# enough for every request. Gauges that mirror existing state (cache stats, queue
+# depths) are read by collectors only when /metrics is scraped.
+
+import abc
+import contextvars
+import functools
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from loguru import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Request ID of the request (or job) being handled, included in every log line
+request_id_var = contextvars.ContextVar("request_id", default="-")
+_current_span = contextvars.ContextVar("current_span", default=None)
+_tracing = False
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(abc.ABC):
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        key = values or tuple(str(kwargs[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """A fresh child holding the samples of one combination of label values"""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(float(bound))}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class Registry:
+    """Metrics plus collectors that produce samples from existing state at scrape time
+
+    A collector returns a list of (name, kind, documentation, [(labels dict, value), ...]).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in list(self._metrics):
+            lines.extend(metric.render())
+        for collector in list(self._collectors):
+            try:
+                families = collector()
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "ytsum_stage_duration_seconds", "Time spent in each pipeline stage", ["stage"])
+STAGE_ERRORS = registry.counter(
+    "ytsum_stage_errors_total", "Pipeline stages that raised", ["stage"])
+UPSTREAM_RESPONSES = registry.counter(
+    "ytsum_upstream_responses_total", "Upstream HTTP responses by status code (or connection error)",
+    ["upstream", "status"])
+UPSTREAM_SECONDS = registry.histogram(
+    "ytsum_upstream_request_duration_seconds", "Upstream request time per attempt", ["upstream"])
+LLM_TOKENS = registry.counter(
+    "ytsum_llm_tokens_total", "Tokens reported by the summarization API", ["type"])
+TOKEN_ESTIMATE_RATIO = registry.histogram(
+    "ytsum_token_estimate_ratio", "Prompt tokens reported by the summarization API / local estimate, per call",
+    buckets=(0.5, 0.75, 0.9, 0.95, 1.0, 1.05, 1.1, 1.25, 1.5, 2.0))
+LLM_PROVIDER_SECONDS = registry.histogram(
+    "ytsum_llm_provider_seconds", "Summarization provider latency, to the full response or the first token",
+    ["provider", "kind"])
+LLM_PROVIDER_CALLS = registry.counter(
+    "ytsum_llm_provider_calls_total", "Summarization provider attempts by outcome (won, failed, lost)",
+    ["provider", "outcome"])
+LLM_HEDGES = registry.counter(
+    "ytsum_llm_hedges_total", "Hedged requests sent to a backup provider", ["provider"])
+NEAR_DUPLICATE_LOOKUPS = registry.counter(
+    "ytsum_near_duplicate_lookups_total", "Lookups of near-duplicate transcripts with a summary to reuse",
+    ["result"])
+PREPROCESS_RATIO = registry.histogram(
+    "ytsum_preprocess_token_ratio", "Transcript tokens after preprocessing / before, per transcript",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0))
+WRITE_BEHIND_BATCH_SIZE = registry.histogram(
+    "ytsum_write_behind_batch_size", "Writes applied together by the write-behind writer", ["kind"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+WRITE_BEHIND_STALL_SECONDS = registry.histogram(
+    "ytsum_write_behind_stall_seconds", "Time a write waited for room in the full write-behind queue")
+HTTP_REQUESTS = registry.counter(
+    "ytsum_http_requests_total", "HTTP requests served", ["method", "endpoint", "status"])
+HTTP_SECONDS = registry.histogram(
+    "ytsum_http_request_duration_seconds", "Time to response headers", ["endpoint"])
+HTTP_IN_FLIGHT = registry.gauge(
+    "ytsum_http_requests_in_flight", "HTTP requests currently being handled")
+
+
+def enable_tracing(enabled=True):
+    """Log every span with its duration and parent; stage histograms are recorded either way"""
+    global _tracing
+    _tracing = enabled
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def set_request_id(request_id):
+    """Bind a request ID to the current context; returns a token for request_id_var.reset()"""
+    return request_id_var.set(request_id or new_request_id())
+
+
+def get_request_id():
+    return request_id_var.get()
+
+
+def add_request_id(record):
+    """loguru patcher putting the current request ID in record["extra"]"""
+    record["extra"]["request_id"] = request_id_var.get()
+
+
+class span:
+    """Time a pipeline stage into ytsum_stage_duration_seconds; usable as `with` or decorator
+
+    With tracing enabled, each finished span is also logged with the request ID,
+    its parent span and whether it raised.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._token = _current_span.set(self.name) if _tracing else None
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._started
+        STAGE_SECONDS.labels(self.name).observe(elapsed)
+        if exc_type is not None:
+            STAGE_ERRORS.labels(self.name).inc()
+        if self._token is not None:
+            _current_span.reset(self._token)
+            logger.info(f"span={self.name} parent={_current_span.get() or '-'} "
+                        f"duration_ms={elapsed * 1000:.1f} status={'error' if exc_type else 'ok'}")
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            # A fresh instance per call so a decorated function can run in several threads at once
+            with span(self.name):
+                return func(*args, **kwargs)
+
+        return timed
@@ -0,0 +1,274 @@
+# Near-duplicate transcripts: re-uploads and mirrors of a video that was already summarized
+#
+# Each transcript is reduced to a MinHash signature of its word 5-grams (one-permutation
+# hashing: every shingle is hashed once into one of num_perm bins, keeping the minimum per
+# bin), so the fraction of bins two signatures agree on estimates the Jaccard similarity of
+# their shingle sets. Locality-sensitive hashing over bands of the signature finds candidates
+# without comparing against every stored transcript. Signatures and band hashes live in flat
+# arrays rather than per-entry objects, so hundreds of thousands of transcripts stay compact.
+# Each entry may carry a tag (e.g. the ETag of the summary it was indexed with), which stays in
+# SQLite and is read back for a match only, so callers can check the match is still current.
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+try:
+    from src.db import ThreadLocalConnection
+except ImportError:
+    from db import ThreadLocalConnection
+
+SHINGLE_WORDS = 5
+# Transcripts with fewer words are too short to fingerprint reliably
+MIN_WORDS = 50
+_WORD_RE = re.compile(r"\w+")
+_EMPTY = 0xFFFFFFFF
+# Band arrays hold (band hash << ROW_BITS) | row in one 64-bit integer, so they sort as plain ints
+ROW_BITS = 24
+_ROW_MASK = (1 << ROW_BITS) - 1
+_HASH_MASK = (1 << (64 - ROW_BITS)) - 1
+
+
+def shingle_hashes(text: str):
+    """Distinct 64-bit hashes of the lowercased word 5-grams of text"""
+    words = _WORD_RE.findall(text.lower())
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+            for shingle in shingles], len(words)
+
+
+def minhash(hashes, num_perm: int = 64) -> array:
+    """One-permutation MinHash signature of a set of 64-bit shingle hashes
+
+    The low bits of a hash pick its bin, the high 32 bits are its value. Empty bins borrow
+    the value of the next non-empty bin so that short texts still compare bin by bin.
+    """
+    signature = array("I", [_EMPTY]) * num_perm
+    for value in hashes:
+        bin_, value = value % num_perm, value >> 32
+        if value < signature[bin_]:
+            signature[bin_] = value
+    if _EMPTY in signature and any(value != _EMPTY for value in signature):
+        filled = list(signature)
+        for bin_ in range(num_perm):
+            offset = 1
+            while filled[bin_] == _EMPTY:
+                filled[bin_] = signature[(bin_ + offset) % num_perm]
+                offset += 1
+        signature = array("I", filled)
+    return signature
+
+
+def similarity(a, b) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index from video IDs to transcript signatures, optionally kept in SQLite
+
+    Entries belong to a group (e.g. the summary settings), and only entries of the same group
+    match. An entry's tag is kept with it and returned by tag(). New entries are looked up through small per-band dicts until enough accumulate to
+    be merged into the sorted band arrays, so adds stay cheap as the index grows. Up to
+    2 ** ROW_BITS entries (replaced ones included) can be stored.
+
+    num_perm:  signature size; bands * rows must equal it. 16 bands of 4 rows find pairs
+               above about 0.6 similarity almost surely and rarely bother with ones below 0.4.
+    refresh_interval: seconds between checks of the database for entries added by other
+               processes; queries made in between see only what this process loaded or added.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            video_id TEXT PRIMARY KEY,
+            grp TEXT NOT NULL,
+            signature BLOB NOT NULL,
+            tag TEXT,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS fingerprints_updated ON fingerprints (updated_at);
+    """
+    # Rows written this many seconds before the newest one seen are read again on refresh, so
+    # entries whose clock or commit lagged behind another process's are not missed
+    REFRESH_OVERLAP = 60
+
+    def __init__(self, path: str = None, num_perm: int = 64, bands: int = 16, min_merge: int = 1024,
+                 refresh_interval: float = 5.0):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_merge = min_merge
+        self._lock = threading.RLock()
+        self._keys = []                 # row -> video ID, None once replaced
+        self._groups = array("I")       # row -> group number
+        self._group_numbers = {}
+        self._signatures = array("I")   # row * num_perm ... -> signature values
+        self._row_of = {}
+        self._bands = [array("Q") for _ in range(bands)]
+        self._pending = [{} for _ in range(bands)]
+        self._pending_count = 0
+        self.refresh_interval = refresh_interval
+        self._synced_until = None       # newest updated_at read from the database
+        self._next_refresh = 0.0
+        self._tags = {}                 # video ID -> tag, without a database only
+        self._conn = ThreadLocalConnection(path, self.SCHEMA) if path else None
+        if self._conn is not None:
+            self._add_tag_column()
+            self._load()
+
+    def _add_tag_column(self):
+        """Databases created before entries had tags get the column added"""
+        conn = self._conn.get()
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(fingerprints)")}
+        if "tag" in columns:
+            return
+        try:
+            conn.execute("ALTER TABLE fingerprints ADD COLUMN tag TEXT")
+        except sqlite3.OperationalError:
+            # Another process added it first
+            pass
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def fingerprint(self, text: str):
+        """Signature of a transcript's text, or None if it is too short to compare"""
+        hashes, words = shingle_hashes(text)
+        if words < MIN_WORDS:
+            return None
+        return minhash(hashes, self.num_perm)
+
+    def _band_hash(self, signature, band):
+        start = band * self.rows
+        return hash(tuple(signature[start:start + self.rows])) & _HASH_MASK
+
+    def _append(self, video_id, group, signature):
+        row = len(self._keys)
+        if row > _ROW_MASK:
+            raise ValueError(f"Near-duplicate index is full ({row} entries)")
+        previous = self._row_of.get(video_id)
+        if previous is not None:
+            self._keys[previous] = None
+        self._keys.append(video_id)
+        self._row_of[video_id] = row
+        self._groups.append(self._group_numbers.setdefault(group, len(self._group_numbers)))
+        self._signatures.extend(signature)
+        for band in range(self.bands):
+            self._pending[band].setdefault(self._band_hash(signature, band), []).append(row)
+        self._pending_count += 1
+        # Merge once pending entries are a fair share of the index: amortized cost stays low
+        if self._pending_count >= max(self.min_merge, len(self._keys) // 8):
+            self._merge()
+
+    def _merge(self):
+        keys = self._keys
+        for band in range(self.bands):
+            entries = list(self._bands[band])
+            entries.extend(band_hash << ROW_BITS | row for band_hash, rows in self._pending[band].items()
+                           for row in rows)
+            # Rows replaced by a newer signature of the same video are dropped here
+            if len(self._row_of) < len(keys):
+                entries = [entry for entry in entries if keys[entry & _ROW_MASK] is not None]
+            entries.sort()
+            self._bands[band] = array("Q", entries)
+            self._pending[band] = {}
+        self._pending_count = 0
+
+    def _same_entry(self, video_id, group, signature):
+        row = self._row_of.get(video_id)
+        if row is None or self._group_numbers.get(group) != self._groups[row]:
+            return False
+        start = row * self.num_perm
+        return self._signatures[start:start + self.num_perm] == signature
+
+    def _load(self, since: float = None):
+        sql = "SELECT video_id, grp, signature, updated_at FROM fingerprints"
+        params = ()
+        if since is not None:
+            sql += " WHERE updated_at >= ?"
+            params = (since,)
+        loaded = 0
+        with self._lock:
+            for row in self._conn.get().execute(sql, params):
+                if self._synced_until is None or row["updated_at"] > self._synced_until:
+                    self._synced_until = row["updated_at"]
+                signature = array("I")
+                signature.frombytes(row["signature"])
+                if len(signature) != self.num_perm or self._same_entry(row["video_id"], row["grp"], signature):
+                    continue
+                self._append(row["video_id"], row["grp"], signature)
+                loaded += 1
+            if since is None:
+                self._merge()
+            self._next_refresh = time.monotonic() + self.refresh_interval
+        return loaded
+
+    def refresh(self, force: bool = False) -> int:
+        """Load entries other processes added to the database since the last refresh
+
+        Does nothing until refresh_interval has passed since the last one, unless forced.
+        Returns the number of entries loaded.
+        """
+        if self._conn is None or (not force and time.monotonic() < self._next_refresh):
+            return 0
+        since = None if self._synced_until is None else self._synced_until - self.REFRESH_OVERLAP
+        return self._load(since)
+
+    def add(self, video_id: str, group: str, signature, tag: str = None):
+        """Index (or re-index) the signature of video_id in group"""
+        with self._lock:
+            self._append(video_id, group, signature)
+            if self._conn is None:
+                self._tags[video_id] = tag
+        if self._conn is not None:
+            self._conn.get().execute(
+                "INSERT OR REPLACE INTO fingerprints (video_id, grp, signature, tag, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (video_id, group, array("I", signature).tobytes(), tag, time.time())
+            )
+
+    def tag(self, video_id: str):
+        """The tag video_id was last indexed with, or None"""
+        if self._conn is None:
+            return self._tags.get(video_id)
+        row = self._conn.get().execute("SELECT tag FROM fingerprints WHERE video_id = ?", (video_id,)).fetchone()
+        return row["tag"] if row else None
+
+    def query(self, signature, group: str, threshold: float, exclude: str = None):
+        """(video ID, similarity) of the most similar entry of group at or above threshold, or None"""
+        self.refresh()
+        with self._lock:
+            group_number = self._group_numbers.get(group)
+            if group_number is None:
+                return None
+            candidates = set()
+            for band in range(self.bands):
+                band_hash = self._band_hash(signature, band)
+                entries = self._bands[band]
+                position = bisect_left(entries, band_hash << ROW_BITS)
+                while position < len(entries) and entries[position] >> ROW_BITS == band_hash:
+                    candidates.add(entries[position] & _ROW_MASK)
+                    position += 1
+                candidates.update(self._pending[band].get(band_hash, ()))
+
+            best = None
+            for row in candidates:
+                video_id = self._keys[row]
+                if video_id is None or video_id == exclude or self._groups[row] != group_number:
+                    continue
+                start = row * self.num_perm
+                score = similarity(signature, self._signatures[start:start + self.num_perm])
+                if score >= threshold and (best is None or score > best[1]):
+                    best = (video_id, score)
+            return best
+
+    def stats(self):
+        return {"entries": len(self), "pending": self._pending_count, "bands": self.bands,
+                "signature_bytes": self._signatures.itemsize * self.num_perm,
+                "array_bytes": sum(len(a) * a.itemsize for a in [self._signatures, self._groups, *self._bands])}
@@ -0,0 +1,242 @@
+# Transcript clean-up before summarization: fewer tokens to pay for and wait on
+#
+# The stages stream over (start, duration, text) captions, keeping only a small window of
+# recent words, so cost is linear in transcript length. Regex clean-up runs on blocks of
+# captions joined by newlines, one pass per block instead of several calls per caption.
+# Optional extractive compression needs the whole transcript and runs afterwards.
+
+import re
+from collections import Counter
+
+try:
+    from src.chunking import estimate_tokens
+    from src.transcript import Transcript
+except ImportError:
+    from chunking import estimate_tokens
+    from transcript import Transcript
+
+STAGES = ("noise", "fillers", "dedupe", "punctuation")
+BLOCK_SIZE = 256
+
+# None of the patterns below match across "\n", which separates captions within a block. Each
+# starts with a character class so the regex engine can skip ahead to candidate positions.
+
+# [Music], [Applause], (laughs), ♪ lyrics markers and ">>" speaker changes
+NOISE_RE = re.compile(
+    r"[\[(♪♫>](?:(?<=\[)[^\]\n]{0,40}\]"
+    r"|(?<=\()(?:music|applause|laugh\w*|inaudible|cheer\w*|silence)\)"
+    r"|(?<=[♪♫])[♪♫]*|(?<=>)>)",
+    re.IGNORECASE
+)
+# Hesitations (um, uh, uhm, erm, hmm) with a trailing comma and space; words like "like" or
+# "you know" often carry meaning and are kept
+FILLER_RE = re.compile(
+    r"[uehUEH](?<![\w'-][uehUEH])"
+    r"(?:(?<=[uU])[uU]*(?:[hH]+[mM]*|[mM]+)|(?<=[eE])[eE]*[rR]+[mM]+|(?<=[hH])[hH]*[mM]{2,})"
+    r"(?![\w'-])[,.]? ?"
+)
+SENTENCE_END = (".", "?", "!")
+_OTHER_SPACES_RE = re.compile(r"[^\S\n ]")
+_LOWERCASE_AFTER_SENTENCE_RE = re.compile(r"([.?!] +)([a-z])")
+# Plain replacements are several times faster than regexes for these
+_PUNCTUATION_FIXES = tuple((" " + mark, mark) for mark in ",.?!;:") + (
+    (" i ", " I "), (" i'", " I'"), ("\ni ", "\nI "), ("\ni'", "\nI'")
+)
+_WORD_STRIP = ".,?!;:\"'"
+_WORD_PUNCTUATION_RE = re.compile("[" + re.escape(_WORD_STRIP) + "]+")
+
+# Words that say little about what a passage is about, for extractive scoring
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its of on or our she so "
+    "that the their them then there they this to was we were what when which who will with you your "
+    "just like know really going gonna yeah okay right think thing things get got very can would".split()
+)
+
+
+class _Deduper:
+    """Drops words that repeat the end of the previous caption, as rolling auto-captions do"""
+
+    def __init__(self, window):
+        self.window = window
+        self.tail = []
+
+    def __call__(self, text, normalized_text):
+        """Return text without its overlap; normalized_text is text lowercased without punctuation"""
+        words = text.split()
+        normalized = normalized_text.split()
+        if len(normalized) != len(words):
+            # A token made only of punctuation; normalize word by word to keep them aligned
+            normalized = [word.lower().strip(_WORD_STRIP) for word in words]
+        tail = self.tail
+        first, overlap = normalized[0], 0
+        # Candidate overlaps start where the caption's first word occurs near the end of the
+        # tail; list.index finds them without a Python-level scan, longest overlap first
+        position = max(0, len(tail) - len(normalized)) - 1
+        while first in tail:
+            try:
+                position = tail.index(first, position + 1)
+            except ValueError:
+                break
+            size = len(tail) - position
+            # A single shared word is usually a coincidence unless it is the whole caption
+            if (size > 1 or size == len(normalized)) and tail[position:] == normalized[:size]:
+                overlap = size
+                break
+        tail.extend(normalized[overlap:])
+        if len(tail) > 2 * self.window:
+            del tail[:-self.window]
+        return " ".join(words[overlap:]) if overlap else text
+
+
+class Preprocessor:
+    """Configurable clean-up of transcript segments
+
+    stages:        any of STAGES, applied in that order
+    token_budget:  if set, keep only the highest-scoring passages until the transcript fits
+    pause:         silence (seconds) between captions treated as a sentence break
+    """
+
+    def __init__(self, stages=STAGES, token_budget=0, pause=1.0, dedupe_window=16):
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown preprocessing stages: {', '.join(sorted(unknown))}")
+        self.stages = tuple(stage for stage in STAGES if stage in stages)
+        self.token_budget = token_budget
+        self.pause = pause
+        self.dedupe_window = dedupe_window
+
+    @property
+    def config(self) -> str:
+        """Short description of the settings, part of the summary settings recorded in history"""
+        return ",".join(self.stages) + (f";budget={self.token_budget}" if self.token_budget else "")
+
+    def _clean_block(self, block):
+        """Noise, filler, whitespace and in-caption punctuation fixes for a list of captions"""
+        text = "\n".join(caption.replace("\n", " ") if "\n" in caption else caption
+                         for _, _, caption in block)
+        if "noise" in self.stages:
+            text = NOISE_RE.sub(" ", text)
+        if "fillers" in self.stages:
+            text = FILLER_RE.sub("", text)
+        if "\t" in text or "\r" in text:
+            text = _OTHER_SPACES_RE.sub(" ", text)
+        while "  " in text:
+            text = text.replace("  ", " ")
+        if "punctuation" in self.stages:
+            for old, new in _PUNCTUATION_FIXES:
+                text = text.replace(old, new)
+            text = _LOWERCASE_AFTER_SENTENCE_RE.sub(lambda match: match.group(1) + match.group(2).upper(), text)
+        captions = text.split("\n")
+        if "dedupe" not in self.stages:
+            return [(start, duration, caption.strip(), None) for (start, duration, _), caption in zip(block, captions)]
+        # Lowercased, punctuation-free copies for overlap detection, also made in one pass
+        normalized = _WORD_PUNCTUATION_RE.sub("", text.lower()).split("\n")
+        return [(start, duration, caption.strip(), normalized_caption)
+                for (start, duration, _), caption, normalized_caption in zip(block, captions, normalized)]
+
+    def _cleaned_blocks(self, segments):
+        block = []
+        for segment in segments:
+            block.append(segment)
+            if len(block) == BLOCK_SIZE:
+                yield from self._clean_block(block)
+                block = []
+        if block:
+            yield from self._clean_block(block)
+
+    def clean(self, segments):
+        """Yield cleaned (start, duration, text) for an iterable of (start, duration, text)
+
+        Captions left empty are dropped. Punctuation repair holds back one caption so it
+        can see the pause before the next one.
+        """
+        dedupe = _Deduper(self.dedupe_window) if "dedupe" in self.stages else None
+        punctuate = "punctuation" in self.stages
+        pending = None
+        sentence_start = True
+
+        for start, duration, text, normalized in self._cleaned_blocks(segments):
+            if dedupe and text:
+                text = dedupe(text, normalized)
+            if not text:
+                continue
+            if not punctuate:
+                yield start, duration, text
+                continue
+
+            if pending is not None:
+                previous_start, previous_duration, previous_text = pending
+                if start - (previous_start + previous_duration) >= self.pause \
+                        and not previous_text.endswith(SENTENCE_END + (",", ";", ":")):
+                    previous_text += "."
+                sentence_start = previous_text.endswith(SENTENCE_END)
+                yield previous_start, previous_duration, previous_text
+            if sentence_start:
+                text = text[0].upper() + text[1:]
+            pending = (start, duration, text)
+
+        if pending is not None:
+            start, duration, text = pending
+            yield start, duration, text if text.endswith(SENTENCE_END) else text + "."
+
+    def compress(self, segments, token_budget):
+        """Keep the most topical passages, in their original order, within token_budget
+
+        Passages are runs of captions ending at a sentence break (or about 50 words), scored
+        by how often their content words occur in the whole transcript.
+        """
+        passages, current, words = [], [], 0
+        for segment in segments:
+            current.append(segment)
+            words += len(segment[2].split())
+            if segment[2].endswith(SENTENCE_END) or words >= 50:
+                passages.append(current)
+                current, words = [], 0
+        if current:
+            passages.append(current)
+
+        def content_words(passage):
+            for _, _, text in passage:
+                for word in text.lower().split():
+                    word = word.strip(_WORD_STRIP)
+                    if len(word) > 2 and word not in STOPWORDS:
+                        yield word
+
+        frequencies = Counter(word for passage in passages for word in content_words(passage))
+        scored = []
+        for index, passage in enumerate(passages):
+            passage_words = list(content_words(passage))
+            score = sum(frequencies[word] for word in passage_words) / (len(passage_words) + 1)
+            tokens = sum(estimate_tokens(text) + 1 for _, _, text in passage)
+            scored.append((score, index, tokens))
+
+        keep, used = set(), 0
+        for score, index, tokens in sorted(scored, key=lambda item: -item[0]):
+            # The best passage is kept even if it alone exceeds the budget
+            if used + tokens <= token_budget or not keep:
+                keep.add(index)
+                used += tokens
+        return [segment for index, passage in enumerate(passages) if index in keep for segment in passage]
+
+    def compress_transcript(self, transcript, token_budget):
+        """compress() for a whole Transcript, returning a Transcript"""
+        rows = list(zip(transcript.starts, transcript.durations, transcript))
+        return Transcript.from_rows(self.compress(rows, token_budget), transcript.video_id)
+
+    def __call__(self, transcript):
+        """Return (cleaned Transcript, report with token counts before and after)"""
+        tokens_before = estimate_tokens(transcript.text)
+        cleaned = self.clean(zip(transcript.starts, transcript.durations, transcript))
+        if self.token_budget:
+            cleaned = list(cleaned)
+            if sum(estimate_tokens(text) + 1 for _, _, text in cleaned) > self.token_budget:
+                cleaned = self.compress(cleaned, self.token_budget)
+        result = Transcript.from_rows(cleaned, transcript.video_id)
+        tokens_after = estimate_tokens(result.text) if len(result) else 0
+        return result, {
+            "segments_before": len(transcript),
+            "segments_after": len(result),
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "reduction": round(1 - tokens_after / tokens_before, 4) if tokens_before else 0.0,
+        }
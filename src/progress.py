@@ -0,0 +1,95 @@
+# In-memory progress tracking keyed by request or job ID
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ProgressRegistry:
+    """Per-request progress with phase timestamps and expiry of finished entries
+
+    Updates only touch memory. Readers can poll get() or block in wait() until the
+    entry changes, which is what the push (SSE) channel uses. Finished entries expire
+    ttl seconds after their last update; unfinished ones, whose request was abandoned
+    without finish(), idle_ttl seconds after it.
+    """
+
+    def __init__(self, ttl=600, max_entries=10000, idle_ttl=3600):
+        self.ttl = ttl
+        self.idle_ttl = idle_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._changed = threading.Condition()
+
+    def _expire(self, now):
+        # Entries are kept in update order, so only those at the front can be old enough to
+        # expire; the scan passes over entries that are not expired yet rather than stopping there
+        shortest = min(self.ttl, self.idle_ttl)
+        expired = []
+        for progress_id, entry in self._entries.items():
+            age = now - entry["updated_at"]
+            if age <= shortest:
+                break
+            if age > (self.ttl if entry["done"] else self.idle_ttl):
+                expired.append(progress_id)
+        for progress_id in expired:
+            del self._entries[progress_id]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _touch(self, progress_id, **fields):
+        now = time.time()
+        with self._changed:
+            entry = self._entries.get(progress_id)
+            if entry is None:
+                entry = {
+                    "id": progress_id, "phase": None, "message": None, "percent": 0,
+                    "done": False, "error": None, "phases": [],
+                    "started_at": now, "updated_at": now, "version": 0
+                }
+                self._entries[progress_id] = entry
+            phase = fields.get("phase")
+            if phase and phase != entry["phase"]:
+                entry["phases"].append({"phase": phase, "at": now})
+            entry.update({k: v for k, v in fields.items() if v is not None})
+            entry["updated_at"] = now
+            entry["version"] += 1
+            self._entries.move_to_end(progress_id)
+            self._expire(now)
+            self._changed.notify_all()
+
+    def update(self, progress_id, phase=None, message=None, percent=None):
+        self._touch(progress_id, phase=phase, message=message,
+                    percent=None if percent is None else max(0, min(100, int(percent))))
+
+    def finish(self, progress_id, error=None):
+        if error:
+            self._touch(progress_id, phase="failed", message=error, error=error, done=True)
+        else:
+            self._touch(progress_id, phase="done", message="Done", percent=100, done=True)
+
+    def get(self, progress_id):
+        with self._changed:
+            entry = self._entries.get(progress_id)
+            if entry is None:
+                return None
+            snapshot = dict(entry)
+            snapshot["phases"] = list(entry["phases"])
+            return snapshot
+
+    def wait(self, progress_id, version, timeout=15.0):
+        """Block until the entry's version moves past `version` or timeout; return the entry"""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                entry = self._entries.get(progress_id)
+                if entry is not None and entry["version"] > version:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+        return self.get(progress_id)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,301 @@
+# Summarization backends: OpenAI-compatible chat-completions providers with hedging and failover
+#
+# The first provider is the primary. When it has not answered (or, for streams, produced a
+# first token) within its own recent p95 latency, the next provider is sent the same request
+# and whichever answers first wins; the other result is discarded. A provider that fails with
+# a connection error, timeout, 429 or 5xx is replaced by the next one straight away. Hedging
+# is capped at a fraction of calls so a slow primary cannot double the load on every backup.
+# When every provider fails, the last error is raised as it is.
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from loguru import logger
+
+try:
+    from src.upstream import RETRY_STATUSES
+    from src.metrics import LLM_HEDGES, LLM_PROVIDER_CALLS, LLM_PROVIDER_SECONDS
+except ImportError:
+    from upstream import RETRY_STATUSES
+    from metrics import LLM_HEDGES, LLM_PROVIDER_CALLS, LLM_PROVIDER_SECONDS
+
+
+class LatencyTracker:
+    """Recent latencies of one provider for one kind of call, for percentile estimates"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def quantile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class Provider:
+    """One OpenAI-compatible chat-completions endpoint
+
+    client:   UpstreamClient for the provider's base URL (pooling, retries, circuit breaker)
+    model:    model name sent in the payload
+    api_key:  the provider's own key; None means the caller's Deepseek key is used
+    """
+
+    def __init__(self, name, client, model, api_key=None, path="/v1/chat/completions"):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.api_key = api_key
+        self.path = path
+        self.latency = {"response": LatencyTracker(), "first_token": LatencyTracker()}
+
+    def request_args(self, payload, caller_key):
+        """(headers, payload) for this provider: its model and key replace the caller's"""
+        headers = {"Content-Type": "application/json"}
+        key = self.api_key if self.api_key is not None else caller_key
+        if key:
+            headers["Authorization"] = f"Bearer {key}"
+        return headers, dict(payload, model=self.model)
+
+    def record_latency(self, kind, seconds):
+        self.latency[kind].record(seconds)
+        LLM_PROVIDER_SECONDS.labels(self.name, kind).observe(seconds)
+
+    def stats(self):
+        return {
+            "model": self.model,
+            "base_url": self.client.base_url,
+            **{f"{kind}_p50": tracker.quantile(0.5) for kind, tracker in self.latency.items()},
+            **{f"{kind}_p95": tracker.quantile(0.95) for kind, tracker in self.latency.items()},
+            "circuit": self.client.breaker.stats()["state"],
+        }
+
+
+# Errors after which another provider is tried (requests.ConnectionError covers open circuits)
+RETRIABLE_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+
+def is_retriable(error, retriable=RETRIABLE_ERRORS) -> bool:
+    """Whether another provider might succeed where this error happened
+
+    Connection problems, timeouts, open circuits, rate limiting and server errors are;
+    client errors such as a bad key or an invalid request are not.
+    """
+    if isinstance(error, retriable):
+        return True
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) in RETRY_STATUSES
+
+
+class ProviderPool:
+    """Providers in order of preference, called with hedging and failover
+
+    hedge_quantile:       latency quantile of the primary after which a backup is sent
+    hedge_default_delay:  hedge delay until min_samples latencies have been seen
+    hedge_budget:         largest fraction of calls that may be hedged
+    """
+
+    def __init__(self, providers, hedge_quantile=0.95, hedge_default_delay=30.0, hedge_min_delay=0.5,
+                 hedge_budget=0.1, min_samples=20, max_workers=32):
+        if not providers:
+            raise ValueError("At least one provider is required")
+        self.providers = list(providers)
+        self.hedge_quantile = hedge_quantile
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_budget = hedge_budget
+        self.min_samples = min_samples
+        self._executor = None
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "hedged": 0, "failovers": 0, "hedge_wins": 0}
+
+    @property
+    def primary(self):
+        return self.providers[0]
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def hedge_delay(self, provider, kind):
+        """Seconds to wait for provider before a backup is sent, or None not to hedge"""
+        if len(self.providers) < 2 or self.hedge_budget <= 0:
+            return None
+        tracker = provider.latency[kind]
+        if len(tracker) < self.min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, tracker.quantile(self.hedge_quantile))
+
+    def _may_hedge(self):
+        with self._lock:
+            return self._counters["hedged"] < self.hedge_budget * max(1, self._counters["calls"])
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                        thread_name_prefix="llm-provider")
+        return self._executor
+
+    def _timed(self, provider, kind, attempt):
+        started = time.perf_counter()
+        result = attempt(provider)
+        provider.record_latency(kind, time.perf_counter() - started)
+        return result
+
+    def _on_loser_done(self, provider, discard):
+        """Dispose of a result nobody is waiting for anymore, once it arrives"""
+        def done(future):
+            LLM_PROVIDER_CALLS.labels(provider.name, "lost").inc()
+            if discard and not future.cancelled() and future.exception() is None:
+                try:
+                    discard(future.result())
+                except Exception:
+                    pass
+        return done
+
+    def call(self, attempt, kind="response", discard=None, retriable=RETRIABLE_ERRORS):
+        """Run attempt(provider) on the providers until one succeeds, hedging slow ones
+
+        attempt blocks until the provider has answered (kind="response") or produced its
+        first token (kind="first_token") and returns the result. discard(result) is called
+        for results that lose a hedge race, e.g. to close a stream. Errors that are not
+        retriable (see is_retriable) are raised without trying another provider.
+        """
+        self._count("calls")
+        if len(self.providers) == 1:
+            return self._timed(self.primary, kind, attempt)
+
+        executor = self._get_executor()
+        remaining = list(self.providers)
+        in_flight = {}
+        last_error = None
+
+        def launch():
+            provider = remaining.pop(0)
+            # Tasks run in a copy of our context so their logs keep the request ID
+            future = executor.submit(contextvars.copy_context().run, self._timed, provider, kind, attempt)
+            in_flight[future] = provider
+            return provider
+
+        def drop_losers():
+            # Blocking calls cannot be interrupted; their results are disposed of on arrival
+            for future, provider in in_flight.items():
+                future.add_done_callback(self._on_loser_done(provider, discard))
+
+        launch()
+        while in_flight:
+            timeout = None
+            if remaining and len(in_flight) == 1 and self._may_hedge():
+                timeout = self.hedge_delay(next(iter(in_flight.values())), kind)
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                provider = launch()
+                self._count("hedged")
+                LLM_HEDGES.labels(provider.name).inc()
+                continue
+
+            for future in done:
+                provider = in_flight.pop(future)
+                error = future.exception()
+                if error is None:
+                    LLM_PROVIDER_CALLS.labels(provider.name, "won").inc()
+                    if provider is not self.primary:
+                        self._count("hedge_wins" if in_flight else "failovers")
+                    drop_losers()
+                    return future.result()
+                LLM_PROVIDER_CALLS.labels(provider.name, "failed").inc()
+                last_error = error
+                if not is_retriable(error, retriable):
+                    drop_losers()
+                    raise error
+            if not in_flight and remaining:
+                launch()
+        logger.warning(f"All {len(self.providers)} summarization providers failed")
+        raise last_error
+
+    async def call_async(self, attempt, kind="response", discard=None, retriable=RETRIABLE_ERRORS):
+        """call() for coroutines: attempt(provider) is a coroutine function
+
+        Losing attempts are cancelled rather than left to finish.
+        """
+        self._count("calls")
+
+        async def timed(provider):
+            started = time.perf_counter()
+            result = await attempt(provider)
+            provider.record_latency(kind, time.perf_counter() - started)
+            return result
+
+        if len(self.providers) == 1:
+            return await timed(self.primary)
+
+        remaining = list(self.providers)
+        in_flight = {}
+        last_error = None
+
+        def launch():
+            provider = remaining.pop(0)
+            in_flight[asyncio.ensure_future(timed(provider))] = provider
+            return provider
+
+        def drop_losers():
+            for task, provider in in_flight.items():
+                LLM_PROVIDER_CALLS.labels(provider.name, "lost").inc()
+                if not task.done():
+                    task.cancel()
+                elif discard and not task.cancelled() and task.exception() is None:
+                    discard(task.result())
+
+        launch()
+        while in_flight:
+            timeout = None
+            if remaining and len(in_flight) == 1 and self._may_hedge():
+                timeout = self.hedge_delay(next(iter(in_flight.values())), kind)
+            done, _ = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                provider = launch()
+                self._count("hedged")
+                LLM_HEDGES.labels(provider.name).inc()
+                continue
+
+            for task in done:
+                provider = in_flight.pop(task)
+                error = task.exception()
+                if error is None:
+                    LLM_PROVIDER_CALLS.labels(provider.name, "won").inc()
+                    if provider is not self.primary:
+                        self._count("hedge_wins" if in_flight else "failovers")
+                    drop_losers()
+                    return task.result()
+                LLM_PROVIDER_CALLS.labels(provider.name, "failed").inc()
+                last_error = error
+                if not is_retriable(error, retriable):
+                    drop_losers()
+                    raise error
+            if not in_flight and remaining:
+                launch()
+        logger.warning(f"All {len(self.providers)} summarization providers failed")
+        raise last_error
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["providers"] = {provider.name: provider.stats() for provider in self.providers}
+        return stats
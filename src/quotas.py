@@ -0,0 +1,412 @@
+# Rate-limit and quota storage shared by every worker process and instance
+#
+# Storage is chosen by URI, the same way for the inbound request limits and the
+# outbound per-API-key quotas, both of which can be token buckets:
+#   memory://                 per process (the old behavior)
+#   sqlite:///path/limits.db  shared by the workers on one host
+#   redis://host:6379/0       shared by every instance (needs the redis package)
+
+import abc
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+
+from limits import WindowStats, parse
+from limits.storage import MemoryStorage, MovingWindowSupport, Storage
+from limits.strategies import STRATEGIES, RateLimiter
+
+try:
+    from src.db import ThreadLocalConnection, sqlite_path
+except ImportError:
+    from db import ThreadLocalConnection, sqlite_path
+
+
+class SQLiteLimitsStorage(Storage, MovingWindowSupport):
+    """limits storage backend in a SQLite file, so flask-limiter works with sqlite:/// URIs
+
+    Defining the class registers the scheme with limits; nothing else needs to refer to it.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS limit_counters (
+            key TEXT PRIMARY KEY,
+            count INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS limit_counters_expires ON limit_counters (expires_at);
+        CREATE TABLE IF NOT EXISTS limit_entries (
+            key TEXT NOT NULL,
+            at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS limit_entries_key_at ON limit_entries (key, at);
+        CREATE INDEX IF NOT EXISTS limit_entries_expires ON limit_entries (expires_at);
+    """
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = sqlite_path(uri)
+        self._conn = ThreadLocalConnection(self.path, self.SCHEMA)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _transaction(self, fn):
+        conn = self._conn.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def incr(self, key, expiry, amount=1, elastic_expiry=False):
+        now = time.time()
+
+        def increment(conn):
+            conn.execute("DELETE FROM limit_counters WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT INTO limit_counters (key, count, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET count = count + excluded.count",
+                (key, amount, now + expiry)
+            )
+            if elastic_expiry:
+                conn.execute("UPDATE limit_counters SET expires_at = ? WHERE key = ?", (now + expiry, key))
+            return conn.execute("SELECT count FROM limit_counters WHERE key = ?", (key,)).fetchone()[0]
+
+        return self._transaction(increment)
+
+    def get(self, key):
+        row = self._conn.get().execute(
+            "SELECT count FROM limit_counters WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._conn.get().execute(
+            "SELECT expires_at FROM limit_counters WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._conn.get().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        def delete_all(conn):
+            count = conn.execute("SELECT COUNT(*) FROM limit_counters").fetchone()[0]
+            conn.execute("DELETE FROM limit_counters")
+            conn.execute("DELETE FROM limit_entries")
+            return count
+
+        return self._transaction(delete_all)
+
+    def clear(self, key):
+        def delete_key(conn):
+            conn.execute("DELETE FROM limit_counters WHERE key = ?", (key,))
+            conn.execute("DELETE FROM limit_entries WHERE key = ?", (key,))
+
+        self._transaction(delete_key)
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+
+        def acquire(conn):
+            conn.execute("DELETE FROM limit_entries WHERE expires_at <= ?", (now,))
+            count = conn.execute(
+                "SELECT COUNT(*) FROM limit_entries WHERE key = ? AND at > ?", (key, now - expiry)
+            ).fetchone()[0]
+            if count + amount > limit:
+                return False
+            conn.executemany("INSERT INTO limit_entries (key, at, expires_at) VALUES (?, ?, ?)",
+                             [(key, now, now + expiry)] * amount)
+            return True
+
+        return self._transaction(acquire)
+
+    def get_moving_window(self, key, limit, expiry):
+        now = time.time()
+        oldest, count = self._conn.get().execute(
+            "SELECT MIN(at), COUNT(*) FROM limit_entries WHERE key = ? AND at > ?", (key, now - expiry)
+        ).fetchone()
+        return (oldest if oldest is not None else now), count
+
+
+class BucketStore(abc.ABC):
+    """Token buckets keyed by string, refilling continuously at `rate` tokens per second
+
+    consume() takes `cost` tokens if the bucket has them and returns 0, or leaves the
+    bucket unchanged and returns the seconds until enough tokens will be available.
+    A bucket that has never been used is full.
+    """
+
+    @abc.abstractmethod
+    def consume(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        """Take cost tokens, returning 0, or the seconds to wait before they are available"""
+
+    @abc.abstractmethod
+    def tokens(self, key: str, rate: float, burst: float) -> float:
+        """Tokens in the bucket now, without taking any"""
+
+
+def _refill(tokens, updated_at, now, rate, burst, cost):
+    """Shared token bucket arithmetic; returns (new_tokens, wait)"""
+    tokens = burst if tokens is None else min(burst, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class MemoryBucketStore(BucketStore):
+    """Buckets in this process only"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, burst, cost=1):
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (None, now))
+            tokens, wait = _refill(tokens, updated_at, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+        return wait
+
+    def tokens(self, key, rate, burst):
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (None, now))
+        return _refill(tokens, updated_at, now, rate, burst, 0)[0]
+
+
+class SQLiteBucketStore(BucketStore):
+    """Buckets in a SQLite file shared by every worker on the host"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS quota_buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = ThreadLocalConnection(path, self.SCHEMA)
+
+    def consume(self, key, rate, burst, cost=1):
+        conn = self._conn.get()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM quota_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, wait = _refill(row["tokens"] if row else None, row["updated_at"] if row else now,
+                                   now, rate, burst, cost)
+            conn.execute("INSERT OR REPLACE INTO quota_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def tokens(self, key, rate, burst):
+        now = time.time()
+        row = self._conn.get().execute("SELECT tokens, updated_at FROM quota_buckets WHERE key = ?",
+                                       (key,)).fetchone()
+        return _refill(row["tokens"] if row else None, row["updated_at"] if row else now, now, rate, burst, 0)[0]
+
+
+class RedisBucketStore(BucketStore):
+    """Buckets in Redis, shared by every instance; the refill runs atomically in a Lua script"""
+
+    SCRIPT = """
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+        local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+        local tokens = burst
+        if bucket[1] then
+            tokens = math.min(burst, tonumber(bucket[1]) + math.max(0, now - tonumber(bucket[2])) * rate)
+        end
+        local wait = 0
+        if tokens >= cost then
+            tokens = tokens - cost
+        else
+            wait = (cost - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+        return tostring(wait)
+    """
+
+    def __init__(self, uri: str = None, client=None):
+        if client is None:
+            import redis  # optional dependency, only needed for redis:// storage
+
+            client = redis.Redis.from_url(uri)
+        self._client = client
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def consume(self, key, rate, burst, cost=1):
+        return float(self._script(keys=[key], args=[rate, burst, cost, time.time()]))
+
+    def tokens(self, key, rate, burst):
+        now = time.time()
+        tokens, updated_at = self._client.hmget(key, "tokens", "updated_at")
+        return _refill(None if tokens is None else float(tokens), now if updated_at is None else float(updated_at),
+                       now, rate, burst, 0)[0]
+
+
+def make_bucket_store(uri: str) -> BucketStore:
+    """Build a bucket store from a URI: memory://, sqlite:///path or redis://host:port/db"""
+    if uri.startswith("memory://"):
+        return MemoryBucketStore()
+    if uri.startswith(("redis://", "rediss://")):
+        return RedisBucketStore(uri)
+    return SQLiteBucketStore(sqlite_path(uri))
+
+
+class TokenBucketRateLimiter(RateLimiter):
+    """limits strategy where each limit is a token bucket, e.g. "5 per minute" holds 5
+    requests and refills one every 12 seconds
+
+    Registered as the "token-bucket" strategy, so flask-limiter takes it by name. The
+    buckets live next to the limits storage: in the same SQLite file or Redis server, or
+    in this process for memory://.
+    """
+
+    def __init__(self, storage: Storage):
+        super().__init__(storage)
+        if isinstance(storage, SQLiteLimitsStorage):
+            self.buckets = SQLiteBucketStore(storage.path)
+        elif isinstance(storage, MemoryStorage):
+            self.buckets = MemoryBucketStore()
+        else:
+            self.buckets = RedisBucketStore(client=storage.get_connection())
+
+    @staticmethod
+    def _shape(item):
+        return item.amount / item.get_expiry(), float(item.amount)
+
+    def hit(self, item, *identifiers, cost=1):
+        rate, burst = self._shape(item)
+        return self.buckets.consume(f"bucket:{item.key_for(*identifiers)}", rate, burst, cost) <= 0
+
+    def test(self, item, *identifiers, cost=1):
+        rate, burst = self._shape(item)
+        return self.buckets.tokens(f"bucket:{item.key_for(*identifiers)}", rate, burst) >= cost
+
+    def get_window_stats(self, item, *identifiers):
+        rate, burst = self._shape(item)
+        tokens = self.buckets.tokens(f"bucket:{item.key_for(*identifiers)}", rate, burst)
+        # Reset is when the bucket will be full again
+        return WindowStats(time.time() + (burst - tokens) / rate, int(tokens))
+
+    def clear(self, item, *identifiers):
+        rate, burst = self._shape(item)
+        # Taking a negative cost refills the bucket
+        self.buckets.consume(f"bucket:{item.key_for(*identifiers)}", rate, burst, -burst)
+
+
+STRATEGIES["token-bucket"] = TokenBucketRateLimiter
+
+
+class QuotaExceededError(Exception):
+    """Raised when an API key's outbound quota would not allow a request within max_wait"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class KeyQuota:
+    """Outbound quota per upstream API key, e.g. "100 per hour" for each SearchAPI.io key
+
+    The quota is a token bucket holding the full allowance that refills evenly over its
+    period. Callers wait for a token for up to max_wait seconds; beyond that the request
+    is refused rather than sent to a provider that would answer 429. Keys are hashed
+    before they are used as bucket names, so raw API keys never reach the store.
+    """
+
+    def __init__(self, name: str, store: BucketStore, limit: str, max_wait: float = 10.0):
+        item = parse(limit)
+        self.name = name
+        self.store = store
+        self.limit = limit
+        self.burst = float(item.amount)
+        self.rate = item.amount / item.get_expiry()
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._counters = {"granted": 0, "waited": 0, "rejected": 0}
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _bucket(self, api_key):
+        return f"quota:{self.name}:{hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]}"
+
+    def _check_cost(self, cost):
+        if cost > self.burst:
+            # More than the whole allowance; waiting would never help
+            self._count("rejected")
+            raise QuotaExceededError(
+                f"Request needs {cost:.0f} of the {self.limit} outbound quota for this {self.name} API key",
+                retry_after=0
+            )
+
+    def _check_wait(self, wait, deadline):
+        if time.monotonic() + wait > deadline:
+            self._count("rejected")
+            raise QuotaExceededError(
+                f"Outbound quota for this {self.name} API key ({self.limit}) is used up; "
+                f"retry in {wait:.0f}s",
+                retry_after=wait
+            )
+
+    def acquire(self, api_key: str, cost: float = 1):
+        """Take cost units (one request by default) from the key's quota, sleeping until available"""
+        self._check_cost(cost)
+        bucket = self._bucket(api_key)
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        while True:
+            wait = self.store.consume(bucket, self.rate, self.burst, cost)
+            if wait <= 0:
+                self._count("waited" if waited else "granted")
+                return
+            self._check_wait(wait, deadline)
+            waited = True
+            time.sleep(wait)
+
+    async def acquire_async(self, api_key: str, cost: float = 1):
+        """acquire() for coroutines; store access runs in a thread as it may block on I/O"""
+        self._check_cost(cost)
+        bucket = self._bucket(api_key)
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        while True:
+            wait = await asyncio.to_thread(self.store.consume, bucket, self.rate, self.burst, cost)
+            if wait <= 0:
+                self._count("waited" if waited else "granted")
+                return
+            self._check_wait(wait, deadline)
+            waited = True
+            await asyncio.sleep(wait)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["limit"] = self.limit
+        return stats
@@ -0,0 +1,171 @@
+# Startup-optimized entry point for serverless platforms (Vercel)
+#
+# Importing the Flask app pulls in Flask, flask_limiter, requests and loguru, configures
+# logging and builds the limiter, caches and upstream clients. This module only uses the
+# standard library: "/" and "/health" are answered directly, and the app is imported on the
+# first request that needs it. Once it is loaded, every request goes through the app.
+
+import io
+import json
+import os
+import sys
+import threading
+from html import escape
+from urllib.parse import urlencode
+
+try:
+    from src.version import __version__ as VERSION
+except ImportError:
+    try:
+        from version import __version__ as VERSION
+    except ImportError:
+        VERSION = "0.4"
+
+try:
+    from src.http_cache import etag_matches, strong_etag
+except ImportError:
+    from http_cache import etag_matches, strong_etag
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "index.html")
+
+_app = None
+_app_lock = threading.Lock()
+_before_load = []
+_index_html = None
+_index_etag = None
+INDEX_MAX_AGE = int(os.getenv("INDEX_MAX_AGE", 300))
+
+# Parts of the WSGI environ that are the same for every request
+_BASE_ENVIRON = {
+    'wsgi.version': (1, 0),
+    'wsgi.url_scheme': 'https',
+    'wsgi.errors': sys.stderr,
+    'wsgi.multithread': False,
+    'wsgi.multiprocess': False,
+    'wsgi.run_once': False,
+    'SCRIPT_NAME': '',
+    'SERVER_NAME': 'vercel',
+    'SERVER_PORT': '443',
+    'SERVER_PROTOCOL': 'HTTP/1.1',
+}
+
+
+def before_app_load(hook):
+    """Register a function to run just before the app is imported, e.g. compatibility patches"""
+    _before_load.append(hook)
+    return hook
+
+
+def get_app():
+    """The Flask app, imported on first use"""
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                for hook in _before_load:
+                    hook()
+                try:
+                    from src.yt_summarizer import app
+                except ImportError:
+                    from yt_summarizer import app
+                _app = app
+    return _app
+
+
+def _index_page(request):
+    """The web interface; its only template variable is the version, so no Jinja is needed"""
+    global _index_html, _index_etag
+    if _index_html is None:
+        with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
+            _index_html = f.read().replace("{{ version }}", escape(VERSION))
+        _index_etag = strong_etag(_index_html.encode("utf-8"))
+    headers = {
+        'Content-Type': 'text/html; charset=utf-8',
+        'ETag': f'"{_index_etag}"',
+        'Cache-Control': f'public, max-age={INDEX_MAX_AGE}',
+    }
+    if etag_matches((request.get('headers') or {}).get('if-none-match'), _index_etag):
+        return {'statusCode': 304, 'headers': headers, 'body': ''}
+    return {'statusCode': 200, 'headers': headers, 'body': _index_html}
+
+
+def _health(request):
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Cache-Control': 'no-store'},
+        'body': json.dumps({'status': 'healthy', 'version': VERSION})
+    }
+
+
+# Served without importing the app while it is not loaded yet
+FAST_ROUTES = {'/': _index_page, '/health': _health}
+
+
+def build_environ(request):
+    """WSGI environ for a Vercel request dict (path, method, headers, body, query)"""
+    headers = request.get('headers') or {}
+    body = request.get('body') or b''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    query = request.get('query') or {}
+    # Client address for rate limiting, from the platform's proxy headers
+    remote_addr = headers.get('x-real-ip') or headers.get('x-forwarded-for', '').split(',')[0].strip()
+
+    environ = dict(_BASE_ENVIRON)
+    environ.update({
+        'PATH_INFO': request.get('path', '/'),
+        'REQUEST_METHOD': request.get('method', 'GET'),
+        'QUERY_STRING': urlencode(query, doseq=True),
+        'wsgi.input': io.BytesIO(body),
+        'CONTENT_LENGTH': str(len(body)),
+        'CONTENT_TYPE': headers.get('content-type', 'text/plain'),
+        'HTTP_HOST': headers.get('host', 'localhost'),
+        'REMOTE_ADDR': remote_addr or '127.0.0.1',
+    })
+
+    # Add HTTP headers to the environment. Accept-Encoding is left out: bodies go back to the
+    # platform as text, and it compresses responses itself.
+    for key, value in headers.items():
+        key = key.upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH', 'ACCEPT_ENCODING'):
+            environ[f'HTTP_{key}'] = value
+    return environ
+
+
+def handler(request, context):
+    """
+    Serverless function handler for Vercel
+
+    Answers "/" and "/health" directly until the app has been loaded; everything else is
+    converted to a WSGI call into the Flask app.
+    """
+    path = request.get('path', '/')
+    if _app is None and request.get('method', 'GET') == 'GET' and path in FAST_ROUTES:
+        return FAST_ROUTES[path](request)
+
+    # Capture the response from the Flask app
+    response_status = []
+    response_headers = []
+
+    def start_response(status, headers, exc_info=None):
+        response_status.append(status)
+        response_headers.extend(headers)
+
+    response_body = b''.join(get_app()(build_environ(request), start_response))
+
+    # Parse the status code
+    status_code = int(response_status[0].split(' ')[0]) if response_status else 200
+
+    # Convert headers to a dictionary
+    headers_dict = {k: v for k, v in response_headers}
+
+    # Ensure API endpoints always return JSON content type
+    if path != '/' and 'Content-Type' not in headers_dict:
+        headers_dict['Content-Type'] = 'application/json'
+
+    # Return the response in the format Vercel expects
+    return {
+        'statusCode': status_code,
+        'headers': headers_dict,
+        'body': response_body.decode('utf-8') if isinstance(response_body, bytes) else response_body
+    }
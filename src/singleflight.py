@@ -0,0 +1,323 @@
+# Single-flight coalescing: concurrent identical upstream calls share one execution
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+from loguru import logger
+
+try:
+    from src.db import ThreadLocalConnection
+except ImportError:
+    from db import ThreadLocalConnection
+
+
+class LeaseLock:
+    """Named, expiring locks in a SQLite database shared by every worker on the host
+
+    A lease that is not released (because its worker died) stops blocking others once
+    it expires. The database is opened on first use, so constructing one creates no file.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS leases (
+            key TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._conn = None
+        self._open_lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            with self._open_lock:
+                if self._conn is None:
+                    self._conn = ThreadLocalConnection(self.path, self.SCHEMA)
+        return self._conn.get()
+
+    def acquire(self, key: str, ttl: float) -> bool:
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM leases WHERE key = ? AND expires_at < ?", (key, now))
+            conn.execute("INSERT OR IGNORE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                         (key, self.owner, now + ttl))
+            row = conn.execute("SELECT owner FROM leases WHERE key = ?", (key,)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row is not None and row["owner"] == self.owner
+
+    def release(self, key: str):
+        self._connection().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+
+
+class _Call:
+    """One in-flight call; followers wait on `done` and then read result or error"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Broadcast:
+    """Items produced by one thread, replayed in full to every reader"""
+
+    def __init__(self):
+        self.items = []
+        self.finished = False
+        self.error = None
+        self._changed = threading.Condition()
+
+    def publish(self, item):
+        with self._changed:
+            self.items.append(item)
+            self._changed.notify_all()
+
+    def close(self, error=None):
+        with self._changed:
+            self.finished = True
+            self.error = error
+            self._changed.notify_all()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._changed:
+                while index >= len(self.items) and not self.finished:
+                    self._changed.wait()
+                pending = self.items[index:]
+                index = len(self.items)
+                finished, error = self.finished, self.error
+            yield from pending
+            if finished and index == len(self.items):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution
+
+    Within a process, callers that arrive while a call is in flight wait for it and
+    receive its result (or its exception). With a LeaseLock and a lookup function,
+    workers in other processes do the same: the one holding the lease calls upstream,
+    the others poll lookup() (normally the shared cache) until the result shows up,
+    and take over if the lease is released or expires without one.
+    """
+
+    def __init__(self, name: str, leases: LeaseLock = None, lease_ttl: float = 300,
+                 poll_interval: float = 0.5):
+        self.name = name
+        self.leases = leases
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._streams = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "executed": 0, "coalesced": 0, "cross_worker_coalesced": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _try_acquire(self, lease_key):
+        """Return True if we hold the lease, False if another worker does, None if unavailable"""
+        try:
+            return self.leases.acquire(lease_key, self.lease_ttl)
+        except Exception as e:
+            logger.error(f"Error acquiring {self.name} lease: {str(e)}")
+            return None
+
+    def _release(self, lease_key):
+        try:
+            self.leases.release(lease_key)
+        except Exception as e:
+            logger.error(f"Error releasing {self.name} lease: {str(e)}")
+
+    def _lead(self, key, run, lookup):
+        """Run as this process's leader; returns (value, shared) where shared means another worker produced it"""
+        if self.leases is None or lookup is None:
+            self._count("executed")
+            return run(), False
+
+        lease_key = f"{self.name}:{key}"
+        deadline = time.monotonic() + self.lease_ttl
+        while True:
+            acquired = self._try_acquire(lease_key)
+            if acquired is None:
+                self._count("executed")
+                return run(), False
+            if acquired:
+                try:
+                    # The previous holder may have finished between our lookup and the lease
+                    value = lookup()
+                    if value is not None:
+                        self._count("cross_worker_coalesced")
+                        return value, True
+                    self._count("executed")
+                    return run(), False
+                finally:
+                    self._release(lease_key)
+
+            value = lookup()
+            if value is not None:
+                self._count("cross_worker_coalesced")
+                return value, True
+            if time.monotonic() >= deadline:
+                logger.warning(f"Gave up waiting for {self.name} lease on {key}")
+                self._count("executed")
+                return run(), False
+            time.sleep(self.poll_interval)
+
+    def do(self, key: str, fn, lookup=None):
+        """Return fn(), sharing one execution among concurrent callers with the same key"""
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result, _ = self._lead(key, fn, lookup)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stream(self, key: str, produce, lookup=None):
+        """Like do() for generators: one thread runs produce() and every caller sees all of its items
+
+        The producer runs independently of its callers, so a client that disconnects does
+        not cut the stream short for the others. When another worker produced the value,
+        it arrives as a single item.
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            broadcast = self._streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._streams[key] = _Broadcast()
+            else:
+                self._stats["coalesced"] += 1
+
+        if leader:
+            thread = threading.Thread(target=self._produce, args=(key, broadcast, produce, lookup),
+                                      name=f"singleflight-{self.name}", daemon=True)
+            thread.start()
+        return iter(broadcast)
+
+    def _produce(self, key, broadcast, produce, lookup):
+        def run():
+            for item in produce():
+                broadcast.publish(item)
+
+        error = None
+        try:
+            value, shared = self._lead(key, run, lookup)
+            if shared:
+                broadcast.publish(value)
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                del self._streams[key]
+            broadcast.close(error)
+
+    async def do_async(self, key: str, fn, lookup=None):
+        """Coroutine version of do(); fn is an async callable, lookup a plain one"""
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+        with self._lock:
+            self._stats["calls"] += 1
+            future = self._async_calls.get(call_key)
+            leader = future is None
+            if leader:
+                future = self._async_calls[call_key] = loop.create_future()
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            value = await self._lead_async(key, fn, lookup)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved so a leader without followers does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._async_calls[call_key]
+
+    async def _lead_async(self, key, fn, lookup):
+        if self.leases is None or lookup is None:
+            self._count("executed")
+            return await fn()
+
+        lease_key = f"{self.name}:{key}"
+        deadline = time.monotonic() + self.lease_ttl
+        while True:
+            acquired = await asyncio.to_thread(self._try_acquire, lease_key)
+            if acquired is None:
+                self._count("executed")
+                return await fn()
+            if acquired:
+                try:
+                    value = await asyncio.to_thread(lookup)
+                    if value is not None:
+                        self._count("cross_worker_coalesced")
+                        return value
+                    self._count("executed")
+                    return await fn()
+                finally:
+                    await asyncio.to_thread(self._release, lease_key)
+
+            value = await asyncio.to_thread(lookup)
+            if value is not None:
+                self._count("cross_worker_coalesced")
+                return value
+            if time.monotonic() >= deadline:
+                logger.warning(f"Gave up waiting for {self.name} lease on {key}")
+                self._count("executed")
+                return await fn()
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls) + len(self._streams) + len(self._async_calls)
+        # Every caller served by someone else's upstream call is one call we did not make
+        stats["saved_upstream_calls"] = stats["coalesced"] + stats["cross_worker_coalesced"]
+        return stats
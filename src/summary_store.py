@@ -0,0 +1,200 @@
+# Summaries stored in one SQLite file instead of one Markdown file per video
+#
+# Each summary is a row keyed by video ID, written in a single transaction, so a crash never
+# leaves a partial summary behind and lookups go through the primary key index. Bodies above
+# a small size are zlib-compressed; zlib data is also valid HTTP "deflate" content, so it can
+# be sent to clients without decompressing. The ETag of each summary is stored with it.
+
+import json
+import os
+import time
+import zlib
+from collections import namedtuple
+
+from loguru import logger
+
+try:
+    from src.cache import content_hash
+    from src.db import ThreadLocalConnection
+except ImportError:
+    from cache import content_hash
+    from db import ThreadLocalConnection
+
+# Legacy file layout written by earlier versions: <output dir>/<video_id>_summary.md
+LEGACY_SUFFIX = "_summary.md"
+LEGACY_MARKER = ".summaries-migrated"
+
+StoredSummary = namedtuple("StoredSummary", "video_id summary etag updated_at")
+
+
+def summary_etag(summary: str) -> str:
+    return content_hash(summary)[:32]
+
+
+def decode_body(encoding: str, body: bytes) -> str:
+    """Summary text from a stored body and its encoding ("zlib" or "identity")"""
+    return (zlib.decompress(body) if encoding == "zlib" else bytes(body)).decode("utf-8")
+
+
+class SummaryStore:
+    """Latest summary per video, with compressed bodies, ETags and bulk export/import
+
+    compress:           zlib-compress bodies of at least compress_min_size bytes
+    legacy_dir:         import <video_id>_summary.md files from this directory once
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS summaries (
+            video_id TEXT PRIMARY KEY,
+            etag TEXT NOT NULL,
+            encoding TEXT NOT NULL,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str, compress: bool = True, compress_min_size: int = 256, legacy_dir: str = None):
+        self.path = path
+        self.compress = compress
+        self.compress_min_size = compress_min_size
+        self._conn = ThreadLocalConnection(path, self.SCHEMA)
+        if legacy_dir:
+            self.migrate_files(legacy_dir)
+
+    def _encode(self, video_id, summary, updated_at):
+        data = summary.encode("utf-8")
+        encoding = "identity"
+        if self.compress and len(data) >= self.compress_min_size:
+            compressed = zlib.compress(data, 6)
+            if len(compressed) < len(data):
+                data, encoding = compressed, "zlib"
+        return video_id, summary_etag(summary), encoding, data, len(summary), updated_at
+
+    def put(self, video_id: str, summary: str, updated_at: float = None) -> str:
+        """Store (or replace) the summary of video_id and return its ETag"""
+        row = self._encode(video_id, summary, updated_at or time.time())
+        self._conn.get().execute(
+            "INSERT OR REPLACE INTO summaries (video_id, etag, encoding, body, size, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", row
+        )
+        return row[1]
+
+    def get(self, video_id: str):
+        """StoredSummary for video_id, or None"""
+        stored = self.get_raw(video_id)
+        if stored is None:
+            return None
+        etag, encoding, body, updated_at = stored
+        return StoredSummary(video_id, decode_body(encoding, body), etag, updated_at)
+
+    def get_raw(self, video_id: str):
+        """(etag, encoding, body, updated_at) without decompressing, or None"""
+        row = self._conn.get().execute(
+            "SELECT etag, encoding, body, updated_at FROM summaries WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        return (row["etag"], row["encoding"], bytes(row["body"]), row["updated_at"]) if row else None
+
+    def etag(self, video_id: str):
+        """ETag of the stored summary, for conditional requests that need no body"""
+        row = self._conn.get().execute("SELECT etag FROM summaries WHERE video_id = ?", (video_id,)).fetchone()
+        return row["etag"] if row else None
+
+    def delete(self, video_id: str) -> bool:
+        return self._conn.get().execute("DELETE FROM summaries WHERE video_id = ?", (video_id,)).rowcount > 0
+
+    def count(self) -> int:
+        return self._conn.get().execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def iter_all(self, batch_size: int = 500):
+        """Iterate over every StoredSummary in video ID order, one page at a time"""
+        cursor = ""
+        while True:
+            rows = self._conn.get().execute(
+                "SELECT video_id, etag, encoding, body, updated_at FROM summaries "
+                "WHERE video_id > ? ORDER BY video_id LIMIT ?", (cursor, batch_size)
+            ).fetchall()
+            for row in rows:
+                yield StoredSummary(row["video_id"], decode_body(row["encoding"], row["body"]),
+                                    row["etag"], row["updated_at"])
+            if len(rows) < batch_size:
+                return
+            cursor = rows[-1]["video_id"]
+
+    def export(self, f) -> int:
+        """Write every summary to the text file f as JSON lines; returns the count"""
+        count = 0
+        for stored in self.iter_all():
+            f.write(json.dumps({"video_id": stored.video_id, "summary": stored.summary,
+                                "updated_at": stored.updated_at}, ensure_ascii=False) + "\n")
+            count += 1
+        return count
+
+    def import_records(self, records, batch_size: int = 500) -> int:
+        """Store {"video_id", "summary", "updated_at"} records, one transaction per batch
+
+        A record only replaces a stored summary that is not newer than it. Returns the
+        number of records read.
+        """
+        conn = self._conn.get()
+        count, batch = 0, []
+
+        def flush():
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO summaries (video_id, etag, encoding, body, size, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(video_id) DO UPDATE SET "
+                    "etag = excluded.etag, encoding = excluded.encoding, body = excluded.body, "
+                    "size = excluded.size, updated_at = excluded.updated_at "
+                    "WHERE excluded.updated_at >= summaries.updated_at",
+                    batch
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        for record in records:
+            batch.append(self._encode(record["video_id"], record["summary"],
+                                      float(record.get("updated_at") or time.time())))
+            count += 1
+            if len(batch) >= batch_size:
+                flush()
+                batch = []
+        if batch:
+            flush()
+        return count
+
+    def import_file(self, f) -> int:
+        """import_records() from a file written by export()"""
+        return self.import_records(json.loads(line) for line in f if line.strip())
+
+    def migrate_files(self, directory: str) -> int:
+        """Import the one-file-per-video summaries of earlier versions once
+
+        The files are left in place; a marker file records that the import ran.
+        """
+        marker = os.path.join(directory, LEGACY_MARKER)
+        if not os.path.isdir(directory) or os.path.exists(marker):
+            return 0
+
+        def records():
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(LEGACY_SUFFIX) or not entry.is_file():
+                        continue
+                    with open(entry.path, "r", encoding="utf-8") as f:
+                        yield {"video_id": entry.name[:-len(LEGACY_SUFFIX)], "summary": f.read(),
+                               "updated_at": entry.stat().st_mtime}
+
+        try:
+            count = self.import_records(records())
+            with open(marker, "w") as f:
+                f.write(f"{count} summaries imported into {self.path}\n")
+        except Exception as e:
+            logger.error(f"Error migrating summary files from {directory}: {str(e)}")
+            return 0
+        if count:
+            logger.info(f"Migrated {count} summary files from {directory}")
+        return count
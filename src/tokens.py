@@ -0,0 +1,97 @@
+# Local prompt token counting and summary planning, before anything is sent to Deepseek
+#
+# With tiktoken installed, counts use its cl100k_base encoding, which is close to the Deepseek
+# tokenizer for English text. Without it (or offline, when the encoding cannot be loaded) a
+# pure-Python approximation counts words, number groups and punctuation marks. Either way the
+# counts are estimates; the API's usage figures are compared against them in the metrics.
+
+import math
+import re
+from collections import namedtuple
+
+# Words and numbers are usually one token (numbers in groups of up to three digits), each
+# punctuation mark or non-ASCII character roughly one; rarer long words split every ~5 characters
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+_LONG_WORD = 10
+
+STRATEGIES = ("auto", "fixed")
+# Rough size of one chunk's partial summary, which the reduce pass reads back
+PARTIAL_SUMMARY_TOKENS = 400
+
+
+def approximate_tokens(text: str) -> int:
+    """Tokenizer-free estimate of the BPE token count of text"""
+    pieces = _PIECE_RE.findall(text)
+    return len(pieces) + sum((len(piece) - 6) // 5 for piece in pieces if len(piece) > _LONG_WORD)
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when available, otherwise with approximate_tokens
+
+    name:      "auto" (tiktoken if installed), "tiktoken" or "approximate"
+    encoding:  tiktoken encoding to use
+    """
+
+    def __init__(self, name: str = "auto", encoding: str = "cl100k_base"):
+        if name not in ("auto", "tiktoken", "approximate"):
+            raise ValueError(f"Unknown tokenizer: {name}")
+        self._encoding = None
+        if name != "approximate":
+            try:
+                import tiktoken  # optional dependency
+
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception:
+                # Not installed, or the encoding file could not be downloaded
+                if name == "tiktoken":
+                    raise
+        self.name = f"tiktoken:{encoding}" if self._encoding is not None else "approximate"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return approximate_tokens(text)
+
+
+class TokenBudgetError(ValueError):
+    """Raised when a summary would send more prompt tokens than a request may use"""
+
+    def __init__(self, message, tokens, budget):
+        super().__init__(message)
+        self.tokens = tokens
+        self.budget = budget
+
+
+# strategy:       "single" (one call) or "map_reduce"
+# chunk_tokens:   tokens per chunk for map_reduce
+# chunks:         expected number of map calls (1 for single)
+# prompt_tokens:  tokens of the transcript text itself
+# total_tokens:   estimated prompt tokens over every call, prompt templates and reduce input included
+SummaryPlan = namedtuple("SummaryPlan", "strategy chunk_tokens chunks prompt_tokens total_tokens")
+
+
+def plan_summary(prompt_tokens: int, chunk_tokens: int, parallelism: int, max_chunk_tokens: int,
+                 template_tokens: int = 0, strategy: str = "auto") -> SummaryPlan:
+    """Choose between one call and map-reduce for a transcript of prompt_tokens tokens
+
+    "fixed" splits anything over chunk_tokens into chunks of chunk_tokens. "auto" also starts
+    map-reduce above chunk_tokens, but grows the chunks (up to max_chunk_tokens, what fits in
+    the model's context) so that all of them are summarized in one round of `parallelism`
+    concurrent calls. Latency is dominated by the generated output of each call, so fewer,
+    larger chunks finish sooner and repeat the prompt template less often.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy: {strategy}")
+    max_chunk_tokens = max(1, max_chunk_tokens)
+    chunk_tokens = min(chunk_tokens, max_chunk_tokens)
+    if prompt_tokens <= chunk_tokens:
+        return SummaryPlan("single", chunk_tokens, 1, prompt_tokens, prompt_tokens + template_tokens)
+
+    if strategy == "auto":
+        chunk_tokens = min(max(chunk_tokens, math.ceil(prompt_tokens / max(1, parallelism))), max_chunk_tokens)
+    chunks = math.ceil(prompt_tokens / chunk_tokens)
+    # Map calls, then at least one reduce call over the partial summaries
+    total = prompt_tokens + (chunks + 1) * template_tokens + chunks * PARTIAL_SUMMARY_TOKENS
+    return SummaryPlan("map_reduce", chunk_tokens, chunks, prompt_tokens, total)
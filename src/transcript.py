@@ -0,0 +1,206 @@
+# Compact transcript model: one text buffer plus parallel arrays of segment timings
+
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+
+# Binary cache format, all little-endian:
+#   magic | segment count | video ID length | text length (bytes)
+#   video ID | starts (float64 x n) | durations (float64 x n) | offsets (uint32 x n+1) | text
+MAGIC = b"YTT1"
+_HEADER = struct.Struct("<4sIHI")
+
+
+def format_timestamp(seconds: float) -> str:
+    """12:40 for times under an hour, 1:02:03 beyond"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class Segment:
+    """One caption: start and duration in seconds, and its text"""
+
+    __slots__ = ("start", "duration", "text")
+
+    def __init__(self, start, duration, text):
+        self.start = start
+        self.duration = duration
+        self.text = text
+
+    def __repr__(self):
+        return f"Segment({format_timestamp(self.start)}, {self.duration:.1f}s, {self.text!r})"
+
+
+class Transcript:
+    """Transcript segments stored column-wise instead of as a list of dicts
+
+    Segment texts live in one string joined by single spaces, so `text` is the full
+    transcript without re-joining, and segment i is text[offsets[i]:offsets[i + 1] - 1].
+    Starts and durations are float arrays. As a sequence, a Transcript yields segment
+    texts, so code written for lists of strings keeps working.
+    """
+
+    __slots__ = ("video_id", "text", "starts", "durations", "offsets")
+
+    def __init__(self, video_id, text, starts, durations, offsets):
+        self.video_id = video_id
+        self.text = text
+        self.starts = starts
+        self.durations = durations
+        self.offsets = offsets
+
+    @classmethod
+    def from_segments(cls, entries, video_id=""):
+        """Build from SearchAPI.io transcript entries ({"text", "start", "duration"}) or plain strings"""
+        starts, durations, offsets = array("d"), array("d"), array("I", [0])
+        texts, position = [], 0
+        for entry in entries:
+            if isinstance(entry, str):
+                text, start, duration = entry, 0.0, 0.0
+            else:
+                text = entry.get("text") or ""
+                start = float(entry.get("start") or 0.0)
+                duration = float(entry.get("duration") or 0.0)
+            texts.append(text)
+            starts.append(start)
+            durations.append(duration)
+            position += len(text) + 1
+            offsets.append(position)
+        return cls(video_id, " ".join(texts), starts, durations, offsets)
+
+    @classmethod
+    def from_rows(cls, rows, video_id=""):
+        """Build from an iterable of (start, duration, text) tuples"""
+        starts, durations, offsets = array("d"), array("d"), array("I", [0])
+        texts, position = [], 0
+        for start, duration, text in rows:
+            texts.append(text)
+            starts.append(start)
+            durations.append(duration)
+            position += len(text) + 1
+            offsets.append(position)
+        return cls(video_id, " ".join(texts), starts, durations, offsets)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("segment index out of range")
+        return self.text[self.offsets[index]:self.offsets[index + 1] - 1]
+
+    def __iter__(self):
+        text, offsets = self.text, self.offsets
+        for i in range(len(self)):
+            yield text[offsets[i]:offsets[i + 1] - 1]
+
+    def __eq__(self, other):
+        if not isinstance(other, Transcript):
+            return NotImplemented
+        return (self.video_id, self.text, self.starts, self.durations) == \
+            (other.video_id, other.text, other.starts, other.durations)
+
+    def __repr__(self):
+        return f"Transcript({self.video_id!r}, {len(self)} segments, {len(self.text)} chars)"
+
+    def segment(self, index) -> Segment:
+        return Segment(self.starts[index], self.durations[index], self[index])
+
+    def segments(self):
+        """Iterate over Segment records (start, duration, text)"""
+        for i in range(len(self)):
+            yield self.segment(i)
+
+    def segment_length(self, index) -> int:
+        return self.offsets[index + 1] - self.offsets[index] - 1
+
+    def text_between(self, first, last) -> str:
+        """Text of segments first..last-1 joined by spaces, sliced straight from the buffer"""
+        return self.text[self.offsets[first]:self.offsets[last] - 1]
+
+    def segment_at(self, seconds: float) -> int:
+        """Index of the segment playing at `seconds`"""
+        return max(0, bisect_right(self.starts, seconds) - 1)
+
+    @property
+    def has_timings(self) -> bool:
+        return any(self.durations) or any(self.starts)
+
+    def timestamped_segments(self, interval: float = 30.0) -> list:
+        """Segment texts with a "[12:40]" marker at the first segment of every `interval` seconds
+
+        Markers let the summarizer point each summary item back to a position in the video.
+        """
+        texts, next_mark = [], None
+        for i, text in enumerate(self):
+            start = self.starts[i]
+            if next_mark is None or start >= next_mark:
+                text = f"[{format_timestamp(start)}] {text}"
+                next_mark = start - start % interval + interval
+            texts.append(text)
+        return texts
+
+    def to_bytes(self) -> bytes:
+        video_id = self.video_id.encode("utf-8")
+        text = self.text.encode("utf-8")
+        return b"".join((
+            _HEADER.pack(MAGIC, len(self), len(video_id), len(text)),
+            video_id,
+            _little_endian(self.starts),
+            _little_endian(self.durations),
+            _little_endian(self.offsets),
+            text,
+        ))
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """Decode to_bytes() output; raises ValueError for anything else"""
+        if len(data) < _HEADER.size:
+            raise ValueError("Truncated transcript data")
+        magic, count, video_id_length, text_length = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a binary transcript")
+        floats, offsets_size = count * 8, (count + 1) * 4
+        position = _HEADER.size
+        if len(data) != position + video_id_length + 2 * floats + offsets_size + text_length:
+            raise ValueError("Truncated transcript data")
+
+        video_id = data[position:position + video_id_length].decode("utf-8")
+        position += video_id_length
+        starts = _from_little_endian("d", data[position:position + floats])
+        position += floats
+        durations = _from_little_endian("d", data[position:position + floats])
+        position += floats
+        offsets = _from_little_endian("I", data[position:position + offsets_size])
+        position += offsets_size
+        text = data[position:].decode("utf-8")
+        return cls(video_id, text, starts, durations, offsets)
+
+
+def joined_text(segments) -> str:
+    """Whole transcript text, without re-joining when it is already a Transcript"""
+    return segments.text if isinstance(segments, Transcript) else " ".join(segments)
@@ -0,0 +1,273 @@
+# Shared HTTP client layer for the upstream APIs (SearchAPI.io and Deepseek)
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+try:
+    from src.metrics import UPSTREAM_RESPONSES, UPSTREAM_SECONDS
+except ImportError:
+    from metrics import UPSTREAM_RESPONSES, UPSTREAM_SECONDS
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Methods that can be sent again after a timeout or dropped connection without side effects;
+# other requests (Deepseek POSTs) are only retried when they never reached the upstream
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+
+def is_connect_error(error) -> bool:
+    """True if the request failed while connecting, before the upstream could have received it"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.Timeout):
+        return False
+    reason = error.args[0] if error.args else None
+    # requests wraps urllib3's MaxRetryError, whose reason is the underlying error;
+    # NewConnectionError (refused, DNS failure) is a ConnectTimeoutError
+    return isinstance(getattr(reason, "reason", reason), ConnectTimeoutError)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without contacting the upstream while its circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, probing again after a cool-down
+
+    closed    -> requests flow normally; consecutive failures are counted
+    open      -> requests are rejected until reset_timeout has passed
+    half_open -> a single probe request is let through to test recovery
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open":
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """End an admitted request that got no upstream outcome, letting the next probe through"""
+        with self._lock:
+            if self.state == "half_open":
+                self._probe_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected
+            }
+
+
+class RateLimiter:
+    """Token bucket pacing outbound requests to `rate` per second with bursts up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def parse_retry_after(value):
+    """Return the delay in seconds requested by a Retry-After header, if any"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class UpstreamClient:
+    """Keep-alive session for one upstream host with timeouts, retries and a circuit breaker"""
+
+    def __init__(self, name, base_url, pool_size=10, connect_timeout=5.0, read_timeout=60.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=20.0, breaker=None, rate_limit=None,
+                 quota=None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        # Optional per-API-key KeyQuota; requests opt in by passing quota_key
+        self.quota = quota
+
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount(self.base_url, self._adapter)
+
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "retries": 0, "errors": 0}
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, honoring Retry-After when the upstream sends it"""
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, path, quota_key=None, **kwargs):
+        # One quota unit per call, retries included, taken before a half-open probe is admitted
+        if self.quota is not None and quota_key:
+            self.quota.acquire(quota_key)
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open); try again later")
+
+        kwargs.setdefault("timeout", self.timeout)
+        url = self.base_url + path
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        recorded = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                self._count("requests")
+                started = time.perf_counter()
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    UPSTREAM_RESPONSES.labels(self.name, "error").inc()
+                    self._count("errors")
+                    # A POST that timed out may have been processed (and billed) by the upstream
+                    if attempt == self.max_retries or not (idempotent or is_connect_error(e)):
+                        self.breaker.record_failure()
+                        recorded = True
+                        raise
+                    self._count("retries")
+                    time.sleep(self._backoff(attempt))
+                    continue
+
+                UPSTREAM_SECONDS.labels(self.name).observe(time.perf_counter() - started)
+                UPSTREAM_RESPONSES.labels(self.name, str(response.status_code)).inc()
+                if response.status_code in RETRY_STATUSES:
+                    self._count("errors")
+                    if attempt < self.max_retries:
+                        delay = self._backoff(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                        response.close()
+                        self._count("retries")
+                        time.sleep(delay)
+                        continue
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                recorded = True
+                return response
+        finally:
+            # Any other exception would otherwise leave a half-open breaker waiting on this probe
+            if not recorded:
+                self.breaker.release()
+
+    def mount(self, adapter):
+        """Send this client's requests through another transport adapter, e.g. a cassette's"""
+        self._adapter = adapter
+        self.session.mount(self.base_url, adapter)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def pool_stats(self):
+        """Connection counts from the underlying urllib3 pools"""
+        opened, idle, pools = 0, 0, 0
+        try:
+            manager = self._adapter.poolmanager
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                pools += 1
+                opened += pool.num_connections
+                if pool.pool is not None:
+                    # The queue is pre-filled with None placeholders for unopened slots
+                    idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        except Exception:
+            pass
+        return {"pools": pools, "max_size": self.pool_size,
+                "connections_opened": opened, "idle_connections": idle}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["pool"] = self.pool_stats()
+        stats["circuit"] = self.breaker.stats()
+        if self.quota is not None:
+            stats["quota"] = self.quota.stats()
+        return stats
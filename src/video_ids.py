@@ -0,0 +1,104 @@
+# YouTube video ID extraction and URL normalization
+#
+# One precompiled regex covers the common URL forms (watch?v= first in the query string,
+# youtu.be/, embed/, v/, e/, shorts/, live/, youtube-nocookie.com, m. and music. hosts, and the
+# legacy user/... paths), so most URLs are scanned once. The pattern starts with a literal, which
+# lets the regex engine skip ahead to candidates. Only when that first pass finds nothing is the
+# query string parsed with urllib.parse for a v= parameter elsewhere, and are hosts in upper case
+# and URL-encoded links (e.g. attribution_link?u=%2Fwatch%3Fv%3D...) tried.
+
+import re
+from collections import namedtuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+VIDEO_ID_RE = re.compile(r"[\w-]{11}")
+_URL_RE = re.compile(
+    r"youtu(?:be(?:-nocookie)?\.com/(?:"
+    r"watch\?v="                            # the most common form, tried first
+    r"|(?:embed|v|e|shorts|live)/"          # path forms
+    r"|(?:user/)?\w+/\w+/"                  # legacy user and channel paths
+    r")|\.be/)"
+    r"([\w-]{11})(?![\w-])"                 # the ID must not continue past 11 characters
+)
+_HOST_ANY_CASE_RE = re.compile(r"(?i:youtu(?:be(?:-nocookie)?\.com|\.be)/)")
+
+INVALID_URL_MESSAGE = "Could not extract YouTube video ID from URL. Please provide a valid YouTube URL."
+
+# url: the input as given; video_id: None on failure; error: None on success
+VideoIdResult = namedtuple("VideoIdResult", "url video_id error")
+
+
+def _query_video_id(query):
+    """The v= parameter of a query string, also looked for in the link of attribution_link?u="""
+    params = parse_qs(query)
+    for value in params.get("v", ()):
+        if VIDEO_ID_RE.fullmatch(value):
+            return value
+    for link in params.get("u", ()):
+        video_id = _query_video_id(urlsplit(link).query)
+        if video_id is not None:
+            return video_id
+    return None
+
+
+def _search_query(url):
+    """The v= parameter of the query string of a YouTube URL within url, or None"""
+    if "v=" not in url:
+        return None
+    for match in _HOST_ANY_CASE_RE.finditer(url):
+        # The URL runs from its host to the next whitespace; "//" makes urlsplit read it as the host
+        video_id = _query_video_id(urlsplit("//" + url[match.start():].split(None, 1)[0]).query)
+        if video_id is not None:
+            return video_id
+    return None
+
+
+def _search_slow(url):
+    """Second pass for URLs the plain pattern missed: v= later in the query string, upper-case
+    hosts and encoded links"""
+    video_id = _search_query(url)
+    if video_id is not None or "%" not in url:
+        return video_id
+    url = _HOST_ANY_CASE_RE.sub(lambda match: match.group(0).lower(), unquote(url))
+    match = _URL_RE.search(url)
+    return match.group(1) if match else _search_query(url)
+
+
+def _search(url):
+    match = _URL_RE.search(url)
+    return match.group(1) if match is not None else _search_slow(url)
+
+
+def extract_video_id(url: str) -> str:
+    """Extract YouTube video ID from URL, or accept a bare 11-character ID"""
+    video_id = _search(url)
+    if video_id is not None:
+        return video_id
+    url = url.strip()
+    if VIDEO_ID_RE.fullmatch(url):
+        return url
+    raise ValueError(INVALID_URL_MESSAGE)
+
+
+def extract_video_ids(urls):
+    """Yield a VideoIdResult for each URL of an iterable, without raising for invalid ones"""
+    for url in urls:
+        try:
+            yield VideoIdResult(url, extract_video_id(url), None)
+        except TypeError:
+            yield VideoIdResult(url, None, "URL must be a string")
+        except ValueError as e:
+            yield VideoIdResult(url, None, str(e))
+
+
+def canonical_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def normalize_url(url: str) -> str:
+    """The canonical watch URL for any supported form of a video's URL
+
+    Every link to the same video (short links, embeds, extra query parameters, timestamps)
+    normalizes to the same string, so it can serve as a cache or history key.
+    """
+    return canonical_url(extract_video_id(url))
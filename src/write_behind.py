@@ -0,0 +1,294 @@
+# Write-behind queue for log lines, history entries and stored summaries
+#
+# Request threads put writes on a bounded in-memory queue and return. One background thread
+# takes whatever has queued up (at most batch_size writes) and hands each kind of write to its
+# handler as one batch: log lines become a single file write, history entries and summaries a
+# single SQLite transaction each. When the queue is full, submit() blocks until the writer has
+# caught up (backpressure), so memory stays bounded and no write is dropped.
+#
+# A batch whose handler fails (e.g. a locked SQLite database) is kept and tried again after
+# a growing delay; writes of the same kind queued meanwhile wait behind it, so they are applied
+# in order. Only after max_attempts failures are the held writes dropped and reported.
+#
+# Handlers with a sync() (the log file) are fsynced at most every fsync_interval seconds, and
+# once more on close(). Readers that must see earlier writes, such as GET /summary/<video_id>
+# right after POST /summarize, call drain() with the kinds they read first.
+
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+
+try:
+    from src.metrics import WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_STALL_SECONDS
+except ImportError:
+    from metrics import WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_STALL_SECONDS
+
+_STOP = object()
+
+
+class WriteBehind:
+    """Bounded queue of writes applied in batches by a background thread
+
+    max_pending:     writes queued before submit() blocks
+    batch_size:      most writes applied in one batch
+    fsync_interval:  seconds between syncs of handlers that have one
+    enabled:         off, every write is applied by the thread that submits it
+    max_attempts:    times a failed batch is tried before its writes are dropped
+    retry_delay:     seconds before the first retry of a failed batch; doubles with each retry
+    """
+
+    def __init__(self, max_pending=10000, batch_size=500, fsync_interval=1.0, enabled=True,
+                 max_attempts=5, retry_delay=0.2):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.enabled = enabled
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._applied_changed = threading.Condition(self._lock)
+        # Handlers are not thread-safe; only the writer calls them unless writes are inline
+        self._apply_lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        # Writes per kind; a dropped write counts as applied, so drain() does not wait on it
+        self._submitted = Counter()
+        self._applied = Counter()
+        self._counters = {"batches": 0, "stalls": 0, "stall_seconds": 0.0, "errors": 0, "retries": 0,
+                          "dropped": 0}
+
+    def register(self, kind, apply, sync=None):
+        """apply(items) writes a batch of one kind; sync(), if given, makes applied writes durable"""
+        self._handlers[kind] = (apply, sync)
+
+    def sink(self, kind):
+        """loguru sink queueing each formatted message as a write of kind"""
+        return lambda message: self.submit(kind, str(message))
+
+    def _start(self):
+        self._queue = queue.Queue(self.max_pending)
+        self._submitted, self._applied = Counter(), Counter()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, kind, item):
+        """Queue one write, waiting for room if the queue is full"""
+        if threading.current_thread() is self._thread:
+            # The writer's own log lines are written straight away; queueing or retrying them
+            # could deadlock or hold up every other write
+            if not self._apply(kind, [item]):
+                self._drop(kind, [item])
+            return
+        if not self.enabled or self._closed:
+            self._apply_inline(kind, [item])
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # First write, or first in a forked worker, which has no writer thread of its own
+                self._start()
+            self._submitted[kind] += 1
+        try:
+            self._queue.put_nowait((kind, item))
+        except queue.Full:
+            started = time.perf_counter()
+            self._queue.put((kind, item))
+            waited = time.perf_counter() - started
+            WRITE_BEHIND_STALL_SECONDS.observe(waited)
+            with self._lock:
+                self._counters["stalls"] += 1
+                self._counters["stall_seconds"] += waited
+
+    def _apply(self, kind, items) -> bool:
+        """Try a batch once; False if its handler failed"""
+        apply, _ = self._handlers[kind]
+        try:
+            with self._apply_lock:
+                apply(items)
+            return True
+        except Exception as e:
+            with self._lock:
+                self._counters["errors"] += 1
+            # Not through the logger: its file sink may be what failed
+            print(f"Write-behind: failed to write {len(items)} {kind} item(s): {e}", file=sys.stderr)
+            return False
+
+    def _backoff(self, attempt):
+        return self.retry_delay * 2 ** (attempt - 1)
+
+    def _drop(self, kind, items):
+        with self._lock:
+            self._counters["dropped"] += len(items)
+        print(f"Write-behind: dropped {len(items)} {kind} item(s) after {self.max_attempts} failed attempts",
+              file=sys.stderr)
+
+    def _apply_inline(self, kind, items):
+        for attempt in range(1, self.max_attempts + 1):
+            if self._apply(kind, items):
+                return
+            if attempt < self.max_attempts:
+                with self._lock:
+                    self._counters["retries"] += 1
+                time.sleep(self._backoff(attempt))
+        self._drop(kind, items)
+
+    def _sync(self, kinds):
+        for kind in kinds:
+            _, sync = self._handlers[kind]
+            try:
+                with self._apply_lock:
+                    sync()
+            except Exception as e:
+                self._counters["errors"] += 1
+                print(f"Write-behind: failed to sync {kind}: {e}", file=sys.stderr)
+
+    def _run(self):
+        unsynced = set()
+        last_sync = time.monotonic()
+        # kind -> [writes held after a failed batch, failed attempts, monotonic time of the next]
+        held = {}
+        while True:
+            timeout = self.fsync_interval if unsynced else None
+            if held:
+                until_retry = max(0.0, min(retry_at for _, _, retry_at in held.values()) - time.monotonic())
+                timeout = until_retry if timeout is None else min(timeout, until_retry)
+            try:
+                # With nothing to sync or retry, sleep until the next write
+                batch = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            by_kind = {}
+            for kind, item in batch:
+                if kind is _STOP:
+                    stop = True
+                else:
+                    by_kind.setdefault(kind, []).append(item)
+            # New writes of a kind with a held batch queue up behind it, keeping their order
+            for kind, items in list(by_kind.items()):
+                if kind in held:
+                    held[kind][0].extend(by_kind.pop(kind))
+            now = time.monotonic()
+            attempts = {}
+            for kind, (items, failed, retry_at) in list(held.items()):
+                if stop or retry_at <= now:
+                    del held[kind]
+                    by_kind[kind] = items
+                    attempts[kind] = failed
+                    with self._lock:
+                        self._counters["retries"] += 1
+
+            finished = False
+            for kind, items in by_kind.items():
+                if self._apply(kind, items):
+                    WRITE_BEHIND_BATCH_SIZE.labels(kind).observe(len(items))
+                    if self._handlers[kind][1] is not None:
+                        unsynced.add(kind)
+                else:
+                    failed = attempts.get(kind, 0) + 1
+                    if failed < self.max_attempts and not stop:
+                        held[kind] = [items, failed, time.monotonic() + self._backoff(failed)]
+                        continue
+                    self._drop(kind, items)
+                # Readers draining this kind need not wait for the rest of the batch
+                with self._applied_changed:
+                    self._applied[kind] += len(items)
+                    self._applied_changed.notify_all()
+                finished = True
+            if unsynced and (stop or time.monotonic() - last_sync >= self.fsync_interval):
+                self._sync(unsynced)
+                unsynced.clear()
+                last_sync = time.monotonic()
+
+            with self._lock:
+                self._counters["batches"] += finished
+            if stop:
+                return
+
+    def drain(self, timeout=None, kinds=None) -> bool:
+        """Wait until every write submitted so far has been applied or dropped; False on timeout
+
+        kinds limits the wait to writes of those kinds, e.g. ("summary",) for a reader of the
+        summary store, so it does not also wait for queued log lines.
+        """
+        if self._pid != os.getpid() or threading.current_thread() is self._thread:
+            return True
+        with self._applied_changed:
+            targets = {kind: self._submitted[kind] for kind in (self._submitted if kinds is None else kinds)}
+            return self._applied_changed.wait_for(
+                lambda: all(self._applied[kind] >= target for kind, target in targets.items()), timeout)
+
+    def close(self, timeout=30.0):
+        """Apply and sync everything queued, then stop the writer; later writes are applied inline"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            running = self._pid == os.getpid() and self._thread.is_alive()
+        if running:
+            self._queue.put((_STOP, None))
+            self._thread.join(timeout)
+        else:
+            self._sync([kind for kind, (_, sync) in self._handlers.items() if sync is not None])
+
+    def stats(self):
+        with self._lock:
+            running = self._pid == os.getpid()
+            return dict(
+                self._counters,
+                stall_seconds=round(self._counters["stall_seconds"], 3),
+                enabled=self.enabled,
+                pending=self._queue.qsize() if running else 0,
+                max_pending=self.max_pending,
+                applied=sum(self._applied.values()) if running else 0,
+            )
+
+
+class LogFile:
+    """Append-only text file written a batch of lines at a time, rotated past rotation_bytes"""
+
+    def __init__(self, path, rotation_bytes=500 * 2 ** 20):
+        self.path = path
+        self.rotation_bytes = rotation_bytes
+        self._file = None
+        self._size = 0
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        root, extension = os.path.splitext(self.path)
+        os.replace(self.path, f"{root}.{time.strftime('%Y-%m-%d_%H-%M-%S')}{extension}")
+        self._open()
+
+    def write_batch(self, lines):
+        if self._file is None:
+            self._open()
+        data = "".join(lines)
+        if self._size and self._size + len(data) > self.rotation_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        # Characters rather than bytes; close enough for rotation
+        self._size += len(data)
+
+    def sync(self):
+        if self._file is not None:
+            os.fsync(self._file.fileno())
@@ -3,12 +3,18 @@ import sys
 import requests
 import re
 import json
+import argparse
+import atexit
+import contextvars
+import hmac
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify, render_template, make_response
+from flask import Flask, request, jsonify, render_template, make_response, Response, stream_with_context, g
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from werkzeug.exceptions import HTTPException
 from loguru import logger
 
 # Import version information
@@ -23,58 +29,414 @@ except ImportError:
         # Fallback for Vercel environment
         VERSION = "0.4"
 
+try:
+    from src.cache import LRUCache, DiskCache, TieredCache, content_hash
+except ImportError:
+    from cache import LRUCache, DiskCache, TieredCache, content_hash
+
+try:
+    from src.chunking import chunk_segments, estimate_tokens
+except ImportError:
+    from chunking import chunk_segments, estimate_tokens
+
+try:
+    from src.video_ids import canonical_url, extract_video_id, extract_video_ids
+except ImportError:
+    from video_ids import canonical_url, extract_video_id, extract_video_ids
+
+try:
+    from src.transcript import Transcript, joined_text
+except ImportError:
+    from transcript import Transcript, joined_text
+
+try:
+    from src.preprocess import Preprocessor
+except ImportError:
+    from preprocess import Preprocessor
+
+try:
+    from src.tokens import TokenCounter, TokenBudgetError, plan_summary
+except ImportError:
+    from tokens import TokenCounter, TokenBudgetError, plan_summary
+
+try:
+    from src.upstream import UpstreamClient, CircuitBreaker, RateLimiter
+except ImportError:
+    from upstream import UpstreamClient, CircuitBreaker, RateLimiter
+
+try:
+    from src.cassettes import Cassette
+except ImportError:
+    from cassettes import Cassette
+
+try:
+    from src.providers import Provider, ProviderPool
+except ImportError:
+    from providers import Provider, ProviderPool
+
+try:
+    from src.jobs import JobQueue, make_job_store
+except ImportError:
+    from jobs import JobQueue, make_job_store
+
+try:
+    from src.progress import ProgressRegistry
+except ImportError:
+    from progress import ProgressRegistry
+
+try:
+    from src.batch import BatchRunner, read_urls
+except ImportError:
+    from batch import BatchRunner, read_urls
+
+try:
+    from src.history import HistoryStore
+except ImportError:
+    from history import HistoryStore
+
+try:
+    from src.summary_store import SummaryStore, decode_body, summary_etag
+except ImportError:
+    from summary_store import SummaryStore, decode_body, summary_etag
+
+try:
+    from src.near_duplicates import NearDuplicateIndex
+except ImportError:
+    from near_duplicates import NearDuplicateIndex
+
+try:
+    from src.http_cache import Precompressed, etag_matches, strong_etag
+except ImportError:
+    from http_cache import Precompressed, etag_matches, strong_etag
+
+try:
+    from src.singleflight import SingleFlight, LeaseLock
+except ImportError:
+    from singleflight import SingleFlight, LeaseLock
+
+try:
+    from src.quotas import KeyQuota, QuotaExceededError, make_bucket_store
+except ImportError:
+    from quotas import KeyQuota, QuotaExceededError, make_bucket_store
+
+try:
+    from src.write_behind import LogFile, WriteBehind
+except ImportError:
+    from write_behind import LogFile, WriteBehind
+
+try:
+    from src import metrics
+    from src.metrics import span
+except ImportError:
+    import metrics
+    from metrics import span
+
 load_dotenv()
 
-# Configure logger
+# Log lines, history entries and stored summaries are queued and written in batches by a
+# background thread, off the request path; 0 writes them on the request thread
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "1").lower() not in ("0", "false", "no")
+
+# Queued writes beyond which requests wait for the writer to catch up
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+
+# Seconds between fsyncs of the log file
+WRITE_BEHIND_FSYNC_INTERVAL = float(os.getenv("WRITE_BEHIND_FSYNC_INTERVAL", "1"))
+
+# Attempts at a failed batch of writes before it is dropped, and the delay before the first
+# retry, doubling after each one
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "5"))
+WRITE_BEHIND_RETRY_DELAY = float(os.getenv("WRITE_BEHIND_RETRY_DELAY", "0.2"))
+
+write_behind = WriteBehind(max_pending=WRITE_BEHIND_MAX_PENDING, fsync_interval=WRITE_BEHIND_FSYNC_INTERVAL,
+                           enabled=WRITE_BEHIND, max_attempts=WRITE_BEHIND_MAX_ATTEMPTS,
+                           retry_delay=WRITE_BEHIND_RETRY_DELAY)
+# Everything still queued is written before the process exits
+atexit.register(write_behind.close)
+
+# Configure logger; every line carries the ID of the request (or job) it belongs to
+LOG_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "{extra[request_id]} | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
+    "<level>{message}</level>"
+)
 logger.remove()
+logger.configure(extra={"request_id": "-"}, patcher=metrics.add_request_id)
 try:
-    log_file = "/tmp/app.log" if os.environ.get('VERCEL_ENV') else "app.log"
-    logger.add(log_file, rotation="500 MB", level="INFO", catch=True)
+    log_file = LogFile("/tmp/app.log" if os.environ.get('VERCEL_ENV') else "app.log", rotation_bytes=500 * 2 ** 20)
+    write_behind.register("log", log_file.write_batch, log_file.sync)
+    logger.add(write_behind.sink("log"), level="INFO", catch=True, format=LOG_FORMAT)
 except Exception as e:
     # If file logging fails, just log to stderr
     pass
-logger.add(sys.stderr, level="WARNING")
+logger.add(sys.stderr, level="WARNING", format=LOG_FORMAT)
+
+# Log a line per pipeline stage (span) with its duration; stage histograms on /metrics are always on
+TRACE_SPANS = os.getenv("TRACE_SPANS", "").lower() in ("1", "true", "yes")
+metrics.enable_tracing(TRACE_SPANS)
+
+# Summary history database - use /tmp for Vercel
+HISTORY_DB = os.getenv("HISTORY_DB") or ("/tmp/summary_history.db" if os.environ.get('VERCEL_ENV') else "summary_history.db")
 
-# File to store summary history - use /tmp for Vercel
+# Legacy JSON history file, migrated into HISTORY_DB on first use
 HISTORY_FILE = "/tmp/summary_history.json" if os.environ.get('VERCEL_ENV') else "summary_history.json"
 
-def extract_video_id(url: str) -> str:
-    """Extract YouTube video ID from URL"""
-    # Regular expressions to match various YouTube URL formats
-    patterns = [
-        r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/|youtube\.com\/v\/|youtube\.com\/.*?[?&]v=)([\w-]{11})',  # Standard and shortened URLs
-        r'youtube\.com\/embed\/([\w-]{11})',                      # Embed URLs
-        r'youtube\.com\/v\/([\w-]{11})',                          # Old embed URLs
-        r'youtube\.com\/user\/\w+\/\w+\/([\w-]{11})',           # User URLs
-        r'youtube\.com\/\w+\/\w+\/([\w-]{11})'                    # Other formats
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    
-    # If the input is already just a video ID, return it
-    if re.match(r'^[\w-]{11}$', url):
-        return url
-        
-    raise ValueError("Could not extract YouTube video ID from URL. Please provide a valid YouTube URL.")
+# Directory for summary files and the persistent cache - use /tmp for Vercel
+OUTPUT_DIR = os.getenv("OUTPUT_DIR") or ("/tmp/output" if os.environ.get('VERCEL_ENV') else "output")
 
-def get_transcript(video_id: str, api_key: str = None) -> str:
-    """Fetch YouTube transcript using SearchAPI.io"""
+# Summary database; <video_id>_summary.md files left in OUTPUT_DIR by older versions are imported once
+SUMMARY_DB = os.getenv("SUMMARY_DB") or os.path.join(OUTPUT_DIR, "summaries.db")
+SUMMARY_COMPRESSION = os.getenv("SUMMARY_COMPRESSION", "1").lower() in ("1", "true", "yes")
+# Reuse the stored summary of another video whose transcript is at least this similar (estimated
+# Jaccard similarity of word 5-grams), e.g. a re-upload or mirror; 0 disables the lookup
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.85))
+# Seconds between reloads of fingerprints that other workers added to SUMMARY_DB
+NEAR_DUPLICATE_REFRESH_INTERVAL = float(os.getenv("NEAR_DUPLICATE_REFRESH_INTERVAL", 5))
+
+# Summary generation settings; these also form part of the summary cache key
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "deepseek-chat")
+SUMMARY_TEMPERATURE = float(os.getenv("SUMMARY_TEMPERATURE", 0.7))
+SUMMARY_PROMPT = "Convert this transcript into a numbered list format (1., 2., 3., etc.):\n{text}"
+
+# Long transcripts are summarized chunk by chunk (map) and the partial lists merged (reduce)
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 6000))
+SUMMARY_PARALLELISM = int(os.getenv("SUMMARY_PARALLELISM", 4))
+# "auto" grows chunks so one round of SUMMARY_PARALLELISM calls covers the transcript; "fixed"
+# always uses SUMMARY_CHUNK_TOKENS
+SUMMARY_CHUNK_STRATEGY = os.getenv("SUMMARY_CHUNK_STRATEGY", "auto")
+CHUNK_PROMPT = "Convert this part of a transcript into a numbered list format (1., 2., 3., etc.):\n{text}"
+REDUCE_PROMPT = (
+    "The following numbered lists summarize consecutive parts of one transcript. "
+    "Merge them into a single numbered list format (1., 2., 3., etc.), keeping the original order "
+    "and removing duplicate points:\n{text}"
+)
+
+# Timestamped summaries: the transcript is marked with [m:ss] every TIMESTAMP_INTERVAL
+# seconds and each summary point ends with the marker where it is discussed
+TIMESTAMP_INTERVAL = int(os.getenv("TIMESTAMP_INTERVAL", 30))
+TIMESTAMP_NOTE = (
+    "The transcript contains [m:ss] time markers. End each point with the marker closest to "
+    "where it is discussed, like \"3. ... [12:40]\""
+)
+TIMESTAMP_SUMMARY_PROMPT = (
+    "Convert this transcript into a numbered list format (1., 2., 3., etc.). " + TIMESTAMP_NOTE + ":\n{text}"
+)
+TIMESTAMP_CHUNK_PROMPT = (
+    "Convert this part of a transcript into a numbered list format (1., 2., 3., etc.). "
+    + TIMESTAMP_NOTE + ":\n{text}"
+)
+TIMESTAMP_REDUCE_PROMPT = (
+    "The following numbered lists summarize consecutive parts of one transcript. "
+    "Merge them into a single numbered list format (1., 2., 3., etc.), keeping the original order, "
+    "removing duplicate points and keeping the [m:ss] marker at the end of each point:\n{text}"
+)
+
+# (summary, chunk, reduce) prompts for plain and timestamped summaries
+PROMPTS = (SUMMARY_PROMPT, CHUNK_PROMPT, REDUCE_PROMPT)
+TIMESTAMP_PROMPTS = (TIMESTAMP_SUMMARY_PROMPT, TIMESTAMP_CHUNK_PROMPT, TIMESTAMP_REDUCE_PROMPT)
+
+# Transcript clean-up before summarization: comma-separated stages (noise, fillers, dedupe,
+# punctuation; empty for none) and an optional token budget for extractive compression
+TRANSCRIPT_PREPROCESS = os.getenv("TRANSCRIPT_PREPROCESS", "noise,fillers,dedupe,punctuation")
+PREPROCESS_TOKEN_BUDGET = int(os.getenv("PREPROCESS_TOKEN_BUDGET", 0))
+preprocessor = Preprocessor([stage.strip() for stage in TRANSCRIPT_PREPROCESS.split(",") if stage.strip()],
+                            token_budget=PREPROCESS_TOKEN_BUDGET)
+
+# Prompt tokens are counted locally before each Deepseek call. TOKENIZER is auto (tiktoken if
+# installed), tiktoken or approximate (pure Python, works offline).
+TOKENIZER = os.getenv("TOKENIZER", "auto")
+token_counter = TokenCounter(TOKENIZER)
+# Model context window and the share of it kept free for the generated summary
+MODEL_CONTEXT_TOKENS = int(os.getenv("MODEL_CONTEXT_TOKENS", 64000))
+MODEL_OUTPUT_TOKENS = int(os.getenv("MODEL_OUTPUT_TOKENS", 4096))
+# Prompt tokens one summary may send over all its calls (0 = unlimited). Larger transcripts
+# are rejected, or with OVERSIZE_POLICY=compress cut down to their most topical passages.
+MAX_REQUEST_TOKENS = int(os.getenv("MAX_REQUEST_TOKENS", 0))
+OVERSIZE_POLICY = os.getenv("OVERSIZE_POLICY", "reject")
+
+# Changes whenever any prompt is edited; recorded in history with the model and temperature
+PROMPT_VERSION = content_hash(*PROMPTS, *TIMESTAMP_PROMPTS)[:12]
+
+# Upstream API settings
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", 20))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 5))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", 120))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", 3))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", 30))
+
+# Storage for the request rate limits and the per-API-key outbound quotas. memory:// is per
+# process; use sqlite:///path to share it between workers or redis://host:port/db between hosts.
+RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+# token-bucket (from quotas.py), fixed-window, moving-window or sliding-window-counter
+RATELIMIT_STRATEGY = os.getenv("RATELIMIT_STRATEGY", "token-bucket")
+
+# Outbound quotas per upstream API key, e.g. "100 per hour" (empty = unlimited)
+SEARCHAPI_KEY_QUOTA = os.getenv("SEARCHAPI_KEY_QUOTA", "")
+DEEPSEEK_KEY_QUOTA = os.getenv("DEEPSEEK_KEY_QUOTA", "")
+# Prompt tokens per Deepseek key, e.g. "2000000 per day", charged with the local count before each call
+DEEPSEEK_KEY_TOKEN_QUOTA = os.getenv("DEEPSEEK_KEY_TOKEN_QUOTA", "")
+QUOTA_MAX_WAIT = float(os.getenv("QUOTA_MAX_WAIT", 10))
+
+def _bucket_store():
+    try:
+        return make_bucket_store(RATELIMIT_STORAGE_URI)
+    except Exception as e:
+        logger.error(f"Error opening quota storage {RATELIMIT_STORAGE_URI}, using memory: {str(e)}")
+        return make_bucket_store("memory://")
+
+quota_store = _bucket_store() if SEARCHAPI_KEY_QUOTA or DEEPSEEK_KEY_QUOTA or DEEPSEEK_KEY_TOKEN_QUOTA else None
+
+def _key_quota(name, limit):
+    return KeyQuota(name, quota_store, limit, max_wait=QUOTA_MAX_WAIT) if limit else None
+
+def _upstream_client(name, base_url, rate_limit, quota=None):
+    return UpstreamClient(
+        name,
+        base_url,
+        pool_size=UPSTREAM_POOL_SIZE,
+        connect_timeout=UPSTREAM_CONNECT_TIMEOUT,
+        read_timeout=UPSTREAM_READ_TIMEOUT,
+        max_retries=UPSTREAM_MAX_RETRIES,
+        breaker=CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT),
+        rate_limit=rate_limit or None,
+        quota=quota
+    )
+
+# Optional outbound request rates (requests per second, 0 = unlimited)
+searchapi_client = _upstream_client("searchapi", os.getenv("SEARCHAPI_BASE_URL", "https://www.searchapi.io"),
+                                    float(os.getenv("SEARCHAPI_RATE_LIMIT", 0)),
+                                    _key_quota("searchapi", SEARCHAPI_KEY_QUOTA))
+deepseek_client = _upstream_client("deepseek", os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"),
+                                   float(os.getenv("DEEPSEEK_RATE_LIMIT", 0)),
+                                   _key_quota("deepseek", DEEPSEEK_KEY_QUOTA))
+deepseek_token_quota = _key_quota("deepseek-tokens", DEEPSEEK_KEY_TOKEN_QUOTA)
+
+# Backup OpenAI-compatible providers, tried in order after Deepseek: a JSON list of
+# {"name", "base_url", "model", "api_key" or "api_key_env", "path"}. Backups never see the
+# caller's Deepseek key; one without a key sends no Authorization header (e.g. a local server)
+LLM_BACKUP_PROVIDERS = os.getenv("LLM_BACKUP_PROVIDERS", "")
+# Send the request to the next provider when the current one has not answered (or, streaming,
+# sent its first token) within this quantile of its recent latencies
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", 0.95))
+# Hedge delay (seconds) until enough latencies have been seen
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 30))
+# Largest fraction of calls that may be hedged (0 = failover only)
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", 0.1))
+
+def _llm_providers():
+    providers = [Provider("deepseek", deepseek_client, SUMMARY_MODEL)]
+    try:
+        backups = json.loads(LLM_BACKUP_PROVIDERS) if LLM_BACKUP_PROVIDERS.strip() else []
+    except json.JSONDecodeError as e:
+        raise ValueError(f"LLM_BACKUP_PROVIDERS is not valid JSON: {str(e)}")
+    for backup in backups:
+        api_key = backup.get("api_key") or os.getenv(backup.get("api_key_env", ""), "")
+        client = _upstream_client(backup["name"], backup["base_url"], float(backup.get("rate_limit", 0)))
+        providers.append(Provider(backup["name"], client, backup.get("model", SUMMARY_MODEL), api_key=api_key,
+                                  path=backup.get("path", "/v1/chat/completions")))
+    return providers
+
+llm_pool = ProviderPool(_llm_providers(), hedge_quantile=LLM_HEDGE_QUANTILE,
+                        hedge_default_delay=LLM_HEDGE_DEFAULT_DELAY, hedge_budget=LLM_HEDGE_BUDGET)
+
+# Record every upstream call to a cassette file, or replay them from one without any network
+# (see src/cassettes.py). Replay speed 1 keeps the recorded timing, 2 halves it, 0 removes it
+UPSTREAM_CASSETTE = os.getenv("UPSTREAM_CASSETTE", "")
+UPSTREAM_CASSETTE_MODE = os.getenv("UPSTREAM_CASSETTE_MODE", "replay")
+UPSTREAM_REPLAY_SPEED = float(os.getenv("UPSTREAM_REPLAY_SPEED", 1))
+
+cassette = None
+if UPSTREAM_CASSETTE:
+    cassette = Cassette(UPSTREAM_CASSETTE, UPSTREAM_CASSETTE_MODE, UPSTREAM_REPLAY_SPEED)
+    for _client in [searchapi_client] + [provider.client for provider in llm_pool.providers]:
+        _client.mount(cassette.adapter(_client))
+    logger.info(f"Upstream traffic is {'recorded to' if cassette.mode == 'record' else 'replayed from'} "
+                f"cassette {UPSTREAM_CASSETTE}")
+
+# Background job settings
+JOB_STORE_URI = os.getenv("JOB_STORE_URI", f"sqlite:///{os.path.join(OUTPUT_DIR, 'jobs.db')}")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+
+# Batch settings; batches run on the caller's API keys and each URL counts against BATCH_RATE_LIMIT
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", 50))
+BATCH_RATE_LIMIT = os.getenv("BATCH_RATE_LIMIT", "100 per hour")
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 8))
+BATCH_DIR = os.path.join(OUTPUT_DIR, "batches")
+
+# Bearer token for /admin endpoints; they are disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# HTTP caching: max-age (seconds) for the web interface and for stored summaries
+INDEX_MAX_AGE = int(os.getenv("INDEX_MAX_AGE", 300))
+SUMMARY_MAX_AGE = int(os.getenv("SUMMARY_MAX_AGE", 60))
+# Cache-Control per endpoint; responses of endpoints not listed here are never stored
+CACHE_POLICIES = {
+    'index': f'public, max-age={INDEX_MAX_AGE}',
+    'get_summary': f'public, max-age={SUMMARY_MAX_AGE}, stale-while-revalidate={SUMMARY_MAX_AGE * 10}',
+    'get_history': 'private, no-cache',
+}
+
+# Request IDs a caller may choose (X-Request-ID header or request_id in the body); others are replaced
+REQUEST_ID_RE = re.compile(r'[\w.-]{1,64}')
+
+# Progress entries for finished requests are dropped after this many seconds
+PROGRESS_TTL = int(os.getenv("PROGRESS_TTL", 600))
+# Entries of requests that never finished are dropped this many seconds after their last update
+PROGRESS_IDLE_TTL = int(os.getenv("PROGRESS_IDLE_TTL", 3600))
+# A progress stream ends after this many seconds without an update
+PROGRESS_STREAM_IDLE_TIMEOUT = float(os.getenv("PROGRESS_STREAM_IDLE_TIMEOUT", 300))
+# Seconds a stream opened for an ID waits for the request to register it before answering 404
+PROGRESS_STREAM_GRACE = float(os.getenv("PROGRESS_STREAM_GRACE", 2))
+progress_registry = ProgressRegistry(ttl=PROGRESS_TTL, idle_ttl=PROGRESS_IDLE_TTL)
+
+# Cache settings
+CACHE_TTL = int(os.getenv("CACHE_TTL", 7 * 24 * 3600))
+CACHE_MEMORY_ENTRIES = int(os.getenv("CACHE_MEMORY_ENTRIES", 256))
+CACHE_DISK_MAX_BYTES = int(os.getenv("CACHE_DISK_MAX_MB", 512)) * 1024 * 1024
+CACHE_DIR = os.path.join(OUTPUT_DIR, "cache")
+
+transcript_cache = TieredCache(
+    "transcripts",
+    LRUCache(CACHE_MEMORY_ENTRIES, ttl=CACHE_TTL),
+    # Transcripts are stored in their binary format; older JSON entries fail to load and are refetched
+    DiskCache(os.path.join(CACHE_DIR, "transcripts"), ttl=CACHE_TTL, max_bytes=CACHE_DISK_MAX_BYTES,
+              dumps=Transcript.to_bytes, loads=Transcript.from_bytes)
+)
+summary_cache = TieredCache(
+    "summaries",
+    LRUCache(CACHE_MEMORY_ENTRIES, ttl=CACHE_TTL),
+    DiskCache(os.path.join(CACHE_DIR, "summaries"), ttl=CACHE_TTL, max_bytes=CACHE_DISK_MAX_BYTES)
+)
+
+# Concurrent requests for the same transcript or summary share one upstream call. The lease
+# database extends this across worker processes on the host; set SINGLEFLIGHT_DB="" to disable.
+SINGLEFLIGHT_DB = os.getenv("SINGLEFLIGHT_DB", os.path.join(OUTPUT_DIR, "singleflight.db"))
+SINGLEFLIGHT_LEASE = float(os.getenv("SINGLEFLIGHT_LEASE", 300))
+SINGLEFLIGHT_POLL = float(os.getenv("SINGLEFLIGHT_POLL", 0.5))
+
+# The lease database is opened on first use; errors then are logged and the call runs uncoalesced
+lease_lock = LeaseLock(SINGLEFLIGHT_DB) if SINGLEFLIGHT_DB else None
+transcript_flight = SingleFlight("transcripts", lease_lock, SINGLEFLIGHT_LEASE, SINGLEFLIGHT_POLL)
+summary_flight = SingleFlight("summaries", lease_lock, SINGLEFLIGHT_LEASE, SINGLEFLIGHT_POLL)
+
+@span("fetch_transcript")
+def get_transcript_segments(video_id: str, api_key: str = None) -> Transcript:
+    """Fetch YouTube transcript segments, with their timings, using SearchAPI.io"""
     # Use provided API key if available, otherwise use environment variable
     searchapi_key = api_key or os.getenv("SEARCHAPI_KEY")
     
     if not searchapi_key:
         raise ValueError("SearchAPI.io API key is required. Please provide it in the form or set it in the .env file.")
         
-    response = requests.get(
-        "https://www.searchapi.io/api/v1/search",
+    response = searchapi_client.get(
+        "/api/v1/search",
         params={
             "engine": "youtube_transcripts",
             "video_id": video_id,
             "api_key": searchapi_key
-        }
+        },
+        quota_key=searchapi_key
     )
     response.raise_for_status()
     response_data = response.json()
@@ -83,51 +445,419 @@ def get_transcript(video_id: str, api_key: str = None) -> str:
     if "transcripts" not in response_data or not response_data["transcripts"]:
         raise ValueError(f"No transcripts available for video ID: {video_id}. The video might not have captions or subtitles.")
         
-    return " ".join([entry["text"] for entry in response_data["transcripts"]])
+    return Transcript.from_segments(response_data["transcripts"], video_id)
 
-def summarize_text(text: str, api_key: str = None) -> str:
-    """Generate summary using Deepseek API"""
+def get_transcript(video_id: str, api_key: str = None) -> str:
+    """Fetch YouTube transcript using SearchAPI.io"""
+    return get_transcript_segments(video_id, api_key).text
+
+def raise_deepseek_error(error_text: str):
+    """Raise a ValueError with the message from a Deepseek error body, if it has one"""
+    logger.error(f"Deepseek API error response: {error_text}")
+    
+    # Parse the error response to extract more specific error messages
+    try:
+        error_json = json.loads(error_text)
+        if "error" in error_json and "message" in error_json["error"]:
+            error_message = error_json["error"]["message"]
+            if "Authentication Fails" in error_message:
+                raise ValueError(f"Deepseek API authentication failed: {error_message}. Please check your API key.")
+            else:
+                raise ValueError(f"Deepseek API error: {error_message}")
+    except json.JSONDecodeError:
+        pass
+
+def build_summary_payload(text: str, prompt: str, stream: bool = False) -> dict:
+    """Chat-completions request body for one summarization call"""
+    payload = {
+        "model": SUMMARY_MODEL,
+        "messages": [{
+            "role": "user",
+            "content": prompt.format(text=text)
+        }],
+        "temperature": SUMMARY_TEMPERATURE
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+def count_prompt_tokens(payload: dict) -> int:
+    """Prompt tokens of a chat-completions request, refusing ones the model cannot take"""
+    tokens = sum(token_counter.count(message["content"]) for message in payload["messages"])
+    limit = MODEL_CONTEXT_TOKENS - MODEL_OUTPUT_TOKENS
+    if tokens > limit:
+        raise TokenBudgetError(
+            f"Prompt of about {tokens} tokens is over the {limit} tokens {SUMMARY_MODEL} can take "
+            f"while leaving {MODEL_OUTPUT_TOKENS} for the summary", tokens, limit
+        )
+    return tokens
+
+def _deepseek_request(text: str, api_key: str, prompt: str, stream: bool = False):
+    """POST a chat completion through the provider pool, turning API errors into readable ValueErrors
+
+    Returns (response, locally counted prompt tokens). A streaming response is returned once
+    it has produced its first content delta, as (first delta or None, rest of the deltas,
+    response); see stream_summary_text.
+    """
     # Use provided API key if available, otherwise use environment variable
     deepseek_key = api_key or os.getenv("DEEPSEEK_KEY")
     
     if not deepseek_key:
         raise ValueError("Deepseek API key is required. Please provide it in the form or set it in the .env file.")
+    
+    payload = build_summary_payload(text, prompt, stream)
+    prompt_tokens = count_prompt_tokens(payload)
+    if deepseek_token_quota is not None:
+        deepseek_token_quota.acquire(deepseek_key, cost=prompt_tokens)
         
-    try:
-        response = requests.post(
-            "https://api.deepseek.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {deepseek_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "deepseek-chat",
-                "messages": [{
-                    "role": "user",
-                    "content": f"Convert this transcript into a numbered list format (1., 2., 3., etc.):\n{text}"
-                }],
-                "temperature": 0.7
-            }
-        )
+    def attempt(provider):
+        headers, provider_payload = provider.request_args(payload, deepseek_key)
+        response = provider.client.post(provider.path, headers=headers, json=provider_payload,
+                                        stream=stream, quota_key=deepseek_key)
         response.raise_for_status()
+        if not stream:
+            return response
+        deltas = _stream_deltas(response, prompt_tokens)
+        return next(deltas, None), deltas, response
+
+    try:
+        if stream:
+            result = llm_pool.call(attempt, kind="first_token", discard=lambda result: result[2].close())
+        else:
+            result = llm_pool.call(attempt, discard=lambda response: response.close())
     except requests.HTTPError as e:
-        error_text = e.response.text
-        print(f"API Error Details: {error_text}")  # Show error details
-        
-        # Parse the error response to extract more specific error messages
-        try:
-            error_json = json.loads(error_text)
-            if "error" in error_json and "message" in error_json["error"]:
-                error_message = error_json["error"]["message"]
-                if "Authentication Fails" in error_message:
-                    raise ValueError(f"Deepseek API authentication failed: {error_message}. Please check your API key.")
-                else:
-                    raise ValueError(f"Deepseek API error: {error_message}")
-        except json.JSONDecodeError:
-            pass
-            
+        raise_deepseek_error(e.response.text)
         raise
-    return response.json()["choices"][0]["message"]["content"]
+    return result, prompt_tokens
+
+def record_token_usage(usage, estimated_prompt_tokens=None):
+    """Count the prompt and completion tokens Deepseek reports for one call
+
+    With the local estimate for the call, also record how far off the estimate was.
+    """
+    if not usage:
+        return
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    metrics.LLM_TOKENS.labels("prompt").inc(prompt_tokens)
+    metrics.LLM_TOKENS.labels("completion").inc(usage.get("completion_tokens", 0))
+    if estimated_prompt_tokens:
+        metrics.LLM_TOKENS.labels("estimated_prompt").inc(estimated_prompt_tokens)
+        if prompt_tokens:
+            metrics.TOKEN_ESTIMATE_RATIO.observe(prompt_tokens / estimated_prompt_tokens)
+
+@span("summarize_text")
+def summarize_text(text: str, api_key: str = None, prompt: str = SUMMARY_PROMPT) -> str:
+    """Generate summary using Deepseek API"""
+    response, prompt_tokens = _deepseek_request(text, api_key, prompt)
+    data = response.json()
+    record_token_usage(data.get("usage"), prompt_tokens)
+    return data["choices"][0]["message"]["content"]
+
+def _stream_deltas(response, prompt_tokens):
+    """Content deltas of a streaming chat completion"""
+    for line in response.iter_lines():
+        # Event streams usually arrive without a charset, so decode explicitly
+        line = line.decode("utf-8") if isinstance(line, bytes) else line
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        event = json.loads(data)
+        # The last event carries the usage for the whole call
+        record_token_usage(event.get("usage"), prompt_tokens)
+        delta = event["choices"][0].get("delta", {}).get("content") if event.get("choices") else None
+        if delta:
+            yield delta
+
+def stream_summary_text(text: str, api_key: str = None, prompt: str = SUMMARY_PROMPT):
+    """Generate summary using Deepseek API, yielding content deltas as they arrive"""
+    (first, deltas, response), _ = _deepseek_request(text, api_key, prompt, stream=True)
+    try:
+        if first is not None:
+            yield first
+            yield from deltas
+    finally:
+        response.close()
+
+def flight_key(key: str, refresh: bool, api_key: str = None) -> str:
+    """Coalescing key for a call made with api_key (None for the server's key)
+
+    Only calls made with the same key share a result, so a caller never pays for another
+    caller's request or inherits its authentication or quota errors.
+    """
+    return f"{key}:{int(refresh)}:{content_hash(api_key or '')[:16]}"
+
+def get_transcript_cached(video_id: str, api_key: str = None, refresh: bool = False,
+                          stale_ok: bool = False) -> Transcript:
+    """Fetch transcript segments, serving repeat requests for the same video from cache
+
+    stale_ok also accepts a cached transcript past CACHE_TTL rather than paying to fetch it again.
+    """
+    if not refresh:
+        transcript = transcript_cache.get(video_id, stale_ok=stale_ok)
+        if transcript is not None:
+            logger.info(f"Transcript cache hit for video ID: {video_id}")
+            return transcript
+
+    def fetch():
+        transcript = get_transcript_segments(video_id, api_key)
+        try:
+            transcript_cache.set(video_id, transcript)
+        except Exception as e:
+            logger.error(f"Error caching transcript: {str(e)}")
+        return transcript
+
+    # A refresh must not be satisfied by the cached copy it is meant to replace,
+    # so it only coalesces with other refreshes in this process
+    return transcript_flight.do(
+        flight_key(video_id, refresh, api_key),
+        fetch,
+        lookup=None if refresh else lambda: transcript_cache.peek(video_id)
+    )
+
+def summarize_text_cached(text: str, api_key: str = None, refresh: bool = False,
+                          prompt: str = SUMMARY_PROMPT) -> str:
+    """Generate a summary, keyed by transcript hash, model and prompt"""
+    key = content_hash(text, SUMMARY_MODEL, prompt, SUMMARY_TEMPERATURE)
+    if not refresh:
+        summary = summary_cache.get(key)
+        if summary is not None:
+            logger.info("Summary cache hit")
+            return summary
+
+    def generate():
+        summary = summarize_text(text, api_key, prompt=prompt)
+        try:
+            summary_cache.set(key, summary)
+        except Exception as e:
+            logger.error(f"Error caching summary: {str(e)}")
+        return summary
+
+    return summary_flight.do(
+        flight_key(key, refresh, api_key),
+        generate,
+        lookup=None if refresh else lambda: summary_cache.peek(key)
+    )
+
+@span("preprocess")
+def preprocess_transcript(transcript):
+    """Clean a Transcript with the configured preprocessor, logging how many tokens it saved"""
+    if not preprocessor.stages and not preprocessor.token_budget:
+        return transcript
+    cleaned, report = preprocessor(transcript)
+    if not report["tokens_before"] or not len(cleaned):
+        return transcript
+    ratio = report["tokens_after"] / report["tokens_before"]
+    metrics.PREPROCESS_RATIO.observe(ratio)
+    logger.info(f"Preprocessed transcript {transcript.video_id}: {report['tokens_before']} -> "
+                f"{report['tokens_after']} tokens ({ratio:.0%} of the original), "
+                f"{report['segments_before']} -> {report['segments_after']} segments")
+    return cleaned
+
+def summary_prompts(segments, timestamps: bool = False):
+    """Return (segments, (summary, chunk, reduce) prompts) for a plain or timestamped summary
+
+    Timestamps need segment timings, so transcripts without them get a plain summary.
+    """
+    if timestamps and isinstance(segments, Transcript) and segments.has_timings:
+        return segments.timestamped_segments(TIMESTAMP_INTERVAL), TIMESTAMP_PROMPTS
+    return segments, PROMPTS
+
+def summary_plan(segments, prompts, chunk_tokens: int, parallelism: int):
+    """Count the prompt tokens of segments locally and plan the calls for them"""
+    template_tokens = token_counter.count(prompts[0].format(text=""))
+    return plan_summary(
+        token_counter.count(joined_text(segments)),
+        chunk_tokens,
+        parallelism,
+        max_chunk_tokens=MODEL_CONTEXT_TOKENS - MODEL_OUTPUT_TOKENS - template_tokens,
+        template_tokens=template_tokens,
+        strategy=SUMMARY_CHUNK_STRATEGY
+    )
+
+@span("plan")
+def prepare_summary(segments, timestamps: bool = False, chunk_tokens: int = None, parallelism: int = None):
+    """Preprocess, measure and split a transcript before any Deepseek call
+
+    Returns (chunks, (summary, chunk, reduce) prompts, plan); one chunk means a single
+    call. A transcript over MAX_REQUEST_TOKENS raises TokenBudgetError, or with
+    OVERSIZE_POLICY=compress is cut down to its most topical passages first.
+    """
+    chunk_tokens = chunk_tokens or SUMMARY_CHUNK_TOKENS
+    parallelism = parallelism or SUMMARY_PARALLELISM
+    if isinstance(segments, Transcript):
+        segments = preprocess_transcript(segments)
+    marked, prompts = summary_prompts(segments, timestamps)
+    plan = summary_plan(marked, prompts, chunk_tokens, parallelism)
+
+    if MAX_REQUEST_TOKENS and plan.total_tokens > MAX_REQUEST_TOKENS:
+        if OVERSIZE_POLICY != "compress" or not isinstance(segments, Transcript):
+            raise TokenBudgetError(
+                f"Transcript needs about {plan.total_tokens} prompt tokens, more than the "
+                f"{MAX_REQUEST_TOKENS} allowed per request", plan.total_tokens, MAX_REQUEST_TOKENS
+            )
+        # The preprocessor budgets in estimate_tokens units; scale to them, with a margin
+        # for the difference between the two counts
+        budget = int(0.95 * MAX_REQUEST_TOKENS * estimate_tokens(joined_text(marked)) / plan.total_tokens)
+        segments = preprocessor.compress_transcript(segments, budget)
+        marked, prompts = summary_prompts(segments, timestamps)
+        before, plan = plan, summary_plan(marked, prompts, chunk_tokens, parallelism)
+        logger.info(f"Compressed transcript from about {before.total_tokens} to {plan.total_tokens} "
+                    f"prompt tokens to fit MAX_REQUEST_TOKENS={MAX_REQUEST_TOKENS}")
+        if plan.total_tokens > MAX_REQUEST_TOKENS:
+            raise TokenBudgetError(
+                f"Transcript needs about {plan.total_tokens} prompt tokens even when compressed, more "
+                f"than the {MAX_REQUEST_TOKENS} allowed per request", plan.total_tokens, MAX_REQUEST_TOKENS
+            )
+
+    logger.info(f"Summary plan: {plan.strategy}, {plan.chunks} chunk(s) of up to {plan.chunk_tokens} tokens, "
+                f"about {plan.total_tokens} prompt tokens in total ({token_counter.name})")
+    if plan.strategy == "single":
+        return [joined_text(marked)], prompts, plan
+    # chunk_segments sizes chunks with estimate_tokens; convert the plan's chunk size to those units
+    scale = estimate_tokens(joined_text(marked)) / max(1, plan.prompt_tokens)
+    return chunk_segments(marked, max(1, int(plan.chunk_tokens * scale))), prompts, plan
+
+def _prepare_final_pass(segments, api_key: str, refresh: bool,
+                        chunk_tokens: int, parallelism: int, on_progress=None, timestamps=False):
+    """Run the map phase for long transcripts and return (text, prompt) for the final call
+
+    on_progress(completed, total) is called as each chunk summary finishes.
+    """
+    chunks, (summary_prompt, chunk_prompt, reduce_prompt), _ = prepare_summary(
+        segments, timestamps, chunk_tokens, parallelism)
+    if len(chunks) <= 1:
+        return chunks[0], summary_prompt
+
+    logger.info(f"Summarizing transcript in {len(chunks)} chunks")
+    prompt = chunk_prompt
+    while True:
+        partials = [None] * len(chunks)
+        with ThreadPoolExecutor(max_workers=min(parallelism, len(chunks))) as executor:
+            # Each task runs in a copy of our context so its logs keep the request ID
+            futures = {
+                executor.submit(contextvars.copy_context().run, summarize_text_cached,
+                                chunk, api_key, refresh, prompt): index
+                for index, chunk in enumerate(chunks)
+            }
+            for completed, future in enumerate(as_completed(futures), 1):
+                partials[futures[future]] = future.result()
+                if on_progress:
+                    on_progress(completed, len(chunks))
+
+        # Merge in groups while the partial lists are still too large for one reduce call
+        merged = "\n\n".join(partials)
+        groups = chunk_segments(partials, chunk_tokens)
+        if estimate_tokens(merged) <= chunk_tokens or len(groups) >= len(partials):
+            return merged, reduce_prompt
+        chunks = groups
+        prompt = reduce_prompt
+
+@span("near_duplicate")
+def find_near_duplicate_summary(segments, timestamps=False, refresh=False):
+    """Return (fingerprint, summary of a near-duplicate video or None) for a transcript
+
+    Only summaries made with the same settings are reused, and only while the matched video's
+    stored summary is still the one its fingerprint was indexed with (a later summary with other
+    settings replaces it in the store). Timestamped summaries point at positions in one
+    particular upload, so they are never shared. The fingerprint is None when the lookup is
+    disabled or the transcript is too short to compare; pass it to index_near_duplicate once the
+    transcript has its own summary.
+    """
+    if (not NEAR_DUPLICATE_THRESHOLD or timestamps or not isinstance(segments, Transcript)
+            or not segments.video_id):
+        return None, None
+    try:
+        index = get_near_duplicate_index()
+        signature = index.fingerprint(segments.text)
+        if signature is None or refresh:
+            return signature, None
+        match = index.query(signature, json.dumps(summary_config(timestamps), sort_keys=True),
+                            NEAR_DUPLICATE_THRESHOLD, exclude=segments.video_id)
+        if match:
+            # The matched summary may still be queued for the summary store
+            write_behind.drain(kinds=("summary",))
+        stored = get_summary_store().get(match[0]) if match else None
+        if stored is not None and stored.etag != index.tag(match[0]):
+            stored = None
+    except Exception as e:
+        logger.error(f"Error looking up near-duplicate transcripts: {str(e)}")
+        return None, None
+    metrics.NEAR_DUPLICATE_LOOKUPS.labels("hit" if stored else "miss").inc()
+    if stored is None:
+        return signature, None
+    logger.info(f"Reusing the summary of {match[0]} for {segments.video_id} "
+                f"(transcripts {match[1]:.0%} similar)")
+    return signature, stored.summary
+
+def index_near_duplicate(segments, signature, summary, timestamps=False):
+    """Record the fingerprint of a transcript along with the ETag of its new summary"""
+    if signature is None:
+        return
+    try:
+        get_near_duplicate_index().add(segments.video_id, json.dumps(summary_config(timestamps), sort_keys=True),
+                                       signature, tag=summary_etag(summary))
+    except Exception as e:
+        logger.error(f"Error indexing transcript fingerprint: {str(e)}")
+
+@span("summarize")
+def summarize_transcript(segments, api_key: str = None, refresh: bool = False,
+                         chunk_tokens: int = None, parallelism: int = None, on_progress=None,
+                         timestamps: bool = False) -> str:
+    """Summarize transcript segments, using map-reduce when they exceed one chunk
+
+    Chunks are summarized concurrently, so latency depends on the longest chunk
+    rather than on the length of the whole video. With timestamps, each point
+    ends with the [m:ss] position it refers to. A video whose transcript nearly matches one
+    summarized before (a re-upload or mirror) gets that summary without any Deepseek call.
+    """
+    signature, summary = find_near_duplicate_summary(segments, timestamps, refresh)
+    if summary is not None:
+        return summary
+    text, prompt = _prepare_final_pass(segments, api_key, refresh,
+                                       chunk_tokens or SUMMARY_CHUNK_TOKENS,
+                                       parallelism or SUMMARY_PARALLELISM, on_progress, timestamps)
+    summary = summarize_text_cached(text, api_key, refresh, prompt=prompt)
+    index_near_duplicate(segments, signature, summary, timestamps)
+    return summary
+
+def stream_transcript_summary(segments, api_key: str = None, refresh: bool = False,
+                              chunk_tokens: int = None, parallelism: int = None, on_progress=None,
+                              timestamps: bool = False):
+    """Like summarize_transcript, but yields the final pass as it is generated"""
+    signature, summary = find_near_duplicate_summary(segments, timestamps, refresh)
+    if summary is not None:
+        yield summary
+        return
+    text, prompt = _prepare_final_pass(segments, api_key, refresh,
+                                       chunk_tokens or SUMMARY_CHUNK_TOKENS,
+                                       parallelism or SUMMARY_PARALLELISM, on_progress, timestamps)
+    key = content_hash(text, SUMMARY_MODEL, prompt, SUMMARY_TEMPERATURE)
+    if not refresh:
+        summary = summary_cache.get(key)
+        if summary is not None:
+            logger.info("Summary cache hit")
+            yield summary
+            return
+
+    def produce():
+        parts = []
+        for delta in stream_summary_text(text, api_key, prompt=prompt):
+            parts.append(delta)
+            yield delta
+        try:
+            summary_cache.set(key, "".join(parts))
+        except Exception as e:
+            logger.error(f"Error caching summary: {str(e)}")
+
+    # Streams for the same summary share one Deepseek stream; late joiners get every delta so far
+    parts = []
+    for delta in summary_flight.stream(f"{flight_key(key, refresh, api_key)}:stream", produce,
+                                       lookup=None if refresh else lambda: summary_cache.peek(key)):
+        parts.append(delta)
+        yield delta
+    index_near_duplicate(segments, signature, "".join(parts), timestamps)
 
 def ensure_directory_exists(path):
     """Ensure a directory exists, handling edge cases for serverless environments"""
@@ -148,41 +878,201 @@ def ensure_directory_exists(path):
         logger.error(f"Failed to create directory {path}: {str(e)}")
         return False
 
-def load_history():
-    """Load summary history from file"""
+_history_store = None
+_summary_store = None
+_near_duplicate_index = None
+
+def get_history_store():
+    """Open the history database on first use, migrating the legacy JSON file if present"""
+    global _history_store
+    if _history_store is None:
+        _history_store = HistoryStore(HISTORY_DB, legacy_json_path=HISTORY_FILE)
+    return _history_store
+
+def get_summary_store():
+    """Open the summary database on first use, importing legacy summary files if present"""
+    global _summary_store
+    if _summary_store is None:
+        _summary_store = SummaryStore(SUMMARY_DB, compress=SUMMARY_COMPRESSION, legacy_dir=OUTPUT_DIR)
+    return _summary_store
+
+def get_near_duplicate_index():
+    """Open the transcript fingerprint index on first use, loading it from the summary database
+
+    Lookups reload fingerprints other workers have added since, at most every
+    NEAR_DUPLICATE_REFRESH_INTERVAL seconds.
+    """
+    global _near_duplicate_index
+    if _near_duplicate_index is None:
+        _near_duplicate_index = NearDuplicateIndex(SUMMARY_DB, refresh_interval=NEAR_DUPLICATE_REFRESH_INTERVAL)
+    return _near_duplicate_index
+
+def load_history(**filters):
+    """Load all summary history entries, newest first"""
     try:
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, "r") as f:
-                return json.load(f)
-    except (json.JSONDecodeError, IOError, OSError) as e:
-        logger.error(f"Error loading history file: {str(e)}")
+        write_behind.drain(kinds=("history",))
+        return list(get_history_store().iter_all(**filters))
+    except Exception as e:
+        logger.error(f"Error loading history: {str(e)}")
     return []
 
-def save_to_history(video_id, url, summary):
-    """Save summary to history file"""
+def summary_config(timestamps=False):
+    """Settings a summary is generated with; a stored summary with different settings is stale"""
+    return {
+        "model": SUMMARY_MODEL,
+        "temperature": SUMMARY_TEMPERATURE,
+        "prompt_version": PROMPT_VERSION,
+        "preprocess": preprocessor.config,
+        "timestamps": bool(timestamps)
+    }
+
+@span("save_history")
+def save_to_history(video_id, url, summary, timestamps=False):
+    """Append summary to history, under the canonical URL of the video"""
     try:
-        history = load_history()
-        
-        # Create history entry
-        entry = {
-            "video_id": video_id,
-            "url": url,
-            "timestamp": datetime.now().isoformat(),
-            "summary_file": f"{video_id}_summary.md"
-        }
-        
-        # Add to history and save
-        history.append(entry)
-        
-        # Ensure directory exists before writing file
-        ensure_directory_exists(os.path.dirname(HISTORY_FILE) or '.')
-        
-        with open(HISTORY_FILE, "w") as f:
-            json.dump(history, f, indent=2)
+        get_history_store().append(
+            video_id,
+            canonical_url(video_id),
+            datetime.now().isoformat(),
+            None,  # summaries live in the summary store, served at /summary/<video_id>
+            summary_config(timestamps)
+        )
     except Exception as e:
         logger.error(f"Error saving to history: {str(e)}")
         # Continue execution even if history save fails
 
+@span("save_summary")
+def store_summary(video_id, summary):
+    """Store the latest summary of a video, returning its ETag"""
+    return get_summary_store().put(video_id, summary)
+
+@span("save_summary")
+def _write_summaries(records):
+    # A summary only replaces an older one, whatever order the batches are applied in
+    get_summary_store().import_records(records)
+
+@span("save_history")
+def _write_history(entries):
+    get_history_store().append_many(entries)
+
+write_behind.register("summary", _write_summaries)
+write_behind.register("history", _write_history)
+
+def save_summary(video_id, url, summary, timestamps=False):
+    """Queue the summary for the summary store and its history entry
+
+    Both are written by the write-behind thread; a failed write is reported there and
+    does not fail the request.
+    """
+    write_behind.submit("summary", {"video_id": video_id, "summary": summary, "updated_at": time.time()})
+    write_behind.submit("history", (video_id, canonical_url(video_id), datetime.now().isoformat(),
+                                    None, summary_config(timestamps)))
+
+def run_summary_pipeline(video_id, url, searchapi_key=None, deepseek_key=None, refresh=False,
+                         on_phase=None, progress_id=None, timestamps=False):
+    """Fetch, summarize and save one video
+
+    Each phase is passed to on_phase and, when progress_id is given, recorded in the
+    progress registry.
+    """
+    def phase(name, message, percent):
+        if on_phase:
+            on_phase(name)
+        if progress_id:
+            update_progress_status(progress_id, name, message, percent)
+    
+    phase("fetching_transcript", "Fetching transcript...", 0)
+    transcript = get_transcript_cached(video_id, searchapi_key, refresh=refresh)
+    
+    phase("generating_summary", "Generating summary...", 10)
+    summary = summarize_transcript(transcript, deepseek_key, refresh=refresh,
+                                   on_progress=chunk_progress(progress_id) if progress_id else None,
+                                   timestamps=timestamps)
+    
+    phase("saving", "Saving summary...", 95)
+    save_summary(video_id, url, summary, timestamps)
+    return summary
+
+def stale_history_entries(force=False, video_ids=None):
+    """Latest history entry of each video whose summary was made with other settings
+
+    Entries saved before settings were recorded are always stale. force returns every video.
+    """
+    write_behind.drain(kinds=("history",))
+    for entry in get_history_store().iter_videos():
+        if video_ids and entry["video_id"] not in video_ids:
+            continue
+        config = entry["summary_config"] or {}
+        if force or config != summary_config(config.get("timestamps", False)):
+            yield entry
+
+def resummarize_video(video_id, url, timestamps=False, searchapi_key=None, deepseek_key=None):
+    """Regenerate a stored summary with the current model, temperature and prompts
+
+    The transcript comes from cache even past its TTL, and chunk summaries whose prompt,
+    model and temperature are unchanged are cache hits, so only the Deepseek calls whose
+    inputs changed are made. History is updated in place rather than appended to.
+    """
+    transcript = get_transcript_cached(video_id, searchapi_key, stale_ok=True)
+    summary = summarize_transcript(transcript, deepseek_key, timestamps=timestamps)
+    store_summary(video_id, summary)
+    get_history_store().set_summary_config(video_id, summary_config(timestamps))
+    return summary
+
+def resummarize_history(concurrency=4, force=False, video_ids=None, searchapi_key=None, deepseek_key=None):
+    """Re-summarize every stale video in history, yielding one result dict per video
+
+    A video's new settings are recorded as soon as it finishes, so an interrupted run
+    resumes where it stopped: finished videos are no longer stale, failed ones still are.
+    """
+    entries = {}
+
+    def stale_video_ids():
+        for entry in stale_history_entries(force, video_ids):
+            entries[entry["video_id"]] = entry
+            yield entry["video_id"]
+
+    def process(video_id, _):
+        entry = entries[video_id]
+        timestamps = (entry["summary_config"] or {}).get("timestamps", False)
+        return resummarize_video(video_id, entry["url"], timestamps, searchapi_key, deepseek_key)
+
+    # The runner is fed video IDs, so put each entry's URL back into its result
+    runner = BatchRunner(process, lambda ids: ((video_id, video_id, None) for video_id in ids),
+                         concurrency=concurrency)
+    for result in runner.run(stale_video_ids()):
+        result["url"] = entries.pop(result["video_id"])["url"]
+        yield result
+
+def _run_job(job_id, payload, secrets, set_phase):
+    """Job runner: the pipeline with API keys taken from memory rather than the job store"""
+    metrics.set_request_id(job_id)
+    try:
+        summary = run_summary_pipeline(
+            payload["video_id"],
+            payload["url"],
+            searchapi_key=secrets.get("searchapi_key"),
+            deepseek_key=secrets.get("deepseek_key"),
+            refresh=payload.get("refresh", False),
+            on_phase=set_phase,
+            timestamps=payload.get("timestamps", False),
+            progress_id=job_id
+        )
+    except Exception as e:
+        progress_registry.finish(job_id, error=str(e))
+        raise
+    progress_registry.finish(job_id)
+    return summary
+
+_job_queue = None
+
+def get_job_queue():
+    """Create the job queue on first use so the store is only opened when jobs are used"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(make_job_store(JOB_STORE_URI), _run_job, workers=JOB_WORKERS)
+    return _job_queue
+
 # Create Flask app with correct template folder path
 try:
     template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'templates'))
@@ -192,13 +1082,14 @@ except Exception as e:
     app = Flask(__name__, template_folder='templates')
     logger.error(f"Error setting template directory: {str(e)}")
 
-# Configure rate limiting with in-memory storage for Vercel compatibility
+# Configure rate limiting; the in-memory default keeps Vercel working without extra services
 try:
     limiter = Limiter(
         key_func=get_remote_address,
         app=app,
         default_limits=["200 per day", "50 per hour"],
-        storage_uri="memory://"
+        storage_uri=RATELIMIT_STORAGE_URI,
+        strategy=RATELIMIT_STRATEGY
     )
 except Exception as e:
     # Fallback with minimal configuration
@@ -209,35 +1100,107 @@ except Exception as e:
     )
     logger.error(f"Error configuring rate limiter: {str(e)}")
 
+@app.before_request
+def start_request_metrics():
+    """Bind the request ID (X-Request-ID or a new one) to the logs and start the request timer"""
+    request_id = request.headers.get('X-Request-ID', '')
+    metrics.set_request_id(request_id if REQUEST_ID_RE.fullmatch(request_id) else None)
+    g.request_started = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.HTTP_REQUESTS.labels(request.method, endpoint, str(response.status_code)).inc()
+    if 'request_started' in g:
+        metrics.HTTP_SECONDS.labels(endpoint).observe(time.perf_counter() - g.request_started)
+    response.headers['X-Request-ID'] = metrics.get_request_id()
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if 'request_started' in g:
+        metrics.HTTP_IN_FLIGHT.dec()
+
+_index_page = None
+
 @app.route('/')
 def index():
-    return render_template('index.html', version=VERSION)
+    """The web interface, rendered and compressed once per process"""
+    global _index_page
+    if _index_page is None:
+        _index_page = Precompressed(render_template('index.html', version=VERSION).encode('utf-8'),
+                                    'text/html; charset=utf-8')
+    encoding, body, etag = _index_page.select(request.headers.get('Accept-Encoding'))
+    headers = _index_page.headers(encoding, etag, CACHE_POLICIES['index'])
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        headers.pop('Content-Encoding', None)
+        return Response(status=304, headers=headers)
+    return Response(body, headers=headers)
 
 @app.route('/health')
 def health_check():
     return jsonify({
         'status': 'healthy',
-        'version': VERSION
+        'version': VERSION,
+        'cache': {
+            'transcripts': transcript_cache.stats(),
+            'summaries': summary_cache.stats()
+        },
+        'upstreams': {
+            'searchapi': searchapi_client.stats(),
+            'deepseek': deepseek_client.stats()
+        },
+        'llm_providers': llm_pool.stats(),
+        'cassette': cassette.stats() if cassette else None,
+        'write_behind': write_behind.stats(),
+        'singleflight': {
+            'transcripts': transcript_flight.stats(),
+            'summaries': summary_flight.stats()
+        }
     })
 
-# Create a separate utility function for updating progress
-def update_progress_status(message):
-    """Update progress status file"""
-    progress_file = "/tmp/progress_status.json" if os.environ.get('VERCEL_ENV') else "progress_status.json"
+def update_progress_status(progress_id, phase, message=None, percent=None):
+    """Record progress for one request or job; memory only, no file I/O"""
     try:
-        # Ensure directory exists before writing file
-        ensure_directory_exists(os.path.dirname(progress_file) or '.')
-        
-        with open(progress_file, "w") as f:
-            json.dump({"message": message, "timestamp": datetime.now().isoformat()}, f)
+        progress_registry.update(progress_id, phase=phase, message=message, percent=percent)
         return True
     except Exception as e:
         logger.error(f"Error updating progress: {str(e)}")
         return False
 
+def chunk_progress(progress_id):
+    """Progress callback mapping map-phase chunk completion onto 10-90%"""
+    def on_progress(completed, total):
+        update_progress_status(progress_id, "generating_summary",
+                               f"Summarized {completed} of {total} parts...",
+                               10 + 80 * completed / total)
+    return on_progress
+
+def _abandon_progress(progress_id, error):
+    """Finish a request's progress entry if it is still open, e.g. after an error or a disconnect"""
+    entry = progress_registry.get(progress_id) if progress_id else None
+    if entry is not None and not entry['done']:
+        progress_registry.finish(progress_id, error=error)
+
+def _progress_id_from_request():
+    """Use the caller's request ID if given so it can poll progress while waiting
+
+    The same ID tags this request's log lines. An ID that does not match REQUEST_ID_RE, or that
+    another request's progress already uses, is replaced by a generated one.
+    """
+    progress_id = request.json.get('request_id') or metrics.get_request_id()
+    if not isinstance(progress_id, str) or not REQUEST_ID_RE.fullmatch(progress_id) \
+            or progress_registry.get(progress_id) is not None:
+        logger.warning(f"Replacing a request ID that is invalid or already in use from {request.remote_addr}")
+        progress_id = None
+    metrics.set_request_id(progress_id)
+    return metrics.get_request_id()
+
 @app.route('/summarize', methods=['POST'])
 @limiter.limit("5 per minute")
 def summarize_video():
+    progress_id = None
     try:
         # Check if request has JSON data
         if not request.is_json:
@@ -253,67 +1216,60 @@ def summarize_video():
         deepseek_key = request.json.get('deepseek_key')
         searchapi_key = request.json.get('searchapi_key')
         
+        # Skip cached transcript and summary when the caller asks for a refresh
+        refresh = bool(request.json.get('refresh', False))
+        
+        # End each summary point with its [m:ss] position in the video
+        timestamps = bool(request.json.get('timestamps', False))
+        
+        # Progress for this request is available at /progress/<request_id>
+        progress_id = _progress_id_from_request()
+        
         # Extract video ID    
         video_id = extract_video_id(url)
         logger.info(f"Processing video ID: {video_id} from IP: {request.remote_addr}")
         
         # Update progress
-        try:
-            update_progress_status("Fetching transcript...")
-        except Exception as e:
-            logger.error(f"Error updating progress status: {str(e)}")
-            # Continue even if progress update fails
+        update_progress_status(progress_id, "fetching_transcript", "Fetching transcript...", 0)
             
         # Get transcript with error handling
         try:
-            transcript = get_transcript(video_id, searchapi_key)
+            transcript = get_transcript_cached(video_id, searchapi_key, refresh=refresh)
         except Exception as e:
             logger.error(f"Error getting transcript: {str(e)}")
-            return jsonify({'error': f"Failed to get transcript: {str(e)}"}), 400
+            progress_registry.finish(progress_id, error=f"Failed to get transcript: {str(e)}")
+            return jsonify({'error': f"Failed to get transcript: {str(e)}", 'request_id': progress_id}), \
+                error_status(e)
         
         # Update progress
-        try:
-            update_progress_status("Generating summary...")
-        except Exception as e:
-            logger.error(f"Error updating progress status: {str(e)}")
-            # Continue even if progress update fails
+        update_progress_status(progress_id, "generating_summary", "Generating summary...", 10)
         
         # Generate summary with error handling
         try:
-            summary = summarize_text(transcript, deepseek_key)
+            summary = summarize_transcript(transcript, deepseek_key, refresh=refresh,
+                                           on_progress=chunk_progress(progress_id), timestamps=timestamps)
         except Exception as e:
             logger.error(f"Error generating summary: {str(e)}")
-            return jsonify({'error': f"Failed to generate summary: {str(e)}"}), 400
+            progress_registry.finish(progress_id, error=f"Failed to generate summary: {str(e)}")
+            return jsonify({'error': f"Failed to generate summary: {str(e)}", 'request_id': progress_id}), \
+                error_status(e)
         
-        # Save summary to file
-        output_dir = "/tmp/output" if os.environ.get('VERCEL_ENV') else "output"
-        try:
-            # Ensure the output directory exists using our helper function
-            ensure_directory_exists(output_dir)
-            
-            summary_path = os.path.join(output_dir, f"{video_id}_summary.md")
-            with open(summary_path, "w") as f:
-                f.write(summary)
-        except Exception as e:
-            logger.error(f"Error saving summary file: {str(e)}")
-            # Continue even if file save fails - this is non-critical
-        
-        # Save to history
-        try:
-            save_to_history(video_id, url, summary)
-        except Exception as e:
-            logger.error(f"Error saving to history: {str(e)}")
-            # Continue even if history save fails
+        # Save summary to file and history
+        update_progress_status(progress_id, "saving", "Saving summary...", 95)
+        save_summary(video_id, url, summary, timestamps)
+        progress_registry.finish(progress_id)
             
         logger.info(f"Successfully generated summary for video ID: {video_id}")
             
         return jsonify({
             'summary': summary,
-            'video_id': video_id
+            'video_id': video_id,
+            'request_id': progress_id
         })
     except ValueError as e:
         # This will now catch our more specific API authentication errors
         logger.warning(f"Value error during summarization: {str(e)} for request from {request.remote_addr}")
+        _abandon_progress(progress_id, str(e))
         return jsonify({'error': str(e)}), 400
     except requests.HTTPError as e:
         # Try to extract more specific error information from the response
@@ -322,52 +1278,466 @@ def summarize_video():
             if 'error' in response_json and 'message' in response_json['error']:
                 error_message = response_json['error']['message']
                 logger.error(f"API Error: {error_message} for request from {request.remote_addr}")
+                _abandon_progress(progress_id, f"API Error: {error_message}")
                 return jsonify({'error': f"API Error: {error_message}"}), 400 if 'authentication' in error_message.lower() else 500
         except (ValueError, AttributeError, KeyError):
             pass
         logger.error(f"HTTP Error during API request: {str(e)} for request from {request.remote_addr}")
+        _abandon_progress(progress_id, f"API Error: {str(e)}")
         return jsonify({'error': f"API Error: {str(e)}"}), 500
     except Exception as e:
         logger.exception(f"Unexpected error during summarization: {str(e)} for request from {request.remote_addr}")
+        _abandon_progress(progress_id, f"Unexpected error: {str(e)}")
         return jsonify({'error': f"Unexpected error: {str(e)}"}), 500
 
-@app.route('/progress', methods=['GET'])
-def progress_update():
-    """Get progress status"""
-    progress_file = "/tmp/progress_status.json" if os.environ.get('VERCEL_ENV') else "progress_status.json"
+def error_status(error):
+    """HTTP status for a failed fetch or summary: 429 for used-up quotas, 413 for oversized transcripts"""
+    if isinstance(error, QuotaExceededError):
+        return 429
+    if isinstance(error, TokenBudgetError):
+        return 413
+    return 400
+
+def _sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/summarize/stream', methods=['POST'])
+@limiter.limit("5 per minute")
+def summarize_video_stream():
+    """Stream summary generation to the client as Server-Sent Events"""
+    if not request.is_json:
+        logger.warning(f"Invalid request format from {request.remote_addr}")
+        return jsonify({'error': 'Invalid request format. JSON required'}), 400
+        
+    url = request.json.get('url')
+    if not url:
+        logger.warning(f"Missing YouTube URL in request from {request.remote_addr}")
+        return jsonify({'error': 'Missing YouTube URL'}), 400
+        
+    deepseek_key = request.json.get('deepseek_key')
+    searchapi_key = request.json.get('searchapi_key')
+    refresh = bool(request.json.get('refresh', False))
+    timestamps = bool(request.json.get('timestamps', False))
+    progress_id = _progress_id_from_request()
+    remote_addr = request.remote_addr
     
     try:
-        if os.path.exists(progress_file):
-            with open(progress_file, "r") as f:
-                return jsonify(json.load(f))
-        return jsonify({"message": "Ready", "timestamp": datetime.now().isoformat()})
-    except Exception as e:
-        logger.error(f"Error reading progress file: {str(e)}")
-        return jsonify({"message": "Ready", "timestamp": datetime.now().isoformat()})
+        video_id = extract_video_id(url)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    logger.info(f"Streaming summary for video ID: {video_id} from IP: {remote_addr}")
+    
+    def fail(message):
+        progress_registry.finish(progress_id, error=message)
+        return _sse_event('error', {'error': message, 'request_id': progress_id})
+    
+    def generate():
+        try:
+            update_progress_status(progress_id, "fetching_transcript", "Fetching transcript...", 0)
+            yield _sse_event('phase', {'phase': 'fetching_transcript', 'message': 'Fetching transcript...',
+                                       'request_id': progress_id})
+            try:
+                transcript = get_transcript_cached(video_id, searchapi_key, refresh=refresh)
+            except Exception as e:
+                logger.error(f"Error getting transcript: {str(e)}")
+                yield fail(f"Failed to get transcript: {str(e)}")
+                return
+                
+            update_progress_status(progress_id, "generating_summary", "Generating summary...", 10)
+            yield _sse_event('phase', {'phase': 'generating_summary', 'message': 'Generating summary...',
+                                       'request_id': progress_id})
+            parts = []
+            try:
+                for delta in stream_transcript_summary(transcript, deepseek_key, refresh=refresh,
+                                                       on_progress=chunk_progress(progress_id),
+                                                       timestamps=timestamps):
+                    parts.append(delta)
+                    yield _sse_event('token', {'text': delta})
+            except Exception as e:
+                logger.error(f"Error generating summary: {str(e)}")
+                yield fail(f"Failed to generate summary: {str(e)}")
+                return
+                
+            summary = "".join(parts)
+            save_summary(video_id, url, summary, timestamps)
+            progress_registry.finish(progress_id)
+            logger.info(f"Successfully streamed summary for video ID: {video_id}")
+            yield _sse_event('done', {'summary': summary, 'video_id': video_id, 'request_id': progress_id})
+        except Exception as e:
+            logger.exception(f"Unexpected error during streaming summarization: {str(e)} for request from {remote_addr}")
+            yield fail(f"Unexpected error: {str(e)}")
+        finally:
+            # Also reached through GeneratorExit when the client disconnects mid-stream
+            _abandon_progress(progress_id, "Client disconnected")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _batch_urls():
+    """(data, urls) of a batch request; urls is None when a JSON body has no 'urls' list"""
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        urls = data.get('urls')
+        if not isinstance(urls, list):
+            return data, None
+        return data, list(read_urls(str(url) for url in urls))
+    return {}, list(read_urls(request.get_data(as_text=True).splitlines()))
+
+def _batch_cost():
+    """Rate-limit cost of a batch: one per URL; rejected batches cost one"""
+    _, urls = _batch_urls()
+    if not urls or len(urls) > BATCH_MAX_URLS:
+        return 1
+    return len(urls)
+
+@app.route('/summarize/batch', methods=['POST'])
+@limiter.limit(BATCH_RATE_LIMIT, cost=_batch_cost)
+def summarize_batch():
+    """Summarize many URLs concurrently, streaming one JSON result per line
+
+    Accepts {"urls": [...]} or a plain-text body with one URL per line. Passing a
+    batch_id makes the run resumable: re-posting the same batch_id skips videos that
+    already succeeded. Batches need the caller's own Deepseek and SearchAPI keys.
+    """
+    data, urls = _batch_urls()
+    if urls is None:
+        return jsonify({'error': "JSON body must contain a 'urls' list"}), 400
+        
+    if not urls:
+        return jsonify({'error': 'No URLs provided'}), 400
+    if len(urls) > BATCH_MAX_URLS:
+        return jsonify({'error': f'Too many URLs; the limit is {BATCH_MAX_URLS} per batch'}), 400
+        
+    batch_id = data.get('batch_id') or request.args.get('batch_id')
+    if batch_id and not re.match(r'^[\w-]{1,64}$', batch_id):
+        return jsonify({'error': 'batch_id may only contain letters, digits, "_" and "-"'}), 400
+        
+    try:
+        concurrency = min(int(data.get('concurrency') or request.args.get('concurrency') or 4), BATCH_MAX_CONCURRENCY)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'concurrency must be an integer'}), 400
+        
+    deepseek_key = data.get('deepseek_key') or request.headers.get('X-Deepseek-Key')
+    searchapi_key = data.get('searchapi_key') or request.headers.get('X-SearchAPI-Key')
+    if not (deepseek_key and searchapi_key):
+        logger.warning(f"Rejected batch without API keys from {request.remote_addr}")
+        return jsonify({'error': 'Batches need your own API keys: pass deepseek_key and searchapi_key '
+                                 '(or the X-Deepseek-Key and X-SearchAPI-Key headers)'}), 401
+    refresh = bool(data.get('refresh', False))
+    timestamps = bool(data.get('timestamps', False))
+    
+    runner = BatchRunner(
+        lambda video_id, url: run_summary_pipeline(video_id, url, searchapi_key, deepseek_key,
+                                                   refresh=refresh, timestamps=timestamps),
+        extract_video_ids,
+        concurrency=concurrency,
+        state_path=os.path.join(BATCH_DIR, f"{batch_id}.jsonl") if batch_id else None
+    )
+    logger.info(f"Starting batch of {len(urls)} URLs (batch_id={batch_id}) from IP: {request.remote_addr}")
+    
+    def generate():
+        for result in runner.run(urls):
+            yield json.dumps(result) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _is_admin():
+    supplied = request.headers.get('Authorization', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {ADMIN_TOKEN}".encode('utf-8'))
+
+@app.route('/admin/resummarize', methods=['POST'])
+def admin_resummarize():
+    """Regenerate history summaries made with older settings, streaming one JSON result per line
+
+    Accepts {"force", "video_ids", "concurrency", "dry_run", "deepseek_key", "searchapi_key"},
+    all optional. Re-posting after an interruption continues with the videos still stale.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not _is_admin():
+        logger.warning(f"Rejected admin request from {request.remote_addr}")
+        return jsonify({'error': 'Unauthorized'}), 401
+        
+    data = request.get_json(silent=True) or {}
+    force = bool(data.get('force', False))
+    video_ids = data.get('video_ids')
+    if video_ids is not None and not isinstance(video_ids, list):
+        return jsonify({'error': "'video_ids' must be a list"}), 400
+    video_ids = set(video_ids) if video_ids else None
+    try:
+        concurrency = min(int(data.get('concurrency') or 4), BATCH_MAX_CONCURRENCY)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'concurrency must be an integer'}), 400
+        
+    if data.get('dry_run'):
+        entries = [{'video_id': entry['video_id'], 'url': entry['url'], 'summary_config': entry['summary_config']}
+                   for entry in stale_history_entries(force, video_ids)]
+        return jsonify({'stale': entries, 'summary_config': summary_config()})
+        
+    deepseek_key = data.get('deepseek_key') or request.headers.get('X-Deepseek-Key')
+    searchapi_key = data.get('searchapi_key') or request.headers.get('X-SearchAPI-Key')
+    logger.info(f"Starting re-summarization (force={force}) from IP: {request.remote_addr}")
+    
+    def generate():
+        for result in resummarize_history(concurrency, force, video_ids, searchapi_key, deepseek_key):
+            yield json.dumps(result) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/jobs', methods=['POST'])
+@limiter.limit("5 per minute")
+def create_job():
+    """Queue a summarization job and return its ID immediately"""
+    if not request.is_json:
+        logger.warning(f"Invalid request format from {request.remote_addr}")
+        return jsonify({'error': 'Invalid request format. JSON required'}), 400
+        
+    url = request.json.get('url')
+    if not url:
+        logger.warning(f"Missing YouTube URL in request from {request.remote_addr}")
+        return jsonify({'error': 'Missing YouTube URL'}), 400
+        
+    try:
+        video_id = extract_video_id(url)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+        
+    payload = {
+        'video_id': video_id,
+        'url': url,
+        'refresh': bool(request.json.get('refresh', False)),
+        'timestamps': bool(request.json.get('timestamps', False))
+    }
+    secrets = {
+        'deepseek_key': request.json.get('deepseek_key'),
+        'searchapi_key': request.json.get('searchapi_key')
+    }
+    
+    # Requests for a video that already has an active job of the same kind, made with the same
+    # API keys and refresh flag, share that job
+    kind = f"{video_id}:timestamps" if payload['timestamps'] else video_id
+    dedupe_key = flight_key(kind, payload['refresh'],
+                            content_hash(secrets['deepseek_key'] or '', secrets['searchapi_key'] or ''))
+    job_id, created = get_job_queue().submit(dedupe_key, payload, secrets)
+    logger.info(f"{'Queued' if created else 'Reusing'} job {job_id} for video ID: {video_id} from IP: {request.remote_addr}")
+    
+    return jsonify({
+        'job_id': job_id,
+        'video_id': video_id,
+        'deduplicated': not created
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get job status, and the summary once it has finished"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+        
+    response = {
+        'job_id': job['id'],
+        'video_id': job['payload']['video_id'],
+        'url': job['payload']['url'],
+        'status': job['status'],
+        'phase': job['phase'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    }
+    if job['status'] == 'done':
+        response['summary'] = job['result']
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    return jsonify(response)
+
+@app.route('/progress/<progress_id>', methods=['GET'])
+def progress_update(progress_id):
+    """Get progress for one request or job"""
+    entry = progress_registry.get(progress_id)
+    if entry is None:
+        return jsonify({'error': 'Unknown progress ID'}), 404
+    return jsonify(entry)
+
+@app.route('/progress/<progress_id>/stream', methods=['GET'])
+def progress_stream(progress_id):
+    """Push progress for one request or job as Server-Sent Events until it finishes"""
+    # A client may open the stream for its own request ID just before sending the request
+    if progress_registry.wait(progress_id, -1, timeout=PROGRESS_STREAM_GRACE) is None:
+        return jsonify({'error': 'Unknown progress ID'}), 404
+
+    def generate():
+        version = -1
+        idle_since = time.monotonic()
+        while True:
+            idle = time.monotonic() - idle_since
+            if idle >= PROGRESS_STREAM_IDLE_TIMEOUT:
+                yield _sse_event('error', {'error': f'No progress for {int(idle)} seconds',
+                                           'request_id': progress_id})
+                return
+            entry = progress_registry.wait(progress_id, version,
+                                           timeout=min(15.0, PROGRESS_STREAM_IDLE_TIMEOUT - idle))
+            if entry is None:
+                # Expired, or evicted from a full registry
+                yield _sse_event('error', {'error': 'Unknown progress ID', 'request_id': progress_id})
+                return
+            if entry['version'] == version:
+                # Nothing new yet; a comment line keeps proxies from closing the connection
+                yield ": keep-alive\n\n"
+                continue
+            version = entry['version']
+            idle_since = time.monotonic()
+            yield _sse_event('progress', entry)
+            if entry['done']:
+                return
+
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _collect_metrics():
+    """Cache, upstream, coalescing and queue figures, read from their own stats at scrape time"""
+    caches = {'transcripts': transcript_cache.stats(), 'summaries': summary_cache.stats()}
+    upstreams = {'searchapi': searchapi_client.stats(), 'deepseek': deepseek_client.stats()}
+    flights = {'transcripts': transcript_flight.stats(), 'summaries': summary_flight.stats()}
+    families = [
+        ('ytsum_cache_lookups_total', 'counter', 'Cache lookups by result',
+         [({'cache': name, 'result': result}, stats[key])
+          for name, stats in caches.items()
+          for result, key in (('memory_hit', 'memory_hits'), ('disk_hit', 'disk_hits'), ('miss', 'misses'))]),
+        ('ytsum_cache_hit_ratio', 'gauge', 'Fraction of cache lookups served from memory or disk',
+         [({'cache': name}, stats['hit_rate']) for name, stats in caches.items()]),
+        ('ytsum_upstream_retries_total', 'counter', 'Upstream requests retried',
+         [({'upstream': name}, stats['retries']) for name, stats in upstreams.items()]),
+        ('ytsum_upstream_circuit_open', 'gauge', '1 while the upstream circuit breaker is not closed',
+         [({'upstream': name}, int(stats['circuit']['state'] != 'closed')) for name, stats in upstreams.items()]),
+        ('ytsum_singleflight_saved_calls_total', 'counter', 'Upstream calls avoided by request coalescing',
+         [({'flight': name}, stats['saved_upstream_calls']) for name, stats in flights.items()]),
+        ('ytsum_singleflight_in_flight', 'gauge', 'Coalesced calls currently in flight',
+         [({'flight': name}, stats['in_flight']) for name, stats in flights.items()]),
+        ('ytsum_progress_entries', 'gauge', 'Requests and jobs tracked by the progress registry',
+         [({}, len(progress_registry))]),
+        ('ytsum_write_behind_pending', 'gauge', 'Writes queued for the write-behind writer',
+         [({}, write_behind.stats()['pending'])]),
+    ]
+    # Only report the job queue once something has used it, rather than opening its store here
+    if _job_queue is not None:
+        families.append(('ytsum_jobs', 'gauge', 'Background jobs by status',
+                         [({'status': status}, count) for status, count in _job_queue.store.counts().items()]))
+    return families
+
+metrics.registry.register_collector(_collect_metrics)
+
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+def metrics_endpoint():
+    """Metrics in Prometheus text format"""
+    return Response(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/history', methods=['GET'])
 def get_history():
-    """Get summary history"""
-    history = load_history()
-    return jsonify(history)
-
-# 添加全局JSON响应处理
-def add_cors_headers(response):
-    # Always set Content-Type to application/json for API endpoints
-    # Skip for the main page which should return HTML
-    if request.path == '/':
+    """Get one page of summary history, newest first
+
+    Query parameters: limit (default 50, max 500), cursor (the next_cursor from the
+    previous page), video_id, since and until (ISO timestamps).
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 500))
+        cursor = request.args.get('cursor', type=int)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+        
+    try:
+        # Include entries of summaries that are still queued for writing
+        write_behind.drain(kinds=("history",))
+        items, next_cursor = get_history_store().list(
+            limit=limit,
+            cursor=cursor,
+            video_id=request.args.get('video_id'),
+            since=request.args.get('since'),
+            until=request.args.get('until')
+        )
+    except Exception as e:
+        logger.error(f"Error loading history: {str(e)}")
+        return jsonify({'error': 'Failed to load history'}), 500
+        
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@app.route('/summary/<video_id>', methods=['GET'])
+def get_summary(video_id):
+    """Serve the stored summary of a video as Markdown
+
+    Responses carry an ETag, and a request whose If-None-Match matches it gets 304 without
+    the summary being read. Compressed summaries are sent as stored to clients that accept
+    deflate.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    try:
+        # A summary generated just before may still be queued for writing
+        write_behind.drain(kinds=("summary",))
+        store = get_summary_store()
+        if if_none_match:
+            etag = store.etag(video_id)
+            # The deflate representation has its own ETag; either one is a match
+            matched = next((candidate for candidate in (etag, f'{etag}-deflate')
+                            if etag is not None and etag_matches(if_none_match, candidate)), None)
+            if matched:
+                response = make_response('', 304)
+                response.set_etag(matched)
+                response.vary.add('Accept-Encoding')
+                response.mimetype = 'text/markdown'
+                return response
+        stored = store.get_raw(video_id)
+    except Exception as e:
+        logger.error(f"Error reading summary for {video_id}: {str(e)}")
+        return jsonify({'error': 'Failed to load summary'}), 500
+    if stored is None:
+        return jsonify({'error': f'No summary stored for video ID: {video_id}'}), 404
+
+    etag, encoding, body, updated_at = stored
+    send_compressed = encoding == 'zlib' and request.accept_encodings['deflate'] > 0
+    response = make_response(body if send_compressed else decode_body(encoding, body))
+    if send_compressed:
+        response.headers['Content-Encoding'] = 'deflate'
+    response.headers['Content-Type'] = 'text/markdown; charset=utf-8'
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f'{etag}-deflate' if send_compressed else etag)
+    response.last_modified = datetime.fromtimestamp(updated_at, timezone.utc)
+    return response
+
+def add_cache_headers(response):
+    """Cache-Control for every response, plus ETags and 304s for cacheable GET responses
+
+    Content-Type is left as each endpoint set it (jsonify for JSON APIs), so caches can
+    tell the representations apart.
+    """
+    policy = CACHE_POLICIES.get(request.endpoint)
+    if policy is None:
+        response.headers.setdefault('Cache-Control', 'no-store')
         return response
-    
-    # Ensure all API responses have the correct Content-Type
-    response.headers['Content-Type'] = 'application/json'
+    response.headers.setdefault('Cache-Control', policy)
+    if request.method == 'GET' and response.status_code == 200 and not response.is_streamed \
+            and 'ETag' not in response.headers:
+        response.set_etag(strong_etag(response.get_data()))
+        response.make_conditional(request)
     return response
 
-app.after_request(add_cors_headers)
+app.after_request(add_cache_headers)
 
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Resource not found'}), 404
 
+@app.errorhandler(429)
+def rate_limit_exceeded(error):
+    return jsonify({'error': f'Rate limit exceeded: {error.description}'}), 429
+
 @app.errorhandler(500)
 def internal_error(error):
     logger.exception("Internal server error")
@@ -376,33 +1746,124 @@ def internal_error(error):
 # Add a catch-all exception handler to ensure JSON responses
 @app.errorhandler(Exception)
 def handle_exception(error):
+    # HTTP errors raised by Flask or extensions keep their own status code
+    if isinstance(error, HTTPException):
+        return jsonify({'error': error.description}), error.code
     logger.exception(f"Unhandled exception: {str(error)}")
     return jsonify({'error': f'Server error: {str(error)}'}), 500
 
+def run_resummarize(args):
+    """CLI re-summarize mode: regenerate stale history entries and write JSONL results to stdout"""
+    video_ids = {args.video_id} if args.video_id else None
+    if args.dry_run:
+        for entry in stale_history_entries(args.force, video_ids):
+            print(json.dumps({"video_id": entry["video_id"], "url": entry["url"],
+                              "summary_config": entry["summary_config"]}), flush=True)
+        return 0
+        
+    before = summary_cache.stats()
+    failures = done = 0
+    for result in resummarize_history(args.concurrency, args.force, video_ids):
+        failures += result["status"] != "ok"
+        done += 1
+        print(json.dumps(result), flush=True)
+    after = summary_cache.stats()
+    hits = sum(after[k] - before[k] for k in ("memory_hits", "disk_hits"))
+    print(f"Re-summarized {done - failures} of {done} videos: {after['writes'] - before['writes']} "
+          f"Deepseek calls, {hits} summaries reused from cache", file=sys.stderr)
+    return failures
+
+def run_batch(args):
+    """CLI batch mode: read URLs from a file or stdin and write JSONL results to stdout"""
+    if args.searchapi_rate:
+        searchapi_client.rate_limiter = RateLimiter(args.searchapi_rate)
+    if args.deepseek_rate:
+        deepseek_client.rate_limiter = RateLimiter(args.deepseek_rate)
+        
+    source = sys.stdin if args.batch == "-" else open(args.batch, "r")
+    try:
+        runner = BatchRunner(
+            lambda video_id, url: run_summary_pipeline(video_id, url, refresh=args.refresh,
+                                                       timestamps=args.timestamps),
+            extract_video_ids,
+            concurrency=args.concurrency,
+            state_path=args.state
+        )
+        failures = 0
+        for result in runner.run(read_urls(source)):
+            failures += result["status"] != "ok"
+            print(json.dumps(result), flush=True)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return failures
+
+def run_summary_transfer(args):
+    """CLI --export-summaries / --import-summaries: summaries as JSON lines, - for stdout/stdin"""
+    write_behind.drain(kinds=("summary",))
+    store = get_summary_store()
+    if args.export_summaries:
+        target = sys.stdout if args.export_summaries == "-" else open(args.export_summaries, "w", encoding="utf-8")
+        try:
+            count = store.export(target)
+        finally:
+            if target is not sys.stdout:
+                target.close()
+        print(f"Exported {count} summaries from {SUMMARY_DB}", file=sys.stderr)
+    else:
+        source = sys.stdin if args.import_summaries == "-" else open(args.import_summaries, "r", encoding="utf-8")
+        try:
+            count = store.import_file(source)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        print(f"Imported {count} summaries into {SUMMARY_DB}", file=sys.stderr)
+
 def main():
+    parser = argparse.ArgumentParser(description="Summarize YouTube videos")
+    parser.add_argument("video_id", nargs="?", help="YouTube video ID to summarize")
+    parser.add_argument("--refresh", action="store_true", help="ignore cached transcripts and summaries")
+    parser.add_argument("--timestamps", action="store_true", help="end each summary point with its [m:ss] position")
+    parser.add_argument("--batch", metavar="FILE", help="file with one URL per line, or - for stdin")
+    parser.add_argument("--concurrency", type=int, default=4, help="videos processed at the same time in batch and re-summarize mode")
+    parser.add_argument("--state", metavar="FILE", help="JSONL state file that makes a batch run resumable")
+    parser.add_argument("--resummarize", action="store_true",
+                        help="regenerate history summaries made with another model, temperature or prompt")
+    parser.add_argument("--force", action="store_true", help="with --resummarize, regenerate every summary")
+    parser.add_argument("--dry-run", action="store_true", help="with --resummarize, only list stale summaries")
+    parser.add_argument("--export-summaries", metavar="FILE", help="write every stored summary as JSON lines, - for stdout")
+    parser.add_argument("--import-summaries", metavar="FILE", help="load summaries written by --export-summaries, - for stdin")
+    parser.add_argument("--searchapi-rate", type=float, help="max SearchAPI.io requests per second")
+    parser.add_argument("--deepseek-rate", type=float, help="max Deepseek requests per second")
+    args = parser.parse_args()
+    
     try:
-        if len(sys.argv) != 2:
-            raise ValueError("Usage: python yt_summarizer.py [YOUTUBE_VIDEO_ID]")
+        if args.batch:
+            failures = run_batch(args)
+            sys.exit(1 if failures else 0)
+        if args.resummarize:
+            failures = run_resummarize(args)
+            sys.exit(1 if failures else 0)
+        if args.export_summaries or args.import_summaries:
+            run_summary_transfer(args)
+            return
+            
+        if not args.video_id:
+            raise ValueError("Usage: python yt_summarizer.py [--refresh] [YOUTUBE_VIDEO_ID] or --batch FILE")
             
-        video_id = sys.argv[1]
+        video_id = args.video_id
+        refresh = args.refresh
         print(f"Fetching transcript for video {video_id}...")
-        transcript = get_transcript(video_id)
+        transcript = get_transcript_cached(video_id, refresh=refresh)
         
         print("Generating summary...")
-        summary = summarize_text(transcript)
-        
-        # Ensure output directory exists
-        output_dir = "output"
-        ensure_directory_exists(output_dir)
-        summary_path = os.path.join(output_dir, f"{video_id}_summary.md")
-        
-        with open(summary_path, "w") as f:
-            f.write(summary)
+        summary = summarize_transcript(transcript, refresh=refresh, timestamps=args.timestamps)
         
-        # Save to history
-        save_to_history(video_id, f"https://youtube.com/watch?v={video_id}", summary)
+        # Save to the summary store and history
+        store_summary(video_id, summary)
+        save_to_history(video_id, canonical_url(video_id), summary, args.timestamps)
             
-        print(f"Summary saved to {summary_path}")
+        print(f"Summary saved to {SUMMARY_DB}")
         print("="*50)
         print(summary)
         
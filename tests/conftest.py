@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from benchmarks.mock_upstreams import MockUpstreamServer
+
+
+@pytest.fixture(scope="session")
+def upstream():
+    """Mock SearchAPI.io and Deepseek, answering without delay"""
+    server = MockUpstreamServer(latency=0.0, segments=40, stream_tokens=5, token_interval=0.0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="session")
+def core(upstream, tmp_path_factory):
+    """src.yt_summarizer against the mock upstreams, writing its files to a scratch directory"""
+    os.environ.update({
+        "SEARCHAPI_BASE_URL": upstream.base_url,
+        "DEEPSEEK_BASE_URL": upstream.base_url,
+        "SEARCHAPI_KEY": "test-searchapi-key",
+        "DEEPSEEK_KEY": "test-deepseek-key",
+        "UPSTREAM_MAX_RETRIES": "0",
+    })
+    cwd = os.getcwd()
+    # Log file, history, summary and cache paths are relative to the working directory
+    scratch = tmp_path_factory.mktemp("app")
+    os.environ["SINGLEFLIGHT_DB"] = str(scratch / "singleflight.db")
+    os.chdir(scratch)
+    from src import yt_summarizer
+
+    yt_summarizer.limiter.enabled = False
+    yield yt_summarizer
+    yt_summarizer.write_behind.close()
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def client(core):
+    return core.app.test_client()
@@ -0,0 +1,15 @@
+import pytest
+
+
+def test_deepseek_error_bodies_are_logged_not_printed(core, capsys):
+    with pytest.raises(ValueError, match="authentication failed"):
+        core.raise_deepseek_error('{"error": {"message": "Authentication Fails (bad key)"}}')
+    assert "Authentication Fails" not in capsys.readouterr().out
+
+
+def test_summarize_stream_sends_tokens_and_done(client):
+    response = client.post("/summarize/stream", json={"url": "https://youtu.be/streamtest1", "refresh": True})
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert "event: token" in body
+    assert "event: done" in body
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+from limits import parse
+
+
+@pytest.fixture
+def asgi(core, monkeypatch):
+    from src import asgi
+
+    monkeypatch.setattr(asgi, "SUMMARIZE_LIMIT", parse("1000 per minute"))
+    return asgi
+
+
+def call(asgi, method, path, **kwargs):
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(run())
+
+
+def test_summarize_over_asgi(asgi):
+    response = call(asgi, "POST", "/summarize", json={"url": "https://youtu.be/asgivideo01", "refresh": True})
+    assert response.status_code == 200
+    assert response.json()["video_id"] == "asgivideo01"
+    assert response.json()["summary"]
+    assert response.headers["x-request-id"]
+
+
+def test_bad_requests_over_asgi(asgi):
+    assert call(asgi, "POST", "/summarize", content=b"not json").status_code == 400
+    assert call(asgi, "POST", "/summarize", json={}).status_code == 400
+    assert call(asgi, "GET", "/nowhere").status_code == 404
+    assert call(asgi, "GET", "/health").json()["status"] == "healthy"
+
+
+def test_cache_and_rate_limit_io_stay_off_the_event_loop(asgi, core, monkeypatch):
+    loop_threads, io_threads = set(), []
+
+    def recording(fn):
+        def wrapper(*args, **kwargs):
+            io_threads.append(threading.get_ident())
+            return fn(*args, **kwargs)
+        return wrapper
+
+    for cache in (core.transcript_cache, core.summary_cache):
+        monkeypatch.setattr(cache, "get", recording(cache.get))
+        monkeypatch.setattr(cache, "set", recording(cache.set))
+    monkeypatch.setattr(asgi.rate_limiter, "hit", recording(asgi.rate_limiter.hit))
+
+    async def run():
+        loop_threads.add(threading.get_ident())
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/summarize", json={"url": "https://youtu.be/asgivideo02"})
+
+    assert asyncio.run(run()).status_code == 200
+    assert len(io_threads) >= 5
+    assert not loop_threads & set(io_threads)
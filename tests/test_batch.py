@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from src.batch import BatchRunner, read_urls
+from src.video_ids import extract_video_ids
+
+KEYS = {"deepseek_key": "caller-deepseek-key", "searchapi_key": "caller-searchapi-key"}
+
+
+def test_read_urls_skips_blank_lines_and_comments():
+    assert list(read_urls(["  https://youtu.be/aaaaaaaaaaa \n", "\n", "# comment", "bbbbbbbbbbb"])) == [
+        "https://youtu.be/aaaaaaaaaaa", "bbbbbbbbbbb"]
+
+
+def test_runner_deduplicates_and_reports_errors():
+    processed = []
+
+    def process(video_id, url):
+        processed.append(video_id)
+        if video_id == "bbbbbbbbbbb":
+            raise ValueError("no transcript")
+        return f"summary of {video_id}"
+
+    results = list(BatchRunner(process, extract_video_ids, concurrency=2).run([
+        "https://youtu.be/aaaaaaaaaaa", "https://www.youtube.com/watch?v=aaaaaaaaaaa",
+        "bbbbbbbbbbb", "not a url"]))
+    by_status = {}
+    for result in results:
+        by_status.setdefault(result["status"], []).append(result)
+    assert sorted(processed) == ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+    assert [r["summary"] for r in by_status["ok"]] == ["summary of aaaaaaaaaaa"]
+    assert {r.get("video_id") for r in by_status["error"]} == {"bbbbbbbbbbb", None}
+
+
+def test_runner_resumes_from_state_file(tmp_path):
+    state_path = str(tmp_path / "state" / "run.jsonl")
+    calls = []
+
+    def flaky(video_id, url):
+        calls.append(video_id)
+        if video_id == "bbbbbbbbbbb" and calls.count(video_id) == 1:
+            raise ValueError("timed out")
+        return video_id.upper()
+
+    urls = ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+    list(BatchRunner(flaky, extract_video_ids, state_path=state_path).run(urls))
+    # A truncated last line from a crash is ignored
+    with open(state_path, "a") as f:
+        f.write('{"video_id": "ccc')
+    results = {r["video_id"]: r for r in BatchRunner(flaky, extract_video_ids, state_path=state_path).run(urls)}
+
+    assert calls == ["aaaaaaaaaaa", "bbbbbbbbbbb", "bbbbbbbbbbb"]
+    assert results["aaaaaaaaaaa"]["resumed"] is True
+    assert results["bbbbbbbbbbb"]["status"] == "ok" and "resumed" not in results["bbbbbbbbbbb"]
+
+
+def test_batch_endpoint_requires_caller_keys(client):
+    response = client.post("/summarize/batch", json={"urls": ["https://youtu.be/batchnokey1"]})
+    assert response.status_code == 401
+    assert "API keys" in response.get_json()["error"]
+
+
+def test_batch_endpoint_limits_urls(core, client):
+    urls = [f"https://youtu.be/batch{number:06d}" for number in range(core.BATCH_MAX_URLS + 1)]
+    response = client.post("/summarize/batch", json=dict(KEYS, urls=urls))
+    assert response.status_code == 400
+    assert client.post("/summarize/batch", json={"urls": "not a list"}).status_code == 400
+
+
+def test_batch_endpoint_streams_results(client):
+    response = client.post("/summarize/batch", json=dict(KEYS, urls=["https://youtu.be/batchrun001", "bad"]))
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert response.status_code == 200
+    assert sorted(r["status"] for r in results) == ["error", "ok"]
+
+
+@pytest.fixture
+def limiter(core):
+    core.limiter.enabled = True
+    yield core.limiter
+    core.limiter.enabled = False
+
+
+def test_batch_rate_limit_is_charged_per_url(core, limiter):
+    # A client address of its own, so earlier tests' requests are not counted
+    client = core.app.test_client()
+    client.environ_base["REMOTE_ADDR"] = "192.0.2.8"
+    urls = [f"https://youtu.be/charge{number:05d}" for number in range(core.BATCH_MAX_URLS)]
+    # Rejected for missing keys, but each URL has been charged
+    assert client.post("/summarize/batch", json={"urls": urls}).status_code == 401
+    assert client.post("/summarize/batch", json={"urls": urls}).status_code == 401
+    assert client.post("/summarize/batch", json={"urls": urls[:1]}).status_code == 429
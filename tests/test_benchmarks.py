@@ -0,0 +1,51 @@
+import time
+
+import requests
+
+from benchmarks.bench_suite import RequestIds, flask_caller, run_threaded
+from benchmarks.harness import ResourceMeter, latency_report, percentile
+
+
+def test_percentile_and_latency_report():
+    assert percentile([], 50) == 0.0
+    assert percentile([0.3, 0.1, 0.2], 50) == 0.2
+    assert percentile([0.3, 0.1, 0.2], 100) == 0.3
+    report = latency_report([0.001, 0.002, 0.003, 0.010], prefix="ttft_")
+    assert report == {"ttft_p50_ms": 3.0, "ttft_p95_ms": 10.0, "ttft_p99_ms": 10.0,
+                      "ttft_mean_ms": 4.0, "ttft_max_ms": 10.0}
+    assert latency_report([])["p50_ms"] == 0.0
+
+
+def test_resource_meter_reports_per_request_cost():
+    with ResourceMeter() as meter:
+        sum(range(200000))
+        time.sleep(0.01)
+    report = meter.report(requests=10)
+    assert report["cpu_seconds"] >= 0
+    assert 0 <= report["cpu_utilization"] <= 1.5
+    assert set(report) == {"cpu_seconds", "cpu_ms_per_request", "cpu_utilization", "rss_mb",
+                           "rss_growth_kb_per_request", "peak_rss_mb"}
+
+
+def test_request_ids_are_unique_or_follow_a_cassette():
+    ids = RequestIds()
+    assert ids.body()["url"] != ids.body()["url"]
+    replay = RequestIds(["aaaaaaaaaaa", "bbbbbbbbbbb"])
+    assert [replay.body()["url"][-11:] for _ in range(3)] == ["aaaaaaaaaaa", "bbbbbbbbbbb", "aaaaaaaaaaa"]
+
+
+def test_mock_upstreams_serve_both_apis(upstream):
+    transcript = requests.get(f"{upstream.base_url}/api/v1/search",
+                              params={"engine": "youtube_transcripts", "video_id": "mockvideo01"})
+    assert transcript.status_code == 200
+    assert transcript.json()["transcripts"]
+
+
+def test_threaded_run_against_the_app(core):
+    call, close = flask_caller(core, "summarize", workers=2)
+    try:
+        results = run_threaded(call, RequestIds(), requests=4, concurrency=2)
+    finally:
+        close()
+    assert len(results) == 4
+    assert all(ok for _, ok, _ in results)
@@ -0,0 +1,104 @@
+import os
+import time
+
+import pytest
+
+from src.cache import DiskCache, LRUCache, TieredCache, content_hash
+
+
+def cache_files(directory, suffix):
+    return [name for name in os.listdir(directory) if name.endswith(suffix)]
+
+
+def test_content_hash_is_stable_and_separates_parts():
+    assert content_hash("a", "b") == content_hash("a", "b")
+    assert content_hash("ab", "") != content_hash("a", "b")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+
+def test_lru_expires_entries(monkeypatch):
+    cache = LRUCache(ttl=10)
+    cache.set("a", 1)
+    later = time.time() + 11
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert cache.get("a") is None
+
+
+def test_disk_cache_round_trip_and_stale_reads(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=10)
+    cache.set("key", {"value": 1})
+    assert cache.get("key") == {"value": 1}
+
+    path = cache._path("key")
+    old = time.time() - 60
+    os.utime(path, (old, old))
+    assert cache.get("key", stale_ok=True) == {"value": 1}
+    assert cache.get("key") is None
+    assert not os.path.exists(path)
+
+
+def test_disk_cache_treats_corrupt_entries_as_misses(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.set("key", [1, 2])
+    with open(cache._path("key"), "wb") as f:
+        f.write(b"{not json")
+    assert cache.get("key") is None
+    assert cache_files(tmp_path, ".cache") == []
+
+
+def test_disk_cache_removes_temp_file_when_rename_fails(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path))
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        cache.set("key", "value")
+    assert cache_files(tmp_path, ".tmp") == []
+
+
+def test_disk_cache_evicts_oldest_past_size_budget(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=250)
+    for number in range(5):
+        cache.set(f"key{number}", "x" * 80)
+        path = cache._path(f"key{number}")
+        os.utime(path, (number, number))
+    assert cache.get("key0") is None
+    assert cache.get("key4") == "x" * 80
+    assert sum(os.path.getsize(os.path.join(tmp_path, name)) for name in cache_files(tmp_path, ".cache")) <= 250
+
+
+def test_disk_cache_size_accounting_follows_deletes(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=10, max_bytes=10_000)
+    cache.set("a", "x" * 100)
+    cache.set("b", "x" * 100)
+    assert cache._total_bytes == 2 * len(cache.dumps("x" * 100))
+
+    old = time.time() - 60
+    os.utime(cache._path("a"), (old, old))
+    assert cache.get("a") is None
+    cache.delete("b")
+    assert cache._total_bytes == 0
+
+
+def test_tiered_cache_promotes_disk_hits_and_counts(tmp_path):
+    disk = DiskCache(str(tmp_path))
+    disk.set("key", "value")
+    cache = TieredCache("test", LRUCache(), disk)
+    assert cache.get("key") == "value"
+    assert cache.get("key") == "value"
+    assert cache.get("other") is None
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["memory_entries"] == 1
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+import requests
+
+from src.cassettes import Cassette, CassetteMiss, request_key
+from src.upstream import UpstreamClient
+
+TRANSCRIPT_PARAMS = {"engine": "youtube_transcripts", "video_id": "cassette001", "api_key": "secret"}
+
+
+def replay_client(cassette, **kwargs):
+    client = UpstreamClient("searchapi", "http://upstream.test", backoff_base=0, **kwargs)
+    client.mount(cassette.adapter(client))
+    return client
+
+
+def write_cassette(path, *interactions):
+    with open(path, "w", encoding="utf-8") as f:
+        for interaction in interactions:
+            f.write(json.dumps(interaction) + "\n")
+    return path
+
+
+def test_request_key_ignores_secrets_and_json_key_order():
+    url = "http://upstream.test/api?b=2&a=1"
+    assert request_key("x", "get", url + "&api_key=one") == request_key("x", "GET", "http://upstream.test/api?a=1&b=2")
+    assert request_key("x", "POST", url, b'{"a": 1, "b": 2}') == request_key("x", "POST", url, '{"b":2,"a":1}')
+    assert request_key("x", "POST", url, '{"a": 1}') != request_key("x", "POST", url, '{"a": 2}')
+    assert request_key("x", "POST", url, '{"a": 1}', match_body=False) == request_key("x", "POST", url)
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError, match="Unknown cassette mode"):
+        Cassette("tape.jsonl", mode="rewind")
+
+
+def test_record_then_replay(upstream, tmp_path):
+    path = str(tmp_path / "tape.jsonl.gz")
+    recorder = Cassette(path, mode="record")
+    client = UpstreamClient("searchapi", upstream.base_url)
+    client.mount(recorder.adapter(client))
+    recorded = client.get("/api/v1/search", params=TRANSCRIPT_PARAMS).json()
+    assert recorder.stats()["recorded"] == 1
+
+    cassette = Cassette(path, speed=0)
+    assert len(cassette) == 1
+    assert "secret" not in cassette.urls("searchapi")[0]
+    replayed = replay_client(cassette).get("/api/v1/search", params=dict(TRANSCRIPT_PARAMS, api_key="other"))
+    assert replayed.status_code == 200 and replayed.json() == recorded
+    assert cassette.stats()["replayed"] == 1
+
+
+def test_a_miss_is_neither_retried_nor_held_against_the_breaker(tmp_path):
+    cassette = Cassette(write_cassette(str(tmp_path / "empty.jsonl")), speed=0)
+    client = replay_client(cassette, max_retries=3)
+    for _ in range(client.breaker.failure_threshold + 1):
+        with pytest.raises(CassetteMiss, match="No recorded searchapi response"):
+            client.get("/api/v1/search", params=TRANSCRIPT_PARAMS)
+    assert not isinstance(CassetteMiss("x"), requests.RequestException)
+    assert client.stats()["retries"] == 0
+    assert client.breaker.stats()["state"] == "closed"
+    assert cassette.stats()["missing"] == client.breaker.failure_threshold + 1
+
+
+@pytest.mark.parametrize("name, error", [
+    ("ConnectTimeout", requests.ConnectTimeout),
+    ("ReadTimeout", requests.ReadTimeout),
+    ("ConnectionError", requests.ConnectionError),
+    ("SomeProxyTimeout", requests.Timeout),
+])
+def test_recorded_errors_are_replayed_as_the_same_exception(tmp_path, name, error):
+    url = "http://upstream.test/api/v1/search?" + "&".join(f"{k}={v}" for k, v in TRANSCRIPT_PARAMS.items())
+    path = write_cassette(str(tmp_path / "errors.jsonl"), {
+        "key": request_key("searchapi", "GET", url), "upstream": "searchapi", "method": "GET",
+        "url": url, "elapsed": 0.5, "error": name,
+    })
+    client = replay_client(Cassette(path, speed=0), max_retries=0)
+    with pytest.raises(error) as raised:
+        client.get("/api/v1/search", params=TRANSCRIPT_PARAMS)
+    assert type(raised.value) is error
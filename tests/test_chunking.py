@@ -0,0 +1,33 @@
+from src.chunking import chunk_segments, estimate_tokens
+from src.transcript import Transcript
+
+
+def test_chunks_respect_budget_and_keep_segments_whole():
+    segments = [f"segment number {i} " * 3 for i in range(50)]
+    chunks = chunk_segments(segments, max_tokens=60)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 60 for chunk in chunks)
+    assert " ".join(chunks) == " ".join(segments)
+
+
+def test_small_transcript_is_one_chunk():
+    assert chunk_segments(["a short", "transcript"], max_tokens=1000) == ["a short transcript"]
+
+
+def test_oversized_segment_is_split_on_words():
+    words = " ".join(f"word{i}" for i in range(200))
+    chunks = chunk_segments(["before", words, "after"], max_tokens=50)
+    assert chunks[0] == "before"
+    assert chunks[-1] == "after"
+    assert " ".join(chunks[1:-1]) == words
+    assert all(estimate_tokens(chunk) <= 50 for chunk in chunks[1:-1])
+
+
+def test_empty_input_has_no_chunks():
+    assert chunk_segments([], max_tokens=100) == []
+
+
+def test_transcript_chunks_match_list_chunks():
+    texts = [f"caption {i} " + "x" * (i % 37) for i in range(300)] + ["y " * 500]
+    transcript = Transcript.from_segments(texts)
+    assert chunk_segments(transcript, max_tokens=120) == chunk_segments(texts, max_tokens=120)
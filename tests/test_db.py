@@ -0,0 +1,35 @@
+import threading
+
+import pytest
+
+from src.db import ThreadLocalConnection, connect, sqlite_path
+
+
+def test_sqlite_path():
+    assert sqlite_path("sqlite:///data/app.db") == "data/app.db"
+    assert sqlite_path("sqlite:////var/app.db") == "/var/app.db"
+    with pytest.raises(ValueError, match="Unsupported SQLite URI"):
+        sqlite_path("redis://localhost")
+
+
+def test_connect_creates_the_directory_and_uses_wal(tmp_path):
+    conn = connect(str(tmp_path / "nested" / "app.db"))
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert (tmp_path / "nested").is_dir()
+
+
+def test_one_connection_per_thread(tmp_path):
+    local = ThreadLocalConnection(str(tmp_path / "app.db"), "CREATE TABLE IF NOT EXISTS t (x INTEGER);")
+    assert local.get() is local.get()
+    local.get().execute("INSERT INTO t VALUES (1)")
+    seen = {}
+
+    def other():
+        seen["conn"] = local.get()
+        seen["rows"] = seen["conn"].execute("SELECT x FROM t").fetchall()
+
+    thread = threading.Thread(target=other)
+    thread.start()
+    thread.join()
+    assert seen["conn"] is not local.get()
+    assert [row["x"] for row in seen["rows"]] == [1]
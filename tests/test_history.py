@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from src.history import HistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history.db"))
+
+
+def add(store, video_id, timestamp, config=None):
+    return store.append(video_id, f"https://www.youtube.com/watch?v={video_id}", timestamp,
+                        f"summaries/{video_id}.md", config)
+
+
+def test_list_pages_newest_first_with_filters(store):
+    for number in range(5):
+        add(store, f"video{number % 2}", f"2024-01-0{number + 1}T00:00:00")
+
+    first, cursor = store.list(limit=2)
+    second, cursor = store.list(limit=2, cursor=cursor)
+    last, cursor = store.list(limit=2, cursor=cursor)
+    assert [e["timestamp"][:10] for e in first + second + last] == [
+        "2024-01-05", "2024-01-04", "2024-01-03", "2024-01-02", "2024-01-01"]
+    assert cursor is None
+
+    entries, _ = store.list(video_id="video1", since="2024-01-03")
+    assert [e["timestamp"][:10] for e in entries] == ["2024-01-04"]
+    assert store.count() == 5
+
+
+def test_iter_videos_yields_latest_entry_of_each_video_across_pages(store):
+    for round_number in range(3):
+        for number in range(7):
+            add(store, f"video{number}", f"2024-01-0{round_number + 1}T00:00:00", {"round": round_number})
+
+    entries = list(store.iter_videos(batch_size=3))
+    assert [e["video_id"] for e in entries] == [f"video{number}" for number in range(7)]
+    assert all(e["summary_config"] == {"round": 2} for e in entries)
+    assert list(store.iter_videos(batch_size=7)) == entries
+
+
+def test_iter_videos_reads_pages_through_the_index(store):
+    plan = store._conn.get().execute(
+        "EXPLAIN QUERY PLAN SELECT MAX(id) FROM history WHERE video_id > ? GROUP BY video_id "
+        "ORDER BY video_id LIMIT ?", ("", 10)
+    ).fetchall()
+    assert any("COVERING INDEX history_video_id" in row["detail"] for row in plan)
+
+
+def test_append_many_and_set_summary_config(store):
+    store.append_many([("abc", "url", "2024-01-01T00:00:00", "abc.md", None),
+                       ("def", "url", "2024-01-02T00:00:00", "def.md", {"model": "old"})])
+    store.set_summary_config("abc", {"model": "new"})
+    configs = {e["video_id"]: e["summary_config"] for e in store.iter_all()}
+    assert configs == {"abc": {"model": "new"}, "def": {"model": "old"}}
+
+
+def test_migrates_legacy_json_once(tmp_path):
+    legacy = tmp_path / "history.json"
+    legacy.write_text(json.dumps([
+        {"video_id": "abc", "url": "url", "timestamp": "2024-01-01T00:00:00", "summary_file": "abc.md"},
+        {"video_id": None, "timestamp": "2024-01-02T00:00:00"},
+    ]))
+    store = HistoryStore(str(tmp_path / "history.db"), legacy_json_path=str(legacy))
+    assert store.count() == 1
+    assert not legacy.exists() and (tmp_path / "history.json.migrated").exists()
+    assert HistoryStore(str(tmp_path / "history.db"), legacy_json_path=str(legacy)).count() == 1
@@ -0,0 +1,54 @@
+import gzip
+
+from src.http_cache import Precompressed, accepted_encodings, etag_matches, strong_etag
+
+
+def test_etag_matches():
+    etag = strong_etag(b"body")
+    assert len(etag) == 32
+    assert etag_matches(f'"{etag}"', etag)
+    assert etag_matches(f'"other", W/"{etag}"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate;q=0.5, br;q=0") == {"gzip", "deflate"}
+    assert accepted_encodings("GZIP;q=bad") == set()
+    assert accepted_encodings(None) == set()
+
+
+def test_precompressed_variants():
+    page = Precompressed(b"<html>" + b"x" * 1000 + b"</html>", "text/html; charset=utf-8")
+    encoding, body, etag = page.select("gzip, deflate")
+    assert encoding == "gzip" and gzip.decompress(body).startswith(b"<html>")
+    assert etag.endswith("-gz")
+    # The gzip bytes, and so the ETag, do not change between processes
+    assert Precompressed(b"<html>" + b"x" * 1000 + b"</html>", "text/html").select("gzip")[2] == etag
+
+    encoding, body, identity_etag = page.select("identity")
+    assert encoding == "identity" and body.startswith(b"<html>")
+    assert identity_etag != etag
+
+    headers = page.headers("gzip", etag, "public, max-age=300")
+    assert headers["Content-Encoding"] == "gzip" and headers["ETag"] == f'"{etag}"'
+    assert headers["Vary"] == "Accept-Encoding"
+    assert "Content-Encoding" not in page.headers("identity", identity_etag, "no-cache")
+
+
+def test_index_is_served_compressed_and_revalidated(client):
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+    revalidated = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert "Content-Encoding" not in revalidated.headers
+
+
+def test_cache_policies_per_endpoint(client):
+    history = client.get("/history")
+    assert history.headers["Cache-Control"] == "private, no-cache"
+    assert client.get("/history", headers={"If-None-Match": history.headers["ETag"]}).status_code == 304
+    assert client.get("/health").headers["Cache-Control"] == "no-store"
@@ -0,0 +1,182 @@
+import time
+
+import pytest
+
+from src.jobs import (DONE, FAILED, LOST_SECRETS_ERROR, QUEUED, RUNNING, JobQueue, JobStore, MemoryJobStore,
+                      SQLiteJobStore)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / "jobs.db"))
+
+
+def wait_for(store, job_id, statuses=(DONE, FAILED), timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = store.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {store.get(job_id)['status']}")
+
+
+def test_create_deduplicates_active_jobs(store):
+    job_id, created = store.create("abc", {"video_id": "abc"})
+    assert created
+    assert store.create("abc", {"video_id": "abc"}) == (job_id, False)
+
+    store.update(job_id, status=DONE, finished_at=time.time())
+    new_id, created = store.create("abc", {"video_id": "abc"})
+    assert created and new_id != job_id
+
+
+def test_claim_hands_out_each_job_once(store):
+    job_id, _ = store.create("abc", {"video_id": "abc"})
+    job = store.claim()
+    assert job["id"] == job_id and job["status"] == RUNNING
+    assert store.claim() is None
+
+
+def test_owned_jobs_are_only_claimed_by_their_owner(store):
+    owned, _ = store.create("abc", {"video_id": "abc"}, owner="worker-a")
+    assert store.claim() is None
+    assert store.claim("worker-b") is None
+    assert store.claim("worker-a")["id"] == owned
+
+
+def test_requeue_stale_fails_owned_jobs(store):
+    shared, _ = store.create("abc", {"video_id": "abc"})
+    owned_running, _ = store.create("def", {"video_id": "def"}, owner="worker-a")
+    owned_queued, _ = store.create("ghi", {"video_id": "ghi"}, owner="worker-a")
+    store.claim()
+    store.claim("worker-a")
+
+    assert store.requeue_stale(time.time() + 1) == 1
+    assert store.get(shared)["status"] == QUEUED
+    for job_id in (owned_running, owned_queued):
+        job = store.get(job_id)
+        assert job["status"] == FAILED
+        assert job["error"] == LOST_SECRETS_ERROR
+
+
+def test_queue_runs_job_with_its_secrets(store):
+    calls = []
+
+    def runner(job_id, payload, secrets, set_phase):
+        set_phase("summarizing")
+        calls.append(secrets)
+        return "summary"
+
+    queue = JobQueue(store, runner, workers=1, poll_interval=0.01)
+    job_id, created = queue.submit("abc", {"video_id": "abc"},
+                                   {"deepseek_key": "caller-key", "searchapi_key": None})
+    job = wait_for(store, job_id)
+    assert created
+    assert job["status"] == DONE and job["result"] == "summary"
+    assert calls == [{"deepseek_key": "caller-key"}]
+
+
+def test_job_without_caller_keys_is_not_owned(store):
+    queue = JobQueue(store, lambda *args: "summary", workers=0)
+    job_id, _ = queue.submit("abc", {"video_id": "abc"}, {"deepseek_key": None})
+    # Any process's workers may run it
+    assert store.claim("another-process")["id"] == job_id
+
+
+def test_job_whose_secrets_are_gone_fails_without_running(store):
+    calls = []
+    submitter = JobQueue(store, lambda *args: calls.append(args), workers=0)
+    job_id, _ = submitter.submit("abc", {"video_id": "abc"}, {"deepseek_key": "caller-key"})
+
+    # A queue in another process never claims it
+    other = JobQueue(store, lambda *args: calls.append(args), workers=1, poll_interval=0.01)
+    other.start()
+    time.sleep(0.1)
+    assert store.get(job_id)["status"] == QUEUED
+
+    # The submitting queue with its secrets lost (as after a restart with the same owner)
+    submitter._secrets.clear()
+    submitter._run(store.claim(submitter.owner))
+    job = store.get(job_id)
+    assert job["status"] == FAILED
+    assert job["error"] == LOST_SECRETS_ERROR
+    assert calls == []
+
+
+def test_runner_errors_fail_the_job(store):
+    def runner(job_id, payload, secrets, set_phase):
+        raise ValueError("no transcript")
+
+    queue = JobQueue(store, runner, workers=1, poll_interval=0.01)
+    job_id, _ = queue.submit("abc", {"video_id": "abc"})
+    job = wait_for(store, job_id)
+    assert job["status"] == FAILED and job["error"] == "no transcript"
+
+
+def test_jobs_of_live_workers_are_left_alone(store):
+    store.heartbeat("worker-a")
+    owned, _ = store.create("abc", {"video_id": "abc"}, owner="worker-a")
+    shared, _ = store.create("def", {"video_id": "def"})
+    assert store.claim("worker-a")["id"] == owned
+    assert store.claim("worker-a")["id"] == shared
+
+    assert store.requeue_stale(time.time() - 60) == 0
+    assert store.get(owned)["status"] == RUNNING and store.get(shared)["status"] == RUNNING
+
+    # worker-a stops heartbeating
+    assert store.requeue_stale(time.time() + 1) == 1
+    assert store.get(owned)["status"] == FAILED
+    assert store.get(shared)["status"] == QUEUED and store.get(shared)["worker"] is None
+
+
+def test_a_stopped_owners_job_does_not_block_new_submissions(store):
+    # Queued by a worker that died a minute ago, before running it
+    store.heartbeat("dead-worker")
+    dead, _ = store.create("abc", {"video_id": "abc"}, owner="dead-worker")
+    queue = JobQueue(store, lambda *args: "summary", workers=0, stale_after=0.05)
+    time.sleep(0.1)
+
+    job_id, created = queue.submit("abc", {"video_id": "abc"}, {"deepseek_key": "caller-key"})
+    assert created and job_id != dead
+    assert store.get(dead)["status"] == FAILED
+
+
+def test_a_live_owners_job_is_shared(store):
+    first = JobQueue(store, lambda *args: "summary", workers=0)
+    job_id, _ = first.submit("abc", {"video_id": "abc"}, {"deepseek_key": "caller-key"})
+    second = JobQueue(store, lambda *args: "summary", workers=0)
+    assert second.submit("abc", {"video_id": "abc"}, {"deepseek_key": "caller-key"}) == (job_id, False)
+    assert store.get(job_id)["status"] == QUEUED
+
+
+def test_heartbeats_keep_a_worker_alive(store):
+    queue = JobQueue(store, lambda *args: "summary", workers=0, heartbeat_interval=0.02, stale_after=0.2)
+    job_id, _ = queue.submit("abc", {"video_id": "abc"}, {"deepseek_key": "caller-key"})
+    time.sleep(0.4)
+    assert store.requeue_stale(time.time() - 0.2) == 0
+    assert store.get(job_id)["status"] == QUEUED
+
+
+def test_job_store_is_abstract():
+    with pytest.raises(TypeError):
+        JobStore()
+
+
+def test_post_jobs_shares_jobs_only_with_the_same_keys_and_refresh(core, client, monkeypatch):
+    # No workers, so every job stays queued
+    monkeypatch.setattr(core, "_job_queue", JobQueue(MemoryJobStore(), lambda *args: "summary", workers=0))
+
+    def post(**fields):
+        body = {"url": "https://youtu.be/jobdedupe01", "deepseek_key": "key-a", "searchapi_key": "search-a"}
+        response = client.post("/jobs", json=dict(body, **fields))
+        assert response.status_code == 202
+        return response.get_json()
+
+    first = post()
+    assert post()["job_id"] == first["job_id"]
+    assert post(deepseek_key="key-b")["job_id"] != first["job_id"]
+    assert post(searchapi_key="search-b")["job_id"] != first["job_id"]
+    assert post(refresh=True)["job_id"] != first["job_id"]
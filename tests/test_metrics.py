@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from src import metrics
+from src.metrics import Registry, _Metric, span
+
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("ytsum_test", "Test metric")
+
+
+def test_render_counters_gauges_and_histograms():
+    registry = Registry()
+    requests = registry.counter("ytsum_test_requests_total", "Requests", ["status"])
+    depth = registry.gauge("ytsum_test_depth", "Queue depth")
+    latency = registry.histogram("ytsum_test_seconds", "Latency", buckets=(0.1, 1.0))
+    requests.labels("200").inc()
+    requests.labels(status="200").inc(2)
+    depth.set(4)
+    depth.dec()
+    latency.observe(0.05)
+    latency.observe(5)
+    registry.register_collector(lambda: [("ytsum_test_ratio", "gauge", "Ratio", [({"cache": 'a"b'}, 0.5)])])
+
+    lines = registry.render().splitlines()
+    assert "# TYPE ytsum_test_requests_total counter" in lines
+    assert 'ytsum_test_requests_total{status="200"} 3' in lines
+    assert "ytsum_test_depth 3" in lines
+    assert 'ytsum_test_seconds_bucket{le="0.1"} 1' in lines
+    assert 'ytsum_test_seconds_bucket{le="1.0"} 1' in lines
+    assert 'ytsum_test_seconds_bucket{le="+Inf"} 2' in lines
+    assert "ytsum_test_seconds_count 2" in lines
+    assert 'ytsum_test_ratio{cache="a\\"b"} 0.5' in lines
+
+
+def test_failing_collector_is_skipped():
+    registry = Registry()
+    registry.register_collector(lambda: 1 / 0)
+    registry.counter("ytsum_test_total", "Test").inc()
+    assert "ytsum_test_total 1" in registry.render()
+
+
+def stage_count(name):
+    return metrics.STAGE_SECONDS.labels(name).count
+
+
+def test_span_decorator_keeps_the_function_and_times_each_call():
+    @span("test_decorated")
+    def work(value):
+        """Doubles value"""
+        time.sleep(0.01)
+        return value * 2
+
+    assert work.__name__ == "work" and work.__doc__ == "Doubles value"
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(work(2))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [4] * 4
+    assert stage_count("test_decorated") == 4
+    assert metrics.STAGE_SECONDS.labels("test_decorated").sum >= 0.04
+
+
+def test_span_counts_errors_and_logs_when_tracing(monkeypatch):
+    logged = []
+    monkeypatch.setattr(metrics.logger, "info", logged.append)
+    metrics.enable_tracing()
+    try:
+        with span("test_outer"):
+            with pytest.raises(ValueError):
+                with span("test_inner"):
+                    raise ValueError("failed")
+    finally:
+        metrics.enable_tracing(False)
+    assert metrics.STAGE_ERRORS.labels("test_inner").value == 1
+    assert logged[0].startswith("span=test_inner parent=test_outer")
+    assert logged[0].endswith("status=error")
+    assert logged[1].startswith("span=test_outer parent=-")
+
+
+def test_request_ids():
+    token = metrics.set_request_id(None)
+    try:
+        assert len(metrics.get_request_id()) == 32
+        record = {"extra": {}}
+        metrics.add_request_id(record)
+        assert record["extra"]["request_id"] == metrics.get_request_id()
+    finally:
+        metrics.request_id_var.reset(token)
@@ -0,0 +1,120 @@
+import random
+
+import pytest
+
+from src.near_duplicates import NearDuplicateIndex, minhash, shingle_hashes, similarity
+from src.transcript import Transcript
+
+
+def talk(seed, words=400):
+    rng = random.Random(seed)
+    return " ".join(f"word{rng.randrange(5000)}" for _ in range(words))
+
+
+def edited(text, every=40):
+    """text with one word in every `every` replaced, like a re-upload's slightly different captions"""
+    words = text.split()
+    return " ".join("changed" if i % every == 0 else word for i, word in enumerate(words))
+
+
+def test_signatures_estimate_similarity():
+    a, b = minhash(shingle_hashes(talk(1))[0]), minhash(shingle_hashes(edited(talk(1)))[0])
+    assert similarity(a, a) == 1.0
+    assert similarity(a, b) > 0.6
+    assert similarity(a, minhash(shingle_hashes(talk(2))[0])) < 0.2
+
+
+def test_short_transcripts_are_not_fingerprinted():
+    assert NearDuplicateIndex().fingerprint("too short to compare") is None
+    with pytest.raises(ValueError, match="multiple of bands"):
+        NearDuplicateIndex(num_perm=64, bands=10)
+
+
+def test_query_finds_near_duplicates_of_the_same_group():
+    index = NearDuplicateIndex(min_merge=2)
+    for seed in range(5):
+        index.add(f"video{seed}", "plain", index.fingerprint(talk(seed)))
+    signature = index.fingerprint(edited(talk(3)))
+    video_id, score = index.query(signature, "plain", 0.6)
+    assert video_id == "video3" and score > 0.6
+    assert index.query(signature, "plain", 0.6, exclude="video3") is None
+    assert index.query(signature, "timestamps", 0.6) is None
+    assert index.query(index.fingerprint(talk(99)), "plain", 0.6) is None
+
+
+def test_readding_a_video_replaces_its_signature():
+    index = NearDuplicateIndex(min_merge=1)
+    index.add("video", "plain", index.fingerprint(talk(1)))
+    index.add("video", "plain", index.fingerprint(talk(2)))
+    assert len(index) == 1
+    assert index.query(index.fingerprint(talk(1)), "plain", 0.6) is None
+    assert index.query(index.fingerprint(talk(2)), "plain", 0.6)[0] == "video"
+
+
+def test_tags_are_kept_with_entries(tmp_path):
+    index = NearDuplicateIndex()
+    index.add("video", "plain", index.fingerprint(talk(1)), tag="etag-1")
+    assert index.tag("video") == "etag-1" and index.tag("other") is None
+
+    path = str(tmp_path / "fingerprints.db")
+    stored = NearDuplicateIndex(path)
+    stored.add("video", "plain", stored.fingerprint(talk(1)), tag="etag-1")
+    stored.add("video", "plain", stored.fingerprint(talk(1)), tag="etag-2")
+    assert NearDuplicateIndex(path).tag("video") == "etag-2"
+
+
+def test_entries_persist_and_other_processes_additions_are_picked_up(tmp_path):
+    path = str(tmp_path / "fingerprints.db")
+    first = NearDuplicateIndex(path, refresh_interval=3600)
+    first.add("video1", "plain", first.fingerprint(talk(1)))
+    second = NearDuplicateIndex(path, refresh_interval=3600)
+    assert len(second) == 1
+
+    first.add("video2", "plain", first.fingerprint(talk(2)))
+    signature = second.fingerprint(talk(2))
+    # Not yet: the refresh interval has not passed
+    assert second.query(signature, "plain", 0.9) is None
+    assert second.refresh(force=True) == 1
+    assert second.query(signature, "plain", 0.9)[0] == "video2"
+    # Rows read again within the overlap are not added twice
+    assert second.refresh(force=True) == 0
+    assert len(second) == 2
+
+
+def test_summary_of_a_near_duplicate_video_is_reused(core):
+    text = talk(2024)
+    source = Transcript.from_rows([(0.0, 1.0, text)], "nearsource1")
+    signature, summary = core.find_near_duplicate_summary(source)
+    assert signature is not None and summary is None
+    # The summary is still queued for the store when the mirror is looked up
+    core.save_summary("nearsource1", "https://youtu.be/nearsource1", "- the shared summary")
+    core.index_near_duplicate(source, signature, "- the shared summary")
+
+    mirror = Transcript.from_rows([(0.0, 1.0, edited(text, every=80))], "nearmirror1")
+    assert core.find_near_duplicate_summary(mirror)[1] == "- the shared summary"
+    assert core.find_near_duplicate_summary(mirror, refresh=True)[1] is None
+
+
+def test_a_summary_replaced_with_other_settings_is_not_reused(core):
+    text = talk(2026)
+    source = Transcript.from_rows([(0.0, 1.0, text)], "nearreplace")
+    signature, _ = core.find_near_duplicate_summary(source)
+    core.save_summary("nearreplace", "https://youtu.be/nearreplace", "- plain summary")
+    core.index_near_duplicate(source, signature, "- plain summary")
+    # A timestamped summary of the same video replaces the plain one in the store
+    core.save_summary("nearreplace", "https://youtu.be/nearreplace", "- point [0:42]", timestamps=True)
+
+    mirror = Transcript.from_rows([(0.0, 1.0, text)], "nearreplac2")
+    assert core.find_near_duplicate_summary(mirror)[1] is None
+
+
+def test_timestamped_summaries_are_not_reused(core):
+    text = talk(2025)
+    source = Transcript.from_rows([(0.0, 1.0, text)], "nearstamps1")
+    assert core.find_near_duplicate_summary(source, timestamps=True) == (None, None)
+    core.save_summary("nearstamps1", "https://youtu.be/nearstamps1", "- point [0:00]", timestamps=True)
+    core.index_near_duplicate(source, core.get_near_duplicate_index().fingerprint(text), "- point [0:00]",
+                              timestamps=True)
+
+    mirror = Transcript.from_rows([(0.0, 1.0, text)], "nearstamps2")
+    assert core.find_near_duplicate_summary(mirror, timestamps=True) == (None, None)
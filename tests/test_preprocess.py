@@ -0,0 +1,67 @@
+import pytest
+
+from src.preprocess import Preprocessor
+from src.transcript import Transcript
+
+ROWS = [
+    (0.0, 2.0, "[Music] um, so today we"),
+    (2.0, 2.0, "so today we talk about i think uh caching"),
+    (5.0, 1.0, ">> hello there"),
+    (6.0, 1.0, "(applause)"),
+    (7.0, 1.0, "error handling is , important"),
+]
+
+
+def test_all_stages():
+    assert list(Preprocessor().clean(ROWS)) == [
+        (0.0, 2.0, "So today we"),
+        # The repeated start of the rolling caption is dropped; the pause ends the sentence
+        (2.0, 2.0, "talk about I think caching."),
+        # The dropped "(applause)" caption leaves a pause that ends this sentence too
+        (5.0, 1.0, "Hello there."),
+        (7.0, 1.0, "Error handling is, important."),
+    ]
+
+
+def test_stages_can_be_chosen():
+    assert [text for _, _, text in Preprocessor(stages=("noise",)).clean(ROWS)] == [
+        "um, so today we", "so today we talk about i think uh caching", "hello there",
+        "error handling is , important"]
+    assert Preprocessor(stages=("fillers", "noise")).stages == ("noise", "fillers")
+    with pytest.raises(ValueError, match="Unknown preprocessing stages: typo"):
+        Preprocessor(stages=("noise", "typo"))
+
+
+def test_fillers_keep_words_that_contain_them():
+    cleaned = list(Preprocessor(stages=("fillers",)).clean([(0, 1, "uh the umbrella, hmm, hummed erm")]))
+    assert cleaned == [(0, 1, "the umbrella, hummed")]
+
+
+def test_config_describes_the_settings():
+    assert Preprocessor().config == "noise,fillers,dedupe,punctuation"
+    assert Preprocessor(stages=("noise",), token_budget=100).config == "noise;budget=100"
+
+
+def test_compress_keeps_topical_passages_in_order_within_budget():
+    rows = [
+        (0, 1, "Caching makes repeated summaries cheap."),
+        (1, 1, "The weather was nice yesterday."),
+        (2, 1, "A cache hit skips caching work for summaries."),
+    ]
+    kept = Preprocessor().compress(rows, token_budget=25)
+    assert [text for _, _, text in kept] == [rows[0][2], rows[2][2]]
+    # The best passage is kept even when it alone is over the budget
+    assert len(Preprocessor().compress(rows, token_budget=1)) == 1
+
+
+def test_call_reports_token_savings():
+    transcript = Transcript.from_rows(ROWS, "abc")
+    cleaned, report = Preprocessor()(transcript)
+    assert cleaned.video_id == "abc"
+    assert report["segments_before"] == 5 and report["segments_after"] == 4
+    assert report["tokens_after"] < report["tokens_before"]
+    assert 0 < report["reduction"] < 1
+
+    budgeted, report = Preprocessor(token_budget=8)(transcript)
+    assert len(budgeted) < len(cleaned)
+    assert report["tokens_after"] < report["tokens_before"]
@@ -0,0 +1,122 @@
+import threading
+import time
+
+from src.progress import ProgressRegistry
+
+
+def test_update_records_phases_and_clamps_percent():
+    registry = ProgressRegistry()
+    registry.update("req", phase="fetching_transcript", percent=-5)
+    registry.update("req", phase="generating_summary", message="Generating", percent=250)
+    entry = registry.get("req")
+    assert entry["percent"] == 100
+    assert entry["message"] == "Generating"
+    assert [phase["phase"] for phase in entry["phases"]] == ["fetching_transcript", "generating_summary"]
+    assert not entry["done"]
+
+
+def test_finish_with_error():
+    registry = ProgressRegistry()
+    registry.finish("req", error="no transcript")
+    entry = registry.get("req")
+    assert entry["done"] and entry["phase"] == "failed" and entry["error"] == "no transcript"
+
+
+def test_finished_entries_expire_after_ttl():
+    registry = ProgressRegistry(ttl=0)
+    registry.finish("old")
+    time.sleep(0.01)
+    registry.update("new", phase="fetching_transcript")
+    assert registry.get("old") is None
+    assert registry.get("new") is not None
+
+
+def test_max_entries_evicts_oldest():
+    registry = ProgressRegistry(max_entries=2)
+    for progress_id in ("a", "b", "c"):
+        registry.update(progress_id, phase="fetching_transcript")
+    assert registry.get("a") is None
+    assert len(registry) == 2
+
+
+def test_wait_returns_on_update_or_timeout():
+    registry = ProgressRegistry()
+    registry.update("req", phase="fetching_transcript")
+    version = registry.get("req")["version"]
+    assert registry.wait("req", version, timeout=0.01)["version"] == version
+
+    threading.Timer(0.05, registry.finish, args=("req",)).start()
+    assert registry.wait("req", version, timeout=5.0)["done"]
+
+
+def test_progress_unknown_id_is_404(core, client, monkeypatch):
+    monkeypatch.setattr(core, "PROGRESS_STREAM_GRACE", 0.01)
+    assert client.get("/progress/missing").status_code == 404
+    assert client.get("/progress/missing/stream").status_code == 404
+
+
+def test_progress_stream_ends_after_idle_timeout(core, client, monkeypatch):
+    monkeypatch.setattr(core, "PROGRESS_STREAM_IDLE_TIMEOUT", 0.05)
+    core.progress_registry.update("idle-stream", phase="fetching_transcript")
+    response = client.get("/progress/idle-stream/stream")
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert body.count("event: progress") == 1
+    assert "event: error" in body and "No progress" in body
+
+
+def test_progress_stream_ends_when_done(core, client):
+    core.progress_registry.finish("done-stream")
+    body = client.get("/progress/done-stream/stream").get_data(as_text=True)
+    assert body.count("event: progress") == 1 and '"done": true' in body
+
+
+def test_an_abandoned_entry_does_not_hold_up_expiry():
+    registry = ProgressRegistry(ttl=0, idle_ttl=3600)
+    registry.update("abandoned", phase="fetching_transcript")
+    registry.finish("finished")
+    time.sleep(0.01)
+    registry.update("new", phase="fetching_transcript")
+    assert registry.get("finished") is None
+    assert registry.get("abandoned") is not None
+
+
+def test_unfinished_entries_expire_after_idle_ttl():
+    registry = ProgressRegistry(ttl=3600, idle_ttl=0)
+    registry.update("abandoned", phase="fetching_transcript")
+    time.sleep(0.01)
+    registry.update("new", phase="fetching_transcript")
+    assert registry.get("abandoned") is None
+
+
+def test_stream_disconnect_finishes_progress(core, client):
+    response = client.post("/summarize/stream", buffered=False,
+                           json={"url": "https://youtu.be/disconnect1", "request_id": "disconnecting"})
+    first = next(iter(response.response))
+    assert b"event: phase" in first
+    response.close()
+    entry = core.progress_registry.get("disconnecting")
+    assert entry["done"] and entry["error"] == "Client disconnected"
+
+
+def summarize(client, request_id, **headers):
+    response = client.post("/summarize", headers=headers,
+                           json={"url": "https://youtu.be/requestid01", "request_id": request_id})
+    assert response.status_code == 200
+    return response.get_json()["request_id"]
+
+
+def test_caller_request_ids_are_validated(core, client):
+    assert summarize(client, "my-request.1") == "my-request.1"
+    assert core.progress_registry.get("my-request.1")["done"]
+    for bad in ("two\nlines", "x" * 65, "spaces here", ["list"]):
+        request_id = summarize(client, bad)
+        assert request_id != bad and core.REQUEST_ID_RE.fullmatch(request_id)
+    assert summarize(client, None, **{"X-Request-ID": "header-id-1"}) == "header-id-1"
+
+
+def test_request_ids_in_use_are_not_taken_over(core, client):
+    core.progress_registry.update("someone-else", phase="generating_summary")
+    assert summarize(client, "someone-else") != "someone-else"
+    assert summarize(client, None, **{"X-Request-ID": "someone-else"}) != "someone-else"
+    assert core.progress_registry.get("someone-else")["phase"] == "generating_summary"
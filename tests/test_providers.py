@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from src.providers import LatencyTracker, Provider, ProviderPool, is_retriable
+from src.upstream import CircuitBreaker
+
+
+def provider(name, api_key=None):
+    client = SimpleNamespace(base_url=f"http://{name}.test", breaker=CircuitBreaker())
+    return Provider(name, client, f"{name}-model", api_key)
+
+
+def http_error(status):
+    return requests.HTTPError(response=SimpleNamespace(status_code=status))
+
+
+def scripted(outcomes):
+    """attempt(provider) answering per provider name: a value, an exception, or (delay, value)"""
+    calls = []
+
+    def attempt(p):
+        calls.append(p.name)
+        outcome = outcomes[p.name]
+        if isinstance(outcome, tuple):
+            time.sleep(outcome[0])
+            outcome = outcome[1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return attempt, calls
+
+
+def test_latency_tracker_quantiles():
+    tracker = LatencyTracker(window=3)
+    assert tracker.quantile(0.5) is None
+    for seconds in (5.0, 1.0, 2.0, 3.0):
+        tracker.record(seconds)
+    assert len(tracker) == 3
+    assert tracker.quantile(0.5) == 2.0 and tracker.quantile(0.95) == 3.0
+
+
+def test_request_args_use_the_providers_model_and_key():
+    headers, payload = provider("backup", api_key="backup-key").request_args({"model": "x", "n": 1}, "caller")
+    assert headers["Authorization"] == "Bearer backup-key"
+    assert payload == {"model": "backup-model", "n": 1}
+    headers, _ = provider("primary").request_args({}, "caller-key")
+    assert headers["Authorization"] == "Bearer caller-key"
+
+
+def test_is_retriable():
+    assert is_retriable(requests.ConnectionError())
+    assert is_retriable(requests.Timeout())
+    assert is_retriable(http_error(503))
+    assert not is_retriable(http_error(401))
+    assert not is_retriable(ValueError("bad request"))
+
+
+def test_pool_needs_a_provider():
+    with pytest.raises(ValueError):
+        ProviderPool([])
+
+
+def test_failover_to_the_next_provider():
+    pool = ProviderPool([provider("primary"), provider("backup")], hedge_budget=0)
+    attempt, calls = scripted({"primary": requests.ConnectionError("down"), "backup": "summary"})
+    assert pool.call(attempt) == "summary"
+    assert calls == ["primary", "backup"]
+    assert pool.stats()["failovers"] == 1
+
+
+def test_client_errors_are_not_failed_over():
+    pool = ProviderPool([provider("primary"), provider("backup")], hedge_budget=0)
+    attempt, calls = scripted({"primary": http_error(401), "backup": "summary"})
+    with pytest.raises(requests.HTTPError):
+        pool.call(attempt)
+    assert calls == ["primary"]
+
+
+def test_last_error_is_raised_when_every_provider_fails():
+    pool = ProviderPool([provider("primary"), provider("backup")], hedge_budget=0)
+    attempt, _ = scripted({"primary": requests.Timeout("slow"), "backup": http_error(503)})
+    with pytest.raises(requests.HTTPError):
+        pool.call(attempt)
+
+
+def test_slow_primary_is_hedged_and_the_loser_discarded():
+    pool = ProviderPool([provider("primary"), provider("backup")], hedge_default_delay=0.05,
+                        hedge_min_delay=0.01, hedge_budget=1.0)
+    attempt, calls = scripted({"primary": (0.3, "slow"), "backup": "fast"})
+    discarded = threading.Event()
+    assert pool.call(attempt, discard=lambda result: discarded.set()) == "fast"
+    assert calls == ["primary", "backup"]
+    assert discarded.wait(2)
+    stats = pool.stats()
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_hedge_budget_limits_hedging():
+    pool = ProviderPool([provider("primary"), provider("backup")], hedge_default_delay=0.01, hedge_budget=0)
+    assert pool.hedge_delay(pool.primary, "response") is None
+    attempt, calls = scripted({"primary": (0.05, "slow"), "backup": "fast"})
+    assert pool.call(attempt) == "slow"
+    assert calls == ["primary"]
+
+
+def test_call_async_hedges_and_cancels_the_loser():
+    pool = ProviderPool([provider("primary"), provider("backup")], hedge_default_delay=0.05,
+                        hedge_min_delay=0.01, hedge_budget=1.0)
+    cancelled = []
+
+    async def attempt(p):
+        if p.name == "primary":
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(p.name)
+                raise
+        return p.name
+
+    async def main():
+        result = await pool.call_async(attempt)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "backup"
+    assert cancelled == ["primary"]
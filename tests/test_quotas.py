@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import STRATEGIES, FixedWindowRateLimiter
+
+from src.quotas import (BucketStore, KeyQuota, MemoryBucketStore, QuotaExceededError, SQLiteBucketStore,
+                        TokenBucketRateLimiter, make_bucket_store)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def buckets(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBucketStore()
+    return SQLiteBucketStore(str(tmp_path / "buckets.db"))
+
+
+def test_bucket_store_is_abstract():
+    with pytest.raises(TypeError):
+        BucketStore()
+
+
+def test_buckets_start_full_and_report_the_wait(buckets):
+    assert buckets.tokens("key", rate=1, burst=2) == 2
+    assert buckets.consume("key", rate=1, burst=2) == 0
+    assert buckets.consume("key", rate=1, burst=2) == 0
+    wait = buckets.consume("key", rate=1, burst=2)
+    assert 0.9 < wait <= 1
+    assert buckets.tokens("key", rate=1, burst=2) < 1
+    assert buckets.tokens("other", rate=1, burst=2) == 2
+
+
+def test_make_bucket_store(tmp_path):
+    assert isinstance(make_bucket_store("memory://"), MemoryBucketStore)
+    assert isinstance(make_bucket_store(f"sqlite:///{tmp_path}/limits.db"), SQLiteBucketStore)
+
+
+def test_key_quota_grants_then_refuses():
+    quota = KeyQuota("searchapi", MemoryBucketStore(), "2 per hour", max_wait=0)
+    quota.acquire("key")
+    quota.acquire("key")
+    with pytest.raises(QuotaExceededError) as refused:
+        quota.acquire("key")
+    assert refused.value.retry_after > 0
+    quota.acquire("other-key")
+    with pytest.raises(QuotaExceededError):
+        asyncio.run(quota.acquire_async("key"))
+    with pytest.raises(QuotaExceededError):
+        quota.acquire("new-key", cost=3)
+    assert quota.stats() == {"granted": 3, "waited": 0, "rejected": 3, "limit": "2 per hour"}
+
+
+def test_key_quota_waits_for_a_token():
+    quota = KeyQuota("deepseek", MemoryBucketStore(), "20 per second", max_wait=1)
+    for _ in range(21):
+        quota.acquire("key")
+    assert quota.stats()["waited"] == 1
+
+
+def test_key_quota_hashes_keys():
+    store = MemoryBucketStore()
+    KeyQuota("deepseek", store, "1 per hour").acquire("secret-api-key")
+    assert not any("secret-api-key" in key for key in store._buckets)
+
+
+@pytest.mark.parametrize("uri", ["memory://", "sqlite:///{tmp_path}/limits.db"])
+def test_token_bucket_strategy(uri, tmp_path):
+    limiter = STRATEGIES["token-bucket"](storage_from_string(uri.format(tmp_path=tmp_path)))
+    assert isinstance(limiter, TokenBucketRateLimiter)
+    item = parse("2 per minute")
+    assert limiter.test(item, "client")
+    assert limiter.hit(item, "client")
+    assert limiter.hit(item, "client")
+    assert not limiter.hit(item, "client")
+    assert not limiter.test(item, "client")
+    assert limiter.hit(item, "other-client")
+    assert limiter.get_window_stats(item, "client").remaining == 0
+
+    limiter.clear(item, "client")
+    assert limiter.get_window_stats(item, "client").remaining == 2
+    assert limiter.hit(item, "client", cost=2)
+
+
+def test_sqlite_storage_backs_window_strategies(tmp_path):
+    storage = storage_from_string(f"sqlite:///{tmp_path}/limits.db")
+    for strategy in ("fixed-window", "moving-window"):
+        limiter = STRATEGIES[strategy](storage)
+        item = parse("2 per minute")
+        assert limiter.hit(item, strategy) and limiter.hit(item, strategy)
+        assert not limiter.hit(item, strategy)
+    assert isinstance(STRATEGIES["fixed-window"](storage), FixedWindowRateLimiter)
+    assert storage.check()
+    storage.reset()
+    assert STRATEGIES["fixed-window"](storage).hit(parse("1 per minute"), "fixed-window")
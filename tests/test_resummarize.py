@@ -0,0 +1,135 @@
+import argparse
+import json
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def settings(core, monkeypatch):
+    # The mock transcripts of different videos are near-duplicates of each other
+    monkeypatch.setattr(core, "NEAR_DUPLICATE_THRESHOLD", 0)
+    monkeypatch.setattr(core, "ADMIN_TOKEN", "admin-secret")
+
+
+def summarized(core, *video_ids, timestamps=False):
+    """Summarize each video with the current settings; returns the IDs as a set"""
+    for video_id in video_ids:
+        core.run_summary_pipeline(video_id, f"https://youtu.be/{video_id}", timestamps=timestamps)
+    return set(video_ids)
+
+
+def stale(core, video_ids, force=False):
+    return [entry["video_id"] for entry in core.stale_history_entries(force, video_ids)]
+
+
+def new_model(core, monkeypatch):
+    monkeypatch.setattr(core, "SUMMARY_MODEL", "deepseek-reasoner")
+
+
+def test_summaries_made_with_other_settings_are_stale(core, monkeypatch):
+    video_ids = summarized(core, "resumStale1")
+    stamped = summarized(core, "resumStale2", timestamps=True)
+    assert stale(core, video_ids | stamped) == []
+    assert stale(core, video_ids | stamped, force=True) == ["resumStale1", "resumStale2"]
+
+    prompt_version = core.PROMPT_VERSION
+    monkeypatch.setattr(core, "PROMPT_VERSION", "changed")
+    assert stale(core, video_ids | stamped) == ["resumStale1", "resumStale2"]
+    monkeypatch.setattr(core, "PROMPT_VERSION", prompt_version)
+    new_model(core, monkeypatch)
+    assert stale(core, video_ids) == ["resumStale1"]
+
+
+def test_entries_without_recorded_settings_are_stale(core):
+    core.get_history_store().append("resumLegacy", "https://youtu.be/resumLegacy", "2024-01-01T00:00:00", None)
+    assert stale(core, {"resumLegacy"}) == ["resumLegacy"]
+
+
+def test_resummarizing_reuses_the_stored_transcript(core, upstream, monkeypatch):
+    video_ids = summarized(core, "resumReuse1")
+    # Past its TTL, the cached transcript is still used rather than fetched again
+    core.transcript_cache.memory.clear()
+    monkeypatch.setattr(core.transcript_cache.disk, "ttl", 0)
+    new_model(core, monkeypatch)
+    transcripts, completions = upstream.counters["transcripts"], upstream.counters["completions"]
+
+    results = list(core.resummarize_history(video_ids=video_ids))
+    assert [(r["video_id"], r["status"], r["url"]) for r in results] == [
+        ("resumReuse1", "ok", "https://www.youtube.com/watch?v=resumReuse1")]
+    assert upstream.counters["transcripts"] == transcripts
+    assert upstream.counters["completions"] > completions
+    assert stale(core, video_ids) == []
+    [entry] = [e for e in core.get_history_store().iter_videos() if e["video_id"] == "resumReuse1"]
+    assert entry["summary_config"]["model"] == "deepseek-reasoner"
+    assert core.get_summary_store().get("resumReuse1").summary == results[0]["summary"]
+
+
+def test_an_interrupted_run_resumes_with_the_videos_still_stale(core, monkeypatch):
+    video_ids = summarized(core, "resumResum1", "resumResum2", "resumResum3")
+    new_model(core, monkeypatch)
+    summarize = core.summarize_transcript
+
+    def failing(segments, *args, **kwargs):
+        if segments.video_id == "resumResum2":
+            raise RuntimeError("Deepseek unavailable")
+        return summarize(segments, *args, **kwargs)
+
+    monkeypatch.setattr(core, "summarize_transcript", failing)
+    first = {r["video_id"]: r["status"] for r in core.resummarize_history(concurrency=1, video_ids=video_ids)}
+    assert first == {"resumResum1": "ok", "resumResum2": "error", "resumResum3": "ok"}
+    assert stale(core, video_ids) == ["resumResum2"]
+
+    monkeypatch.setattr(core, "summarize_transcript", summarize)
+    second = [(r["video_id"], r["status"]) for r in core.resummarize_history(video_ids=video_ids)]
+    assert second == [("resumResum2", "ok")]
+    assert stale(core, video_ids) == []
+
+
+def test_admin_endpoint_requires_the_token(core, client, monkeypatch):
+    assert client.post("/admin/resummarize", json={"dry_run": True}).status_code == 401
+    wrong = {"Authorization": "Bearer wrong"}
+    assert client.post("/admin/resummarize", json={"dry_run": True}, headers=wrong).status_code == 401
+    monkeypatch.setattr(core, "ADMIN_TOKEN", None)
+    # Without a token configured the endpoint does not exist
+    assert client.post("/admin/resummarize", json={"dry_run": True},
+                       headers={"Authorization": "Bearer None"}).status_code == 404
+
+
+def test_admin_dry_run_lists_stale_videos_without_summarizing(core, client, upstream, monkeypatch):
+    video_ids = summarized(core, "resumAdmin1", "resumAdmin2")
+    new_model(core, monkeypatch)
+    completions = upstream.counters["completions"]
+    headers = {"Authorization": "Bearer admin-secret"}
+
+    response = client.post("/admin/resummarize", json={"dry_run": True, "video_ids": sorted(video_ids)},
+                           headers=headers)
+    assert response.status_code == 200
+    assert [entry["video_id"] for entry in response.json["stale"]] == ["resumAdmin1", "resumAdmin2"]
+    assert response.json["summary_config"]["model"] == "deepseek-reasoner"
+    assert upstream.counters["completions"] == completions
+    assert stale(core, video_ids) == ["resumAdmin1", "resumAdmin2"]
+
+    response = client.post("/admin/resummarize", json={"video_ids": ["resumAdmin1"]}, headers=headers)
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(r["video_id"], r["status"]) for r in results] == [("resumAdmin1", "ok")]
+    assert stale(core, video_ids) == ["resumAdmin2"]
+    assert client.post("/admin/resummarize", json={"video_ids": "resumAdmin2"},
+                       headers=headers).status_code == 400
+
+
+def test_cli(core, monkeypatch, capsys):
+    summarized(core, "resumCli001")
+    new_model(core, monkeypatch)
+
+    def run(**options):
+        args = argparse.Namespace(concurrency=2, force=False, video_id="resumCli001", dry_run=False)
+        failures = core.run_resummarize(argparse.Namespace(**dict(vars(args), **options)))
+        out, err = capsys.readouterr()
+        return failures, [json.loads(line) for line in out.splitlines()], err
+
+    failures, listed, _ = run(dry_run=True)
+    assert failures == 0 and [entry["video_id"] for entry in listed] == ["resumCli001"]
+    failures, results, err = run()
+    assert failures == 0 and [r["status"] for r in results] == ["ok"]
+    assert "Re-summarized 1 of 1 videos" in err
+    assert run(dry_run=True)[1] == []
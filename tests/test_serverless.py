@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from src import serverless
+
+
+@pytest.fixture
+def unloaded(monkeypatch):
+    monkeypatch.setattr(serverless, "_app", None)
+    monkeypatch.setattr(serverless, "get_app", lambda: pytest.fail("the app was imported"))
+
+
+def test_fast_routes_do_not_load_the_app(unloaded):
+    health = serverless.handler({"path": "/health", "method": "GET"}, None)
+    assert health["statusCode"] == 200
+    assert json.loads(health["body"])["version"] == serverless.VERSION
+
+    index = serverless.handler({"path": "/", "method": "GET"}, None)
+    assert index["statusCode"] == 200
+    assert "{{ version }}" not in index["body"]
+    etag = index["headers"]["ETag"]
+    cached = serverless.handler({"path": "/", "method": "GET", "headers": {"if-none-match": etag}}, None)
+    assert cached["statusCode"] == 304 and cached["body"] == ""
+
+
+def test_build_environ():
+    environ = serverless.build_environ({
+        "path": "/history", "method": "POST", "body": "{}", "query": {"limit": ["5"]},
+        "headers": {"content-type": "application/json", "x-forwarded-for": "203.0.113.9, 10.0.0.1",
+                    "accept-encoding": "gzip", "x-request-id": "abc"},
+    })
+    assert environ["PATH_INFO"] == "/history" and environ["REQUEST_METHOD"] == "POST"
+    assert environ["QUERY_STRING"] == "limit=5"
+    assert environ["wsgi.input"].read() == b"{}" and environ["CONTENT_LENGTH"] == "2"
+    assert environ["REMOTE_ADDR"] == "203.0.113.9"
+    assert environ["HTTP_X_REQUEST_ID"] == "abc"
+    assert "HTTP_ACCEPT_ENCODING" not in environ
+
+
+def test_other_routes_go_through_the_app(core, monkeypatch):
+    monkeypatch.setattr(serverless, "_app", None)
+    response = serverless.handler({"path": "/summarize", "method": "POST", "body": "{}",
+                                   "headers": {"content-type": "application/json"}}, None)
+    assert response["statusCode"] == 400
+    assert response["headers"]["Content-Type"] == "application/json"
+    assert serverless._app is core.app
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import threading
+import time
+
+from src.singleflight import LeaseLock, SingleFlight
+
+
+def run_concurrently(count, target):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def slow(value, calls, delay=0.1):
+    def fn():
+        calls.append(value)
+        time.sleep(delay)
+        return value
+    return fn
+
+
+def test_do_shares_one_execution():
+    flight = SingleFlight("test")
+    calls = []
+    results, errors = run_concurrently(5, lambda: flight.do("key", slow("result", calls)))
+    assert results == ["result"] * 5 and not errors
+    assert calls == ["result"]
+    assert flight.stats()["coalesced"] == 4
+
+
+def test_do_passes_the_leaders_error_to_followers():
+    flight = SingleFlight("test")
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError("upstream down")
+
+    results, errors = run_concurrently(3, lambda: flight.do("key", fail))
+    assert not results
+    assert [str(e) for e in errors] == ["upstream down"] * 3
+
+
+def test_stream_replays_every_item_to_late_joiners():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def produce():
+        yield "a"
+        release.wait(5)
+        yield "b"
+
+    first = flight.stream("key", produce)
+    assert next(first) == "a"
+    second = flight.stream("key", produce)
+    release.set()
+    assert ["a"] + list(first) == list(second) == ["a", "b"]
+
+
+def test_do_async_shares_one_execution():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", fetch) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["result"] * 4
+    assert calls == [1]
+
+
+def test_lease_lock_is_exclusive_until_released_or_expired(tmp_path):
+    path = tmp_path / "leases.db"
+    first, second = LeaseLock(str(path)), LeaseLock(str(path))
+    # Nothing is created until a lease is first asked for
+    assert not path.exists()
+    assert first.acquire("key", ttl=60)
+    assert not second.acquire("key", ttl=60)
+    first.release("key")
+    assert second.acquire("key", ttl=0.01)
+    time.sleep(0.02)
+    assert first.acquire("key", ttl=60)
+
+
+def test_cross_worker_follower_uses_the_shared_result(tmp_path):
+    path = str(tmp_path / "leases.db")
+    cache = {}
+    holder = LeaseLock(path)
+    assert holder.acquire("test:key", ttl=60)
+    flight = SingleFlight("test", leases=LeaseLock(path), poll_interval=0.01)
+    threading.Timer(0.05, cache.update, kwargs={"key": "from other worker"}).start()
+    calls = []
+    assert flight.do("key", slow("own", calls), lookup=lambda: cache.get("key")) == "from other worker"
+    assert calls == []
+
+
+def test_app_lease_database_is_opened_on_first_use(core):
+    assert core.lease_lock.path == os.environ["SINGLEFLIGHT_DB"]
+    assert not os.path.exists(os.path.join(core.OUTPUT_DIR, "singleflight.db"))
+
+
+def test_flight_keys_are_per_api_key(core):
+    assert core.flight_key("video", False, "user-a") == core.flight_key("video", False, "user-a")
+    assert core.flight_key("video", False, "user-a") != core.flight_key("video", False, "user-b")
+    assert core.flight_key("video", False) != core.flight_key("video", False, "user-a")
+    assert core.flight_key("video", False) != core.flight_key("video", True)
+    assert "user-a" not in core.flight_key("video", False, "user-a")
+
+
+def test_callers_with_other_keys_do_not_inherit_an_auth_error(core):
+    flight = SingleFlight("test")
+    started = threading.Event()
+
+    def rejected():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("Deepseek authentication failed")
+
+    errors = []
+
+    def lead():
+        try:
+            flight.do(core.flight_key("video", False, "bad-key"), rejected)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait(5)
+    assert flight.do(core.flight_key("video", False, "good-key"), lambda: "summary") == "summary"
+    leader.join()
+    assert len(errors) == 1
@@ -0,0 +1,79 @@
+import io
+import zlib
+
+import pytest
+
+from src.summary_store import LEGACY_MARKER, SummaryStore, summary_etag
+
+LONG_SUMMARY = "- A point that repeats. " * 40
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SummaryStore(str(tmp_path / "summaries.db"))
+
+
+def test_put_and_get(store):
+    etag = store.put("short", "- one point")
+    stored = store.get("short")
+    assert stored.summary == "- one point" and stored.etag == etag == summary_etag("- one point")
+    assert store.etag("short") == etag
+    assert store.get("missing") is None and store.etag("missing") is None
+
+
+def test_large_bodies_are_compressed(store):
+    store.put("long", LONG_SUMMARY)
+    store.put("short", "- one point")
+    _, encoding, body, _ = store.get_raw("long")
+    assert encoding == "zlib" and zlib.decompress(body).decode("utf-8") == LONG_SUMMARY
+    assert store.get_raw("short")[1] == "identity"
+    assert store.get("long").summary == LONG_SUMMARY
+
+
+def test_delete_count_and_iter_all(store):
+    for video_id in ("c", "a", "b"):
+        store.put(video_id, f"summary of {video_id}")
+    assert store.delete("b") and not store.delete("b")
+    assert store.count() == 2
+    assert [stored.video_id for stored in store.iter_all(batch_size=1)] == ["a", "c"]
+
+
+def test_export_import_keeps_the_newer_summary(store, tmp_path):
+    store.put("abc", "old", updated_at=100)
+    store.put("def", "kept", updated_at=100)
+    exported = io.StringIO()
+    assert store.export(exported) == 2
+
+    other = SummaryStore(str(tmp_path / "other.db"))
+    other.put("abc", "newer", updated_at=200)
+    assert other.import_file(io.StringIO(exported.getvalue())) == 2
+    assert other.get("abc").summary == "newer"
+    assert other.get("def").summary == "kept"
+
+
+def test_migrates_legacy_files_once(tmp_path):
+    legacy = tmp_path / "output"
+    legacy.mkdir()
+    (legacy / "abc_summary.md").write_text("- legacy", encoding="utf-8")
+    (legacy / "notes.txt").write_text("ignored")
+    store = SummaryStore(str(tmp_path / "summaries.db"), legacy_dir=str(legacy))
+    assert store.get("abc").summary == "- legacy"
+    assert (legacy / LEGACY_MARKER).exists()
+
+    (legacy / "def_summary.md").write_text("- later")
+    assert store.migrate_files(str(legacy)) == 0
+    assert store.get("def") is None
+
+
+def test_summary_endpoint_etags_and_deflate(core, client):
+    core.get_summary_store().put("storeapi001", LONG_SUMMARY)
+    response = client.get("/summary/storeapi001")
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == LONG_SUMMARY
+    etag = response.headers["ETag"]
+
+    assert client.get("/summary/storeapi001", headers={"If-None-Match": etag}).status_code == 304
+    deflated = client.get("/summary/storeapi001", headers={"Accept-Encoding": "deflate"})
+    assert deflated.headers["Content-Encoding"] == "deflate"
+    assert zlib.decompress(deflated.get_data()).decode("utf-8") == LONG_SUMMARY
+    assert client.get("/summary/storemissing").status_code == 404
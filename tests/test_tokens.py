@@ -0,0 +1,51 @@
+import pytest
+
+from src.tokens import PARTIAL_SUMMARY_TOKENS, TokenBudgetError, TokenCounter, approximate_tokens, plan_summary
+
+
+def test_approximate_tokens():
+    assert approximate_tokens("") == 0
+    assert approximate_tokens("Hello, world!") == 4
+    # Numbers split into groups of three digits
+    assert approximate_tokens("1234567") == 3
+    # Long words count extra pieces
+    assert approximate_tokens("internationalization") > 1
+
+
+def test_counter_falls_back_to_the_approximation():
+    counter = TokenCounter("approximate")
+    assert counter.name == "approximate"
+    assert counter.count("Hello, world!") == 4
+    assert counter.count("") == 0
+    assert TokenCounter("auto").count("Hello, world!") > 0
+    with pytest.raises(ValueError, match="Unknown tokenizer"):
+        TokenCounter("sentencepiece")
+
+
+def test_budget_error_carries_the_figures():
+    error = TokenBudgetError("too long", tokens=5000, budget=4000)
+    assert isinstance(error, ValueError)
+    assert (error.tokens, error.budget, str(error)) == (5000, 4000, "too long")
+
+
+def test_short_transcripts_are_summarized_in_one_call():
+    plan = plan_summary(1000, chunk_tokens=6000, parallelism=4, max_chunk_tokens=30000, template_tokens=50)
+    assert plan.strategy == "single" and plan.chunks == 1
+    assert plan.total_tokens == 1050
+
+
+def test_fixed_strategy_uses_chunk_tokens():
+    plan = plan_summary(20000, chunk_tokens=6000, parallelism=4, max_chunk_tokens=30000,
+                        template_tokens=50, strategy="fixed")
+    assert plan == (plan.strategy, 6000, 4, 20000, 20000 + 5 * 50 + 4 * PARTIAL_SUMMARY_TOKENS)
+    assert plan.strategy == "map_reduce"
+
+
+def test_auto_strategy_fits_one_round_of_parallel_calls():
+    plan = plan_summary(40000, chunk_tokens=6000, parallelism=4, max_chunk_tokens=30000)
+    assert (plan.chunk_tokens, plan.chunks) == (10000, 4)
+    # Chunks never grow past what fits in the context
+    plan = plan_summary(400000, chunk_tokens=6000, parallelism=4, max_chunk_tokens=30000)
+    assert (plan.chunk_tokens, plan.chunks) == (30000, 14)
+    with pytest.raises(ValueError, match="Unknown chunking strategy"):
+        plan_summary(1, 1, 1, 1, strategy="greedy")
@@ -0,0 +1,72 @@
+import pytest
+
+from src.transcript import Transcript, format_timestamp, joined_text
+
+ENTRIES = [
+    {"text": "welcome back", "start": 0.0, "duration": 2.5},
+    {"text": "today: café ☕", "start": 2.5, "duration": 3.0},
+    {"text": "", "start": 40.0, "duration": 1.0},
+    {"text": "see you", "start": 3700.0, "duration": None},
+]
+
+
+def test_format_timestamp():
+    assert format_timestamp(0) == "0:00"
+    assert format_timestamp(760.9) == "12:40"
+    assert format_timestamp(3723) == "1:02:03"
+
+
+def test_sequence_of_segment_texts():
+    transcript = Transcript.from_segments(ENTRIES, video_id="abc")
+    assert len(transcript) == 4
+    assert list(transcript) == ["welcome back", "today: café ☕", "", "see you"]
+    assert transcript[-1] == "see you" and transcript[1:3] == ["today: café ☕", ""]
+    assert transcript.text == "welcome back today: café ☕  see you"
+    assert transcript.text_between(0, 2) == "welcome back today: café ☕"
+    assert transcript.segment_length(1) == len("today: café ☕")
+    with pytest.raises(IndexError):
+        transcript[4]
+
+
+def test_timings_and_segments():
+    transcript = Transcript.from_segments(ENTRIES)
+    assert transcript.has_timings
+    assert transcript.segment_at(3.0) == 1
+    assert transcript.segment_at(-1) == 0
+    segment = transcript.segment(3)
+    assert (segment.start, segment.duration, segment.text) == (3700.0, 0.0, "see you")
+    assert [s.text for s in transcript.segments()] == list(transcript)
+    assert not Transcript.from_segments(["plain", "strings"]).has_timings
+
+
+def test_timestamped_segments_mark_each_interval():
+    transcript = Transcript.from_segments(ENTRIES)
+    assert transcript.timestamped_segments(interval=30) == [
+        "[0:00] welcome back", "today: café ☕", "[0:40] ", "[1:01:40] see you"]
+
+
+def test_binary_round_trip():
+    transcript = Transcript.from_segments(ENTRIES, video_id="abc")
+    decoded = Transcript.from_bytes(transcript.to_bytes())
+    assert decoded == transcript
+    assert list(decoded) == list(transcript)
+    assert Transcript.from_rows([(0.0, 1.0, "a"), (1.0, 1.0, "b")], "x") == \
+        Transcript.from_segments([{"text": "a", "start": 0, "duration": 1},
+                                  {"text": "b", "start": 1, "duration": 1}], "x")
+
+
+@pytest.mark.parametrize("data", [b"", b"JSON{}" + b"\0" * 20])
+def test_from_bytes_rejects_other_data(data):
+    with pytest.raises(ValueError):
+        Transcript.from_bytes(data)
+
+
+def test_from_bytes_rejects_truncated_data():
+    data = Transcript.from_segments(ENTRIES, video_id="abc").to_bytes()
+    with pytest.raises(ValueError, match="Truncated"):
+        Transcript.from_bytes(data[:-1])
+
+
+def test_joined_text():
+    assert joined_text(["a", "b"]) == "a b"
+    assert joined_text(Transcript.from_segments(["a", "b"])) == "a b"
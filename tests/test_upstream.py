@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from src.quotas import KeyQuota, MemoryBucketStore, QuotaExceededError
+from src.upstream import (CircuitBreaker, CircuitOpenError, UpstreamClient, is_connect_error,
+                          parse_retry_after)
+
+
+class ScriptedAdapter(BaseAdapter):
+    """Answers each request with the next status code, or raises the next exception"""
+
+    def __init__(self, *outcomes):
+        super().__init__()
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = Response()
+        response.status_code = outcome
+        response.request = request
+        response.headers["Retry-After"] = "0"
+        return response
+
+    def close(self):
+        pass
+
+
+def refused():
+    return requests.ConnectionError(MaxRetryError(None, "/", NewConnectionError(None, "refused")))
+
+
+def make_client(*outcomes, **kwargs):
+    kwargs.setdefault("max_retries", 2)
+    client = UpstreamClient("test", "http://upstream.test", backoff_base=0, **kwargs)
+    adapter = ScriptedAdapter(*outcomes)
+    client.mount(adapter)
+    return client, adapter
+
+
+def test_get_is_retried_on_read_timeout():
+    client, adapter = make_client(requests.ReadTimeout(), 200)
+    assert client.get("/x").status_code == 200
+    assert adapter.calls == 2
+    assert client.stats()["retries"] == 1
+
+
+def test_post_is_not_retried_on_read_timeout():
+    client, adapter = make_client(requests.ReadTimeout(), 200)
+    with pytest.raises(requests.ReadTimeout):
+        client.post("/chat")
+    assert adapter.calls == 1
+
+
+def test_post_is_retried_on_connect_errors():
+    client, adapter = make_client(requests.ConnectTimeout(), refused(), 200)
+    assert client.post("/chat").status_code == 200
+    assert adapter.calls == 3
+
+
+def test_retry_statuses_are_retried_then_returned():
+    client, adapter = make_client(503, 503, 503)
+    assert client.post("/chat").status_code == 503
+    assert adapter.calls == 3
+    assert client.breaker.failures == 1
+
+
+def test_is_connect_error():
+    assert is_connect_error(requests.ConnectTimeout())
+    assert is_connect_error(refused())
+    assert not is_connect_error(requests.ReadTimeout())
+    assert not is_connect_error(requests.ConnectionError("Connection aborted"))
+
+
+def test_breaker_opens_and_probes_after_reset_timeout(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    client, adapter = make_client(refused(), refused(), 200, breaker=breaker, max_retries=0)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client.get("/x")
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.get("/x")
+    assert adapter.calls == 2
+
+    later = time.monotonic() + 31
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    assert client.get("/x").status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_half_open_breaker_lets_one_probe_through(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1)
+    breaker.record_failure()
+    later = time.monotonic() + 2
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+
+def half_open(monkeypatch, breaker):
+    breaker.record_failure()
+    later = time.monotonic() + breaker.reset_timeout + 1
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+
+
+def test_quota_is_taken_once_and_before_the_probe(monkeypatch):
+    quota = KeyQuota("test", MemoryBucketStore(), "1 per hour", max_wait=0)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1)
+    client, adapter = make_client(503, 200, 200, breaker=breaker, quota=quota)
+    assert client.get("/x", quota_key="key").status_code == 200
+    assert adapter.calls == 2
+
+    half_open(monkeypatch, breaker)
+    with pytest.raises(QuotaExceededError):
+        client.get("/x", quota_key="key")
+    # The refused request never became the probe, so the next one is let through
+    assert client.get("/x").status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_unexpected_errors_release_the_probe(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1)
+    client, adapter = make_client(requests.exceptions.InvalidURL("bad"), 200, breaker=breaker)
+    half_open(monkeypatch, breaker)
+    with pytest.raises(requests.exceptions.InvalidURL):
+        client.get("/x")
+    assert breaker.state == "half_open"
+    assert client.get("/x").status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_async_client_releases_the_probe(monkeypatch):
+    async_pipeline = pytest.importorskip("src.async_pipeline")
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1)
+    quota = KeyQuota("test", MemoryBucketStore(), "1 per hour", max_wait=0)
+    sync_client, _ = make_client(breaker=breaker, quota=quota)
+    client = async_pipeline.AsyncUpstreamClient(sync_client)
+    half_open(monkeypatch, breaker)
+
+    async def refused_then_failed():
+        await client.quota.acquire_async("key")
+        with pytest.raises(QuotaExceededError):
+            await client.request("GET", "/x", quota_key="key")
+        assert breaker.allow()
+        breaker.release()
+
+        monkeypatch.setattr(client, "_get_client", lambda: (_ for _ in ()).throw(RuntimeError("no client")))
+        with pytest.raises(RuntimeError):
+            await client.request("GET", "/x")
+        assert breaker.allow()
+
+    asyncio.run(refused_then_failed())
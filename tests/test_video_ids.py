@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from benchmarks.bench_video_ids import TEMPLATES, attempt, build_corpus, legacy_extract_video_id
+from src.video_ids import INVALID_URL_MESSAGE, VideoIdResult, extract_video_id, extract_video_ids, normalize_url
+
+
+def test_corpus_of_every_url_form():
+    corpus = build_corpus(len(TEMPLATES) * 40, random.Random(1))
+    for form, url, expected in corpus:
+        assert attempt(extract_video_id, url) == expected, (form, url)
+        if expected is not None:
+            assert normalize_url(url) == f"https://www.youtube.com/watch?v={expected}"
+        # Wherever the extractor this one replaced was right, this one agrees
+        legacy = attempt(legacy_extract_video_id, url)
+        assert legacy != expected or attempt(extract_video_id, url) == legacy
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?list=PL1&v=dQw4w9WgXcQ&t=3",
+    "see https://m.youtube.com/watch?app=desktop&v=dQw4w9WgXcQ for more",
+    "https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ#t=10",
+    "https://www.youtube.com/attribution_link?a=x&u=%2Fwatch%3Fv%3DdQw4w9WgXcQ%26feature%3Dshare",
+    "https%3A%2F%2Fwww.youtube.com%2Fwatch%3Ffeature%3Dshare%26v%3DdQw4w9WgXcQ",
+])
+def test_v_anywhere_in_the_query_string(url):
+    assert extract_video_id(url) == "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("url", [
+    # Only a v= parameter counts, not one in the fragment or another parameter's value
+    "https://www.youtube.com/watch?feature=share#v=dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?next=v=dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQxyz",
+    "https://example.com/watch?feature=share&v=dQw4w9WgXcQ",
+    "",
+])
+def test_invalid_urls(url):
+    with pytest.raises(ValueError, match="Could not extract YouTube video ID"):
+        extract_video_id(url)
+
+
+def test_extract_video_ids_reports_errors_per_url():
+    results = list(extract_video_ids(["https://youtu.be/dQw4w9WgXcQ", "not a url", None]))
+    assert results == [
+        VideoIdResult("https://youtu.be/dQw4w9WgXcQ", "dQw4w9WgXcQ", None),
+        VideoIdResult("not a url", None, INVALID_URL_MESSAGE),
+        VideoIdResult(None, None, "URL must be a string"),
+    ]
+    assert all(type(result) is VideoIdResult for result in results)
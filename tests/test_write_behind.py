@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+from src.write_behind import LogFile, WriteBehind
+
+
+@pytest.fixture
+def writer():
+    writer = WriteBehind(fsync_interval=0.05, retry_delay=0.01)
+    yield writer
+    writer.close(timeout=5)
+
+
+def test_writes_are_applied_in_batches_in_order(writer):
+    applied = []
+    writer.register("row", applied.append)
+    for number in range(100):
+        writer.submit("row", number)
+    assert writer.drain(timeout=5)
+    assert [item for batch in applied for item in batch] == list(range(100))
+    stats = writer.stats()
+    assert stats["applied"] == 100 and stats["pending"] == 0 and stats["errors"] == 0
+
+
+def test_drain_waits_only_for_the_kinds_given(writer):
+    release = threading.Event()
+    writer.register("slow", lambda items: release.wait(5))
+    writer.register("fast", lambda items: None)
+    writer.submit("fast", 1)
+    assert writer.drain(timeout=5, kinds=("fast",))
+    writer.submit("slow", 1)
+    try:
+        # The writer is stuck on the slow batch, which readers of other kinds do not wait for
+        assert writer.drain(timeout=0, kinds=("fast", "unused"))
+        assert not writer.drain(timeout=0.05, kinds=("slow",))
+        assert not writer.drain(timeout=0.05)
+    finally:
+        release.set()
+    assert writer.drain(timeout=5)
+
+
+def test_a_failed_batch_is_retried_ahead_of_later_writes(writer):
+    applied = []
+    failures = [OSError("database is locked")] * 2
+
+    def flaky(items):
+        if failures:
+            raise failures.pop()
+        applied.extend(items)
+
+    writer.register("row", flaky)
+    writer.submit("row", "first")
+    writer.submit("row", "second")
+    assert writer.drain(timeout=5)
+    writer.submit("row", "third")
+    assert writer.drain(timeout=5)
+    assert applied == ["first", "second", "third"]
+    stats = writer.stats()
+    assert stats["errors"] == 2 and stats["retries"] == 2 and stats["dropped"] == 0
+
+
+def test_writes_are_dropped_after_max_attempts(capsys):
+    writer = WriteBehind(retry_delay=0.01, max_attempts=3)
+    attempts = []
+
+    def broken(items):
+        attempts.append(list(items))
+        raise OSError("disk full")
+
+    writer.register("row", broken)
+    writer.submit("row", "lost")
+    assert writer.drain(timeout=5)
+    writer.close(timeout=5)
+    assert attempts == [["lost"]] * 3
+    assert writer.stats()["dropped"] == 1
+    assert "dropped 1 row item(s) after 3 failed attempts" in capsys.readouterr().err
+
+
+def test_inline_writes_retry_too():
+    writer = WriteBehind(enabled=False, retry_delay=0.001)
+    applied = []
+    failures = [OSError("busy")]
+
+    def flaky(items):
+        if failures:
+            raise failures.pop()
+        applied.extend(items)
+
+    writer.register("row", flaky)
+    writer.submit("row", "kept")
+    assert applied == ["kept"]
+    assert writer.stats()["retries"] == 1 and writer.stats()["dropped"] == 0
+
+
+def test_close_applies_everything_queued(tmp_path):
+    path = tmp_path / "logs" / "app.log"
+    log_file = LogFile(str(path))
+    writer = WriteBehind()
+    writer.register("log", log_file.write_batch, log_file.sync)
+    for number in range(10):
+        writer.submit("log", f"line {number}\n")
+    writer.close(timeout=5)
+    assert path.read_text().splitlines() == [f"line {number}" for number in range(10)]
+    # Writes after close are applied straight away
+    writer.submit("log", "late\n")
+    assert path.read_text().endswith("late\n")
+
+
+def test_log_file_rotates(tmp_path):
+    log_file = LogFile(str(tmp_path / "app.log"), rotation_bytes=10)
+    log_file.write_batch(["12345678\n"])
+    log_file.write_batch(["abcdefgh\n"])
+    assert len(list(tmp_path.iterdir())) == 2
+    assert (tmp_path / "app.log").read_text() == "abcdefgh\n"